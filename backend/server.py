@@ -1,18 +1,34 @@
 from fastapi import FastAPI, APIRouter, HTTPException
 from dotenv import load_dotenv
+from fastapi.responses import StreamingResponse
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, ValidationError, HttpUrl, field_validator
+from typing import List, Optional, Dict, Any, Tuple, Literal
 import uuid
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 import aiohttp
+from yarl import URL
 import google.generativeai as genai
 import json
 import asyncio
+import time
+import hashlib
+import functools
+import re
+import heapq
+import itertools
+import contextvars
+import random
+import ipaddress
+import socket
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -25,6 +41,41 @@ db = client[os.environ['DB_NAME']]
 # Configure Google AI
 genai.configure(api_key=os.environ['GOOGLE_API_KEY'])
 
+# Shared outbound HTTP client, pooled across all platform fetchers
+HTTP_TOTAL_TIMEOUT = float(os.environ.get('HTTP_TOTAL_TIMEOUT', '20'))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', '15'))
+HTTP_POOL_LIMIT = int(os.environ.get('HTTP_POOL_LIMIT', '100'))
+HTTP_POOL_LIMIT_PER_HOST = int(os.environ.get('HTTP_POOL_LIMIT_PER_HOST', '20'))
+HTTP_KEEPALIVE_TIMEOUT = float(os.environ.get('HTTP_KEEPALIVE_TIMEOUT', '30'))
+HTTP_DNS_CACHE_TTL = int(os.environ.get('HTTP_DNS_CACHE_TTL', '300'))
+
+http_session: Optional[aiohttp.ClientSession] = None
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Return the process-wide HTTP session, creating it on first use"""
+    global http_session
+    if http_session is None or http_session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=HTTP_TOTAL_TIMEOUT,
+            sock_connect=HTTP_CONNECT_TIMEOUT,
+            sock_read=HTTP_READ_TIMEOUT,
+        )
+        http_session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+    return http_session
+
+async def close_http_session() -> None:
+    global http_session
+    if http_session is not None and not http_session.closed:
+        await http_session.close()
+    http_session = None
+
 # Create the main app without a prefix
 app = FastAPI()
 
@@ -40,6 +91,12 @@ class UserProfile(BaseModel):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     last_analyzed: Optional[datetime] = None
 
+    @field_validator('created_at', 'last_analyzed')
+    @classmethod
+    def assume_utc(cls, value: Optional[datetime]) -> Optional[datetime]:
+        # Mongo hands back naive datetimes; they are stored as UTC
+        return value.replace(tzinfo=timezone.utc) if value and not value.tzinfo else value
+
 class UserProfileCreate(BaseModel):
     github_username: Optional[str] = None
     leetcode_username: Optional[str] = None
@@ -57,6 +114,47 @@ class AIRecommendation(BaseModel):
     recommendations: List[Dict[str, Any]]
     generated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class UserAnalysisResponse(BaseModel):
+    profile: UserProfile
+    recommendations: List[Dict[str, Any]]
+
+class RecommendationItem(BaseModel):
+    type: Literal['project', 'problem', 'skill', 'learning']
+    title: str
+    description: str
+    difficulty: Literal['beginner', 'intermediate', 'advanced']
+    time_estimate: str
+    resources: List[str] = []
+
+    @field_validator('type', 'difficulty', mode='before')
+    @classmethod
+    def normalize_choice(cls, value: Any) -> Any:
+        return value.strip().lower() if isinstance(value, str) else value
+
+    @field_validator('resources', mode='before')
+    @classmethod
+    def normalize_resources(cls, value: Any) -> Any:
+        if value is None:
+            return []
+        return [value] if isinstance(value, str) else value
+
+# Response schema handed to Gemini's structured output mode
+RECOMMENDATION_SCHEMA = {
+    'type': 'array',
+    'items': {
+        'type': 'object',
+        'properties': {
+            'type': {'type': 'string', 'format': 'enum', 'enum': ['project', 'problem', 'skill', 'learning']},
+            'title': {'type': 'string'},
+            'description': {'type': 'string'},
+            'difficulty': {'type': 'string', 'format': 'enum', 'enum': ['beginner', 'intermediate', 'advanced']},
+            'time_estimate': {'type': 'string'},
+            'resources': {'type': 'array', 'items': {'type': 'string'}}
+        },
+        'required': ['type', 'title', 'description', 'difficulty', 'time_estimate', 'resources']
+    }
+}
+
 class AnalyzeProfileRequest(BaseModel):
     github_username: Optional[str] = None
     leetcode_username: Optional[str] = None
@@ -64,264 +162,1927 @@ class AnalyzeProfileRequest(BaseModel):
     goal: Optional[str] = "Improve programming skills"
     domain: Optional[str] = "General Software Development"
 
+class AnalyzeJobRequest(AnalyzeProfileRequest):
+    callback_url: Optional[HttpUrl] = None
+
+    @field_validator('callback_url')
+    @classmethod
+    def check_callback_host(cls, value: Optional[HttpUrl]) -> Optional[HttpUrl]:
+        if value is not None and not callback_host_allowed(value.host):
+            raise ValueError('callback_url must point to a public host')
+        return value
+
+class BatchAnalyzeRequest(BaseModel):
+    profiles: List[UserProfileCreate]
+    goal: Optional[str] = "Improve programming skills"
+    domain: Optional[str] = "General Software Development"
+
+# In-process LRU cache
+class LRUCache:
+    """Bounded in-memory LRU with a per-entry TTL and a total byte budget.
+
+    Sizes are estimated from the JSON encoding of each value. Hit, miss,
+    expiry and eviction counters are exposed through ``metrics()``.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def get(self, key: Any) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires_at, _ = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Any, value: Any) -> None:
+        size = len(json.dumps(value, default=str))
+        if key in self._entries:
+            self._remove(key)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, time.monotonic() + self.ttl_seconds, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'expirations': self.expirations,
+            'evictions': self.evictions
+        }
+
+    def _remove(self, key: Any) -> None:
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+# Request coalescing
+class SingleFlight:
+    """Coalesce concurrent calls sharing a key onto one in-flight task.
+
+    Waiters are shielded from each other: a caller that disconnects does not
+    cancel the shared work for everyone else.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Any, asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key: Any, fn):
+        return await asyncio.shield(self.start(key, fn))
+
+    def start(self, key: Any, fn) -> asyncio.Task:
+        """Return the in-flight task for ``key``, starting ``fn()`` if there is none"""
+        task = self._calls.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            self.started += 1
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return task
+
+    def running(self, key: Any) -> bool:
+        return key in self._calls
+
+    def metrics(self) -> Dict[str, int]:
+        return {'in_flight': len(self._calls), 'started': self.started, 'coalesced': self.coalesced}
+
+    def _finish(self, key: Any, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the outcome as retrieved even if every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+platform_flights = SingleFlight()
+recommendation_flights = SingleFlight()
+
+# Outbound rate limiting
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+PRIORITY_BACKGROUND = 2
+
+# Priority of outbound calls made from the current task; copied into child tasks
+outbound_priority: contextvars.ContextVar = contextvars.ContextVar('outbound_priority', default=PRIORITY_INTERACTIVE)
+
+RATE_LIMIT_MAX_WAIT_SECONDS = float(os.environ.get('RATE_LIMIT_MAX_WAIT_SECONDS', '30'))
+HOST_RATE_LIMITS = {
+    # (requests per second, burst)
+    'api.github.com': (
+        float(os.environ.get('GITHUB_RATE_PER_SECOND', '2')),
+        int(os.environ.get('GITHUB_RATE_BURST', '10'))
+    ),
+    # Codeforces documents one request per two seconds and answers bursts
+    # with 503 "Call limit exceeded", so calls are never sent together;
+    # cohort analyses save each profile's user.info call with the bulk lookup
+    'codeforces.com': (
+        float(os.environ.get('CODEFORCES_RATE_PER_SECOND', '0.5')),
+        int(os.environ.get('CODEFORCES_RATE_BURST', '1'))
+    ),
+    'leetcode-api-pied.vercel.app': (
+        float(os.environ.get('LEETCODE_RATE_PER_SECOND', '2')),
+        int(os.environ.get('LEETCODE_RATE_BURST', '5'))
+    ),
+}
+
+class RateLimitExceeded(Exception):
+    pass
+
+class HostRateLimiter:
+    """Token bucket for one upstream host with a priority-ordered wait queue.
+
+    Callers queue instead of failing; lower priority numbers are served first.
+    Rate-limit headers from the host can drain the bucket early or pause it
+    until the advertised reset time.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.requests = 0
+        self.throttled = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    async def acquire(self, priority: int) -> None:
+        self.requests += 1
+        if not self._waiters and self._take():
+            return
+        if self._wait_estimate() > RATE_LIMIT_MAX_WAIT_SECONDS:
+            raise RateLimitExceeded(f"rate limited for another {round(self._wait_estimate())}s")
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await future
+
+    def observe(self, status: int, headers) -> None:
+        """Adapt to rate-limit headers on a response from this host"""
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset = headers.get('X-RateLimit-Reset')
+        retry_after = headers.get('Retry-After')
+        if remaining is not None and remaining.isdigit():
+            self._refill()
+            self.tokens = min(self.tokens, float(remaining))
+            if int(remaining) == 0 and reset and reset.isdigit():
+                self._block(float(reset) - time.time())
+        if status == 429 or (status == 403 and remaining == '0'):
+            self.throttled += 1
+            if retry_after and retry_after.isdigit():
+                self._block(float(retry_after))
+            elif remaining != '0':
+                self._block(1 / self.rate)
+
+    def metrics(self) -> Dict[str, Any]:
+        self._refill()
+        return {
+            'queue_depth': sum(1 for _, _, future in self._waiters if not future.done()),
+            'tokens': round(self.tokens, 2),
+            'blocked_for_seconds': round(max(0.0, self.blocked_until - time.monotonic()), 1),
+            'requests': self.requests,
+            'throttled': self.throttled
+        }
+
+    def _block(self, seconds: float) -> None:
+        self.blocked_until = max(self.blocked_until, time.monotonic() + max(0.0, seconds))
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _take(self) -> bool:
+        if time.monotonic() < self.blocked_until:
+            return False
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def _wait_estimate(self) -> float:
+        now = time.monotonic()
+        queued = len(self._waiters) + 1
+        return max(0.0, self.blocked_until - now) + max(0.0, queued - self.tokens) / self.rate
+
+    async def _dispatch(self) -> None:
+        while self._waiters:
+            future = self._waiters[0][2]
+            if future.done():
+                heapq.heappop(self._waiters)
+            elif self._take():
+                heapq.heappop(self._waiters)
+                future.set_result(None)
+            else:
+                delay = max(self.blocked_until - time.monotonic(), (1 - self.tokens) / self.rate)
+                await asyncio.sleep(max(delay, 0.01))
+
+class OutboundScheduler:
+    """Routes every platform HTTP call through its host's rate limiter"""
+
+    def __init__(self, limits: Dict[str, Tuple[float, int]]):
+        self.limiters = {host: HostRateLimiter(rate, burst) for host, (rate, burst) in limits.items()}
+
+    async def acquire(self, url: str) -> None:
+        limiter = self.limiters.get(URL(url).host)
+        if limiter is not None:
+            await limiter.acquire(outbound_priority.get())
+
+    def observe(self, url: str, status: int, headers) -> None:
+        limiter = self.limiters.get(URL(url).host)
+        if limiter is not None:
+            limiter.observe(status, headers)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {host: limiter.metrics() for host, limiter in self.limiters.items()}
+
+outbound_scheduler = OutboundScheduler(HOST_RATE_LIMITS)
+
+# Outbound resilience: deadlines, retries and circuit breakers
+REQUEST_DEADLINE_SECONDS = float(os.environ.get('REQUEST_DEADLINE_SECONDS', '45'))
+LLM_TIMEOUT_SECONDS = float(os.environ.get('LLM_TIMEOUT_SECONDS', '30'))
+HTTP_MAX_RETRIES = int(os.environ.get('HTTP_MAX_RETRIES', '2'))
+HTTP_RETRY_BASE_SECONDS = float(os.environ.get('HTTP_RETRY_BASE_SECONDS', '0.5'))
+HTTP_RETRY_MAX_SECONDS = float(os.environ.get('HTTP_RETRY_MAX_SECONDS', '4'))
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', '5'))
+CIRCUIT_RESET_SECONDS = float(os.environ.get('CIRCUIT_RESET_SECONDS', '30'))
+
+# Monotonic time by which the current request must finish; copied into child tasks
+request_deadline: contextvars.ContextVar = contextvars.ContextVar('request_deadline', default=None)
+
+class DeadlineExceeded(Exception):
+    pass
+
+class CircuitOpenError(Exception):
+    pass
+
+class UpstreamResponseError(Exception):
+    pass
+
+def _deadline_after(seconds: float) -> float:
+    """A deadline ``seconds`` from now, never later than one already in force"""
+    deadline = time.monotonic() + seconds
+    current = request_deadline.get()
+    return deadline if current is None else min(deadline, current)
+
+def remaining_budget(limit: float) -> float:
+    """Seconds a call may take: ``limit``, capped by the request deadline if one is set"""
+    deadline = request_deadline.get()
+    if deadline is None:
+        return limit
+    return min(limit, deadline - time.monotonic())
+
+class CircuitBreaker:
+    """Consecutive-failure breaker for one upstream host.
+
+    After ``threshold`` failures in a row the circuit opens and calls fail
+    fast. Once ``reset_seconds`` have passed a single trial call is let
+    through; its outcome closes the circuit or opens it again.
+    """
+
+    def __init__(self, threshold: int, reset_seconds: float):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_started: Optional[float] = None
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        if self.state == 'open' and now - self.opened_at >= self.reset_seconds:
+            self.state = 'half_open'
+            self.trial_started = None
+        if self.state == 'closed':
+            return True
+        # A trial that never reported back (e.g. cancelled) stops blocking after a reset period
+        if self.state == 'half_open' and (self.trial_started is None or now - self.trial_started >= self.reset_seconds):
+            self.trial_started = now
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self) -> None:
+        self.state = 'closed'
+        self.failures = 0
+        self.trial_started = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == 'half_open' or self.failures >= self.threshold:
+            self.state = 'open'
+            self.opened_at = time.monotonic()
+            self.trial_started = None
+
+    def metrics(self) -> Dict[str, Any]:
+        return {'state': self.state, 'consecutive_failures': self.failures, 'rejected': self.rejected}
+
+circuit_breakers: Dict[str, CircuitBreaker] = {}
+
+def get_circuit_breaker(host: str) -> CircuitBreaker:
+    breaker = circuit_breakers.get(host)
+    if breaker is None:
+        breaker = circuit_breakers[host] = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS)
+    return breaker
+
+def _retry_delay(attempt: int, retry_after: Optional[str]) -> float:
+    """Full-jitter exponential backoff, never shorter than a Retry-After hint"""
+    delay = random.uniform(0, min(HTTP_RETRY_MAX_SECONDS, HTTP_RETRY_BASE_SECONDS * 2 ** attempt))
+    if retry_after and retry_after.isdigit():
+        delay = max(delay, float(retry_after))
+    return delay
+
+# Conditional request cache
+ETAG_CACHE_TTL_SECONDS = int(os.environ.get('ETAG_CACHE_TTL_SECONDS', str(7 * 24 * 3600)))
+ETAG_MEMORY_CACHE_ENTRIES = int(os.environ.get('ETAG_MEMORY_CACHE_ENTRIES', '1024'))
+ETAG_MEMORY_CACHE_BYTES = int(os.environ.get('ETAG_MEMORY_CACHE_BYTES', str(32 * 1024 * 1024)))
+
+class ETagCache:
+    """ETag and body per URL, so refreshes can be sent as conditional requests.
+
+    A 304 answer reuses the stored body; for GitHub it also does not count
+    against the rate limit. Entries live in Mongo with an in-process LRU in front.
+    """
+
+    def __init__(self, collection, ttl_seconds: int, memory: LRUCache):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+        self.memory = memory
+        self.revalidated = 0
+
+    async def ensure_indexes(self) -> None:
+        await self.collection.create_index('url', unique=True)
+        await self.collection.create_index('expires_at', expireAfterSeconds=0)
+
+    async def get(self, url: str) -> Optional[Dict[str, Any]]:
+        entry = self.memory.get(url)
+        if entry is not None:
+            return entry
+        try:
+            entry = await self.collection.find_one({'url': url}, {'_id': 0, 'etag': 1, 'body': 1})
+        except Exception as e:
+            logger.warning(f"ETag cache read failed for {url}: {str(e)}")
+            return None
+        if entry:
+            self.memory.set(url, entry)
+        return entry
+
+    async def set(self, url: str, etag: str, body: Any) -> None:
+        entry = {'etag': etag, 'body': body}
+        self.memory.set(url, entry)
+        stored_at = datetime.now(timezone.utc)
+        try:
+            await self.collection.update_one(
+                {'url': url},
+                {'$set': {
+                    **entry,
+                    'stored_at': stored_at,
+                    'expires_at': stored_at + timedelta(seconds=self.ttl_seconds)
+                }},
+                upsert=True
+            )
+        except Exception as e:
+            logger.warning(f"ETag cache write failed for {url}: {str(e)}")
+
+    def metrics(self) -> Dict[str, Any]:
+        return {'revalidated': self.revalidated, 'memory': self.memory.metrics()}
+
+etag_cache = ETagCache(
+    db.http_etag_cache, ETAG_CACHE_TTL_SECONDS,
+    LRUCache(ETAG_MEMORY_CACHE_ENTRIES, ETAG_MEMORY_CACHE_BYTES, ETAG_CACHE_TTL_SECONDS)
+)
+
 # Platform Data Fetchers
+GITHUB_TOKEN = os.environ.get('GITHUB_TOKEN')
+# 'rest', 'graphql' or 'auto'; GraphQL requires a token, so without one REST is used
+GITHUB_FETCH_MODE = os.environ.get('GITHUB_FETCH_MODE', 'auto').lower()
+if GITHUB_FETCH_MODE != 'rest':
+    GITHUB_FETCH_MODE = 'graphql' if GITHUB_TOKEN else 'rest'
+GITHUB_CONTRIBUTION_DAYS = int(os.environ.get('GITHUB_CONTRIBUTION_DAYS', '30'))
+
+GITHUB_GRAPHQL_QUERY = """
+query($login: String!, $from: DateTime!) {
+  user(login: $login) {
+    name
+    bio
+    createdAt
+    followers { totalCount }
+    following { totalCount }
+    repositories(ownerAffiliations: OWNER, privacy: PUBLIC) { totalCount }
+    recentRepos: repositories(first: 10, ownerAffiliations: OWNER, privacy: PUBLIC,
+                              orderBy: {field: UPDATED_AT, direction: DESC}) {
+      nodes { name stargazerCount primaryLanguage { name } }
+    }
+    contributionsCollection(from: $from) { totalCommitContributions }
+  }
+}
+"""
+
+def _github_headers() -> Dict[str, str]:
+    return {'Authorization': f"Bearer {GITHUB_TOKEN}"} if GITHUB_TOKEN else {}
+
+async def _request(session: aiohttp.ClientSession, method: str, url: str,
+                   headers: Optional[Dict[str, str]] = None,
+                   payload: Optional[Dict[str, Any]] = None,
+                   error_body: bool = False) -> Tuple[int, Any, Any]:
+    """Send one outbound call through the host's breaker and rate limiter.
+
+    Returns the status, the JSON body (None unless 200, or with
+    ``error_body`` any final status whose body is JSON) and the response
+    headers. 5xx, 429 and connection failures are retried with jittered
+    backoff while the request deadline allows; each attempt's timeout is
+    capped by the remaining budget. A 200 whose body is not JSON is not
+    retried and raises UpstreamResponseError. The breaker sees one outcome
+    per call, and a 429 counts as the host being up: throttling is the rate
+    limiter's job.
+    """
+    host = URL(url).host
+    breaker = get_circuit_breaker(host)
+    if not breaker.allow():
+        raise CircuitOpenError(f"{host} is unavailable (circuit open)")
+
+    attempt = 0
+    failed = False
+    try:
+        while True:
+            budget = remaining_budget(HTTP_TOTAL_TIMEOUT)
+            if budget <= 0:
+                raise DeadlineExceeded(f"deadline exceeded before calling {host}")
+            try:
+                await asyncio.wait_for(outbound_scheduler.acquire(url), budget)
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded(f"deadline exceeded waiting for the {host} rate limit")
+            # aiohttp treats a non-positive total as no timeout at all
+            budget = remaining_budget(HTTP_TOTAL_TIMEOUT)
+            if budget <= 0:
+                raise DeadlineExceeded(f"deadline exceeded waiting for the {host} rate limit")
+
+            timeout = aiohttp.ClientTimeout(total=budget, sock_connect=HTTP_CONNECT_TIMEOUT, sock_read=HTTP_READ_TIMEOUT)
+            error: Optional[Exception] = None
+            retry_after = None
+            raw = None
+            try:
+                async with session.request(method, url, headers=headers or {}, json=payload, timeout=timeout) as response:
+                    outbound_scheduler.observe(url, response.status, response.headers)
+                    status, response_headers = response.status, response.headers
+                    if status not in RETRYABLE_STATUSES:
+                        if status == 200 or error_body:
+                            raw = await response.read()
+                    else:
+                        retry_after = response_headers.get('Retry-After')
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+
+            if error is None and status not in RETRYABLE_STATUSES:
+                # A body that arrived but is not JSON won't improve on a retry
+                try:
+                    body = json.loads(raw) if raw is not None else None
+                except ValueError as e:
+                    if status == 200:
+                        failed = True
+                        raise UpstreamResponseError(f"{method} {url} returned a body that is not JSON") from e
+                    body = None
+                breaker.record_success()
+                return status, body, response_headers
+
+            failed = error is not None or status != 429
+            delay = _retry_delay(attempt, retry_after)
+            if attempt >= HTTP_MAX_RETRIES or delay >= remaining_budget(HTTP_TOTAL_TIMEOUT):
+                if isinstance(error, asyncio.TimeoutError):
+                    raise asyncio.TimeoutError(f"{method} {url} timed out") from error
+                if error is not None:
+                    raise error
+                if failed:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                return status, None, response_headers
+            attempt += 1
+            logger.warning(f"Retrying {method} {url} in {delay:.2f}s (attempt {attempt}): {repr(error) if error else status}")
+            await asyncio.sleep(delay)
+    except Exception:
+        # Gave up after a failed attempt: one failure for the whole call
+        if failed:
+            breaker.record_failure()
+        raise
+
+async def _post_json(session: aiohttp.ClientSession, url: str, payload: Dict[str, Any],
+                     headers: Optional[Dict[str, str]] = None) -> Tuple[int, Any]:
+    """POST JSON and return the status with the JSON body (None unless 200)"""
+    status, body, _ = await _request(session, 'POST', url, headers=headers, payload=payload)
+    return status, body
+
+async def _get_json(session: aiohttp.ClientSession, url: str, conditional: bool = False,
+                    headers: Optional[Dict[str, str]] = None, error_body: bool = False) -> Tuple[int, Any]:
+    """GET a URL and return its status with the JSON body (None unless 200).
+
+    With ``conditional`` the request carries If-None-Match for a previously
+    stored ETag, and a 304 is answered from the stored body as a 200. With
+    ``error_body`` a JSON error body is returned as well.
+    """
+    headers = dict(headers or {})
+    cached = await etag_cache.get(url) if conditional else None
+    if cached:
+        headers['If-None-Match'] = cached['etag']
+    status, body, response_headers = await _request(session, 'GET', url, headers=headers, error_body=error_body)
+    if status == 304 and cached:
+        etag_cache.revalidated += 1
+        return 200, cached['body']
+    if status == 200 and conditional and response_headers.get('ETag'):
+        await etag_cache.set(url, response_headers['ETag'], body)
+    return status, body
+
+async def _cancel_tasks(*tasks: asyncio.Task) -> None:
+    """Cancel any still-running tasks and wait for them to unwind"""
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+CODEFORCES_INFO_BATCH_SIZE = 100
+# Comment of a FAILED user.info call naming the first unknown handle
+CODEFORCES_UNKNOWN_HANDLE = re.compile(r'User with handle (\S+) not found')
+
 class PlatformDataFetcher:
     
     @staticmethod
     async def fetch_github_stats(username: str) -> Dict[str, Any]:
         """Fetch GitHub user statistics and recent activity"""
         try:
-            async with aiohttp.ClientSession() as session:
-                # Get user info
-                user_url = f"https://api.github.com/users/{username}"
-                async with session.get(user_url) as response:
-                    if response.status != 200:
-                        raise HTTPException(status_code=404, detail=f"GitHub user {username} not found")
-                    user_data = await response.json()
-                
-                # Get repositories
-                repos_url = f"https://api.github.com/users/{username}/repos?sort=updated&per_page=10"
-                async with session.get(repos_url) as response:
-                    repos_data = await response.json() if response.status == 200 else []
-                
-                # Get events (recent activity)
-                events_url = f"https://api.github.com/users/{username}/events?per_page=30"
-                async with session.get(events_url) as response:
-                    events_data = await response.json() if response.status == 200 else []
-                
-                # Process data
-                languages = {}
-                total_stars = 0
-                recent_commits = 0
-                
-                for repo in repos_data:
-                    if repo.get('stargazers_count'):
-                        total_stars += repo['stargazers_count']
-                    if repo.get('language'):
-                        languages[repo['language']] = languages.get(repo['language'], 0) + 1
-                
-                for event in events_data:
-                    if event.get('type') == 'PushEvent':
-                        recent_commits += len(event.get('payload', {}).get('commits', []))
-                
-                return {
-                    'profile': {
-                        'name': user_data.get('name'),
-                        'public_repos': user_data.get('public_repos', 0),
-                        'followers': user_data.get('followers', 0),
-                        'following': user_data.get('following', 0),
-                        'created_at': user_data.get('created_at'),
-                        'bio': user_data.get('bio')
-                    },
-                    'activity': {
-                        'total_stars': total_stars,
-                        'recent_commits': recent_commits,
-                        'top_languages': dict(sorted(languages.items(), key=lambda x: x[1], reverse=True)[:5]),
-                        'recent_repos': [{'name': repo['name'], 'language': repo.get('language')} for repo in repos_data[:5]]
-                    }
+            if GITHUB_FETCH_MODE == 'graphql':
+                user_data, repos_data, recent_commits = await PlatformDataFetcher._fetch_github_graphql(username)
+            else:
+                user_data, repos_data, recent_commits = await PlatformDataFetcher._fetch_github_rest(username)
+            
+            # Process data
+            languages = {}
+            total_stars = 0
+            
+            for repo in repos_data:
+                if repo.get('stargazers_count'):
+                    total_stars += repo['stargazers_count']
+                if repo.get('language'):
+                    languages[repo['language']] = languages.get(repo['language'], 0) + 1
+            
+            return {
+                'profile': {
+                    'name': user_data.get('name'),
+                    'public_repos': user_data.get('public_repos', 0),
+                    'followers': user_data.get('followers', 0),
+                    'following': user_data.get('following', 0),
+                    'created_at': user_data.get('created_at'),
+                    'bio': user_data.get('bio')
+                },
+                'activity': {
+                    'total_stars': total_stars,
+                    'recent_commits': recent_commits,
+                    'top_languages': dict(sorted(languages.items(), key=lambda x: x[1], reverse=True)[:5]),
+                    'recent_repos': [{'name': repo['name'], 'language': repo.get('language')} for repo in repos_data[:5]]
                 }
+            }
         except Exception as e:
             logger.error(f"Error fetching GitHub data for {username}: {str(e)}")
             raise HTTPException(status_code=400, detail=f"Error fetching GitHub data: {str(e)}")
 
     @staticmethod
-    async def fetch_leetcode_stats(username: str) -> Dict[str, Any]:
-        """Fetch LeetCode user statistics using unofficial API"""
+    async def _fetch_github_rest(username: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]], int]:
+        """User, repositories and commit count from three REST calls"""
+        session = get_http_session()
+        headers = _github_headers()
+        # Launch user info, repositories and events together; only the
+        # user lookup decides whether the others are worth keeping
+        user_url = f"https://api.github.com/users/{username}"
+        repos_url = f"https://api.github.com/users/{username}/repos?sort=updated&per_page=10"
+        events_url = f"https://api.github.com/users/{username}/events?per_page=30"
+        user_task = asyncio.create_task(_get_json(session, user_url, conditional=True, headers=headers))
+        repos_task = asyncio.create_task(_get_json(session, repos_url, conditional=True, headers=headers))
+        events_task = asyncio.create_task(_get_json(session, events_url, conditional=True, headers=headers))
+        try:
+            status, user_data = await user_task
+            if status == 404:
+                raise HTTPException(status_code=404, detail=f"GitHub user {username} not found")
+            if status != 200:
+                raise HTTPException(status_code=502, detail=f"GitHub request failed with status {status}")
+            (_, repos_data), (_, events_data) = await asyncio.gather(repos_task, events_task)
+        finally:
+            await _cancel_tasks(repos_task, events_task)
+        
+        # Commits pushed within the last 30 public events
+        recent_commits = 0
+        for event in events_data or []:
+            if event.get('type') == 'PushEvent':
+                recent_commits += len(event.get('payload', {}).get('commits', []))
+        return user_data, repos_data or [], recent_commits
+
+    @staticmethod
+    async def _fetch_github_graphql(username: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]], int]:
+        """User, repositories and commit count from a single GraphQL query.
+
+        Results are mapped onto the REST field names so both modes normalize
+        identically; commits come from the contribution calendar instead of
+        the event window.
+        """
+        since = datetime.now(timezone.utc) - timedelta(days=GITHUB_CONTRIBUTION_DAYS)
+        status, response = await _post_json(
+            get_http_session(),
+            'https://api.github.com/graphql',
+            {'query': GITHUB_GRAPHQL_QUERY, 'variables': {'login': username, 'from': since.isoformat()}},
+            headers=_github_headers()
+        )
+        if status != 200:
+            raise HTTPException(status_code=502, detail=f"GitHub GraphQL request failed with status {status}")
+        response = response or {}
+        # GitHub answers {"data": null, "errors": [...]} for bad scopes, rate limits and query errors
+        user = (response.get('data') or {}).get('user')
+        if not user:
+            errors = response.get('errors') or []
+            if any(error.get('type') != 'NOT_FOUND' for error in errors):
+                messages = '; '.join(error.get('message', 'unknown error') for error in errors)
+                logger.error(f"GitHub GraphQL errors for {username}: {messages}")
+                raise HTTPException(status_code=502, detail=f"GitHub GraphQL error: {messages}")
+            raise HTTPException(status_code=404, detail=f"GitHub user {username} not found")
+        
+        user_data = {
+            'name': user.get('name'),
+            'public_repos': user['repositories']['totalCount'],
+            'followers': user['followers']['totalCount'],
+            'following': user['following']['totalCount'],
+            'created_at': user.get('createdAt'),
+            'bio': user.get('bio')
+        }
+        repos_data = [
+            {
+                'name': repo['name'],
+                'language': (repo.get('primaryLanguage') or {}).get('name'),
+                'stargazers_count': repo.get('stargazerCount', 0)
+            }
+            for repo in user['recentRepos']['nodes']
+        ]
+        return user_data, repos_data, user['contributionsCollection']['totalCommitContributions']
+
+    @staticmethod
+    async def fetch_leetcode_stats(username: str) -> Dict[str, Any]:
+        """Fetch LeetCode user statistics using unofficial API"""
+        try:
+            session = get_http_session()
+            # Use the provided LeetCode API
+            leetcode_url = f"https://leetcode-api-pied.vercel.app/user/{username}"
+            status, data = await _get_json(session, leetcode_url)
+            if status != 200:
+                raise HTTPException(status_code=404, detail=f"LeetCode user {username} not found")
+            
+            # Extract relevant information from the API response
+            profile_data = data.get('profile', {})
+            submit_stats = data.get('submitStats', {})
+            
+            # Parse solved problems statistics
+            ac_submission = submit_stats.get('acSubmissionNum', [])
+            total_solved = 0
+            easy_solved = 0
+            medium_solved = 0
+            hard_solved = 0
+            
+            for stat in ac_submission:
+                difficulty = stat.get('difficulty', '').lower()
+                count = stat.get('count', 0)
+                if difficulty == 'all':
+                    total_solved = count
+                elif difficulty == 'easy':
+                    easy_solved = count
+                elif difficulty == 'medium':
+                    medium_solved = count
+                elif difficulty == 'hard':
+                    hard_solved = count
+            
+            # Calculate acceptance rate
+            total_submissions = submit_stats.get('totalSubmissionNum', [])
+            total_accepted = next((item.get('count', 0) for item in total_submissions if item.get('difficulty') == 'All'), 0)
+            total_submitted = next((item.get('submissions', 0) for item in total_submissions if item.get('difficulty') == 'All'), 1)
+            acceptance_rate = round((total_accepted / max(total_submitted, 1)) * 100, 1) if total_submitted > 0 else 0
+            
+            return {
+                'profile': {
+                    'username': username,
+                    'real_name': profile_data.get('realName', 'Unknown'),
+                    'ranking': profile_data.get('ranking', 'N/A'),
+                    'reputation': profile_data.get('reputation', 0),
+                    'github_link': profile_data.get('githubUrl', ''),
+                    'twitter_link': profile_data.get('twitterUrl', ''),
+                    'linkedin_link': profile_data.get('linkedinUrl', ''),
+                    'about_me': profile_data.get('aboutMe', '')
+                },
+                'activity': {
+                    'total_solved': total_solved,
+                    'easy_solved': easy_solved,
+                    'medium_solved': medium_solved,
+                    'hard_solved': hard_solved,
+                    'acceptance_rate': f"{acceptance_rate}%",
+                    'total_submissions': total_accepted,
+                    'contribution_points': profile_data.get('contributionPoints', 0),
+                    'reputation': profile_data.get('reputation', 0)
+                }
+            }
+            
+        except Exception as e:
+            logger.error(f"Error fetching LeetCode data for {username}: {str(e)}")
+            return {
+                'profile': {'username': username},
+                'activity': {'note': 'Unable to fetch LeetCode data'},
+                'error': str(e)
+            }
+
+    @staticmethod
+    async def fetch_codeforces_stats(username: str, user_info: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Fetch Codeforces user statistics using official API.
+
+        ``user_info`` may carry a ``user.info`` record already fetched in bulk,
+        in which case only the rating history and submissions are requested.
+        """
+        try:
+            session = get_http_session()
+            # Launch user info, rating history and submissions (last 100)
+            # together; only the user lookup decides whether to keep the rest
+            user_url = f"https://codeforces.com/api/user.info?handles={username}"
+            rating_url = f"https://codeforces.com/api/user.rating?handle={username}"
+            submissions_url = f"https://codeforces.com/api/user.status?handle={username}&from=1&count=100"
+            if user_info is None:
+                user_task = asyncio.create_task(_get_json(session, user_url))
+            rating_task = asyncio.create_task(_get_json(session, rating_url))
+            submissions_task = asyncio.create_task(_get_json(session, submissions_url))
+            try:
+                if user_info is None:
+                    status, user_response = await user_task
+                    if status != 200 or user_response['status'] != 'OK':
+                        raise HTTPException(status_code=404, detail=f"Codeforces user {username} not found")
+                    user_info = user_response['result'][0]
+                user_data = user_info
+                (_, rating_response), (_, submissions_response) = await asyncio.gather(rating_task, submissions_task)
+            finally:
+                await _cancel_tasks(rating_task, submissions_task)
+            
+            rating_data = []
+            if rating_response and rating_response['status'] == 'OK':
+                rating_data = rating_response['result']
+            
+            submissions_data = []
+            if submissions_response and submissions_response['status'] == 'OK':
+                submissions_data = submissions_response['result']
+            
+            # Process submissions
+            solved_problems = set()
+            for submission in submissions_data:
+                if submission.get('verdict') == 'OK':
+                    problem_id = f"{submission['problem']['contestId']}-{submission['problem']['index']}"
+                    solved_problems.add(problem_id)
+            
+            current_rating = user_data.get('rating', 0)
+            max_rating = user_data.get('maxRating', 0)
+            
+            return {
+                'profile': {
+                    'handle': user_data.get('handle'),
+                    'first_name': user_data.get('firstName', ''),
+                    'last_name': user_data.get('lastName', ''),
+                    'country': user_data.get('country', ''),
+                    'city': user_data.get('city', ''),
+                    'organization': user_data.get('organization', ''),
+                    'rank': user_data.get('rank', 'unrated'),
+                    'max_rank': user_data.get('maxRank', 'unrated')
+                },
+                'activity': {
+                    'current_rating': current_rating,
+                    'max_rating': max_rating,
+                    'contests_participated': len(rating_data),
+                    'problems_solved': len(solved_problems),
+                    'total_submissions': len(submissions_data),
+                    'recent_activity': 'Active' if submissions_data else 'Inactive'
+                }
+            }
+        except Exception as e:
+            logger.error(f"Error fetching Codeforces data for {username}: {str(e)}")
+            raise HTTPException(status_code=400, detail=f"Error fetching Codeforces data: {str(e)}")
+
+    @staticmethod
+    async def fetch_codeforces_user_infos(handles: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Look up many Codeforces handles with multi-handle user.info calls.
+
+        Returns records keyed by lowercased handle. Codeforces fails the whole
+        call if any handle is unknown and names the first one, so that handle
+        is dropped and the chunk retried. A chunk that fails for any other
+        reason is skipped; its handles fall back to per-user lookups.
+        """
+        infos = {}
+        session = get_http_session()
+        for start in range(0, len(handles), CODEFORCES_INFO_BATCH_SIZE):
+            chunk = handles[start:start + CODEFORCES_INFO_BATCH_SIZE]
+            while chunk:
+                url = f"https://codeforces.com/api/user.info?handles={';'.join(chunk)}"
+                try:
+                    status, response = await _get_json(session, url, error_body=True)
+                except Exception as e:
+                    logger.warning(f"Bulk Codeforces lookup failed: {str(e)}")
+                    break
+                if not isinstance(response, dict):
+                    break
+                if status == 200 and response.get('status') == 'OK':
+                    for info in response['result']:
+                        infos[info['handle'].lower()] = info
+                    break
+                unknown = CODEFORCES_UNKNOWN_HANDLE.search(response.get('comment') or '')
+                remaining = [handle for handle in chunk if not unknown or handle.lower() != unknown.group(1).lower()]
+                if len(remaining) == len(chunk):
+                    logger.warning(f"Bulk Codeforces lookup failed: {response.get('comment')}")
+                    break
+                chunk = remaining
+        return infos
+
+    @staticmethod
+    async def fetch_platform(platform: str, username: str, **fetch_kwargs) -> Dict[str, Any]:
+        """Fetch a single platform, folding any failure into an error dict"""
+        fetcher = PLATFORM_FETCHERS[platform]
+        if fetch_kwargs:
+            fetcher = functools.partial(fetcher, **fetch_kwargs)
+        try:
+            return await platform_flights.do(
+                (platform, username.lower()),
+                lambda: platform_stats_cache.get_or_fetch(platform, username, fetcher)
+            )
+        except Exception as e:
+            return {'error': str(e)}
+
+    @staticmethod
+    async def fetch_all(usernames: Dict[str, Optional[str]],
+                        fetch_kwargs: Optional[Dict[str, Dict[str, Any]]] = None) -> Tuple[Dict[str, Any], Dict[str, float]]:
+        """Fetch every requested platform concurrently.
+
+        ``fetch_kwargs`` maps a platform to extra arguments for its fetcher,
+        such as a Codeforces ``user_info`` looked up in bulk. Returns the
+        activity data keyed by platform together with the per-platform fetch
+        time in milliseconds.
+        """
+        fetch_kwargs = fetch_kwargs or {}
+        platforms = [platform for platform, username in usernames.items() if username]
+        timings = {}
+
+        async def timed_fetch(platform: str) -> Dict[str, Any]:
+            started = time.perf_counter()
+            result = await PlatformDataFetcher.fetch_platform(
+                platform, usernames[platform], **fetch_kwargs.get(platform, {})
+            )
+            timings[platform] = _elapsed_ms(started)
+            return result
+
+        results = await asyncio.gather(*(timed_fetch(platform) for platform in platforms))
+        return dict(zip(platforms, results)), timings
+
+PLATFORM_FETCHERS = {
+    'github': PlatformDataFetcher.fetch_github_stats,
+    'leetcode': PlatformDataFetcher.fetch_leetcode_stats,
+    'codeforces': PlatformDataFetcher.fetch_codeforces_stats,
+}
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 1)
+
+def _as_utc(value: datetime) -> datetime:
+    """Mongo hands back naive datetimes; treat them as UTC"""
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+# Activity snapshots
+SNAPSHOT_RETENTION_DAYS = int(os.environ.get('SNAPSHOT_RETENTION_DAYS', '365'))
+SNAPSHOT_BATCH_SIZE = int(os.environ.get('SNAPSHOT_BATCH_SIZE', '100'))
+SNAPSHOT_FLUSH_SECONDS = float(os.environ.get('SNAPSHOT_FLUSH_SECONDS', '5'))
+SNAPSHOT_MAX_PENDING = int(os.environ.get('SNAPSHOT_MAX_PENDING', '5000'))
+SNAPSHOT_HISTORY_LIMIT = int(os.environ.get('SNAPSHOT_HISTORY_LIMIT', '1000'))
+
+class ActivitySnapshotStore:
+    """History of fetched platform activity in a MongoDB time-series collection.
+
+    Every upstream fetch records the normalized ``activity`` block with
+    platform and username as series metadata, so Mongo buckets each
+    account's snapshots together and progress queries are range scans.
+    Snapshots are buffered and inserted in batches; being history rather
+    than state, a batch that fails to insert is logged and dropped. Buckets
+    older than the retention period are expired by Mongo.
+    """
+
+    def __init__(self, database, name: str, retention_days: int, batch_size: int,
+                 flush_seconds: float, max_pending: int):
+        self.database = database
+        self.name = name
+        self.collection = database[name]
+        self.retention_seconds = retention_days * 86400
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self._pending: List[Dict[str, Any]] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.recorded = 0
+        self.dropped = 0
+
+    async def ensure_collection(self) -> None:
+        """Create the time-series collection (MongoDB 5.0+), or sync its expiry with the config"""
+        if self.name not in await self.database.list_collection_names():
+            await self.database.create_collection(
+                self.name,
+                timeseries={'timeField': 'fetched_at', 'metaField': 'meta', 'granularity': 'hours'},
+                expireAfterSeconds=self.retention_seconds
+            )
+        else:
+            await self.database.command('collMod', self.name, expireAfterSeconds=self.retention_seconds)
+        await self.collection.create_index([('meta.platform', 1), ('meta.username', 1), ('fetched_at', 1)])
+
+    def start(self) -> None:
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            # Let an insert in progress finish; cancelling it would lose its batch
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def record(self, platform: str, username: str, stats: Dict[str, Any]) -> None:
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        snapshot = ActivityStats(platform=platform, username=username.lower(), stats=stats.get('activity', {}))
+        self._pending.append({
+            'meta': {'platform': snapshot.platform, 'username': snapshot.username},
+            'fetched_at': snapshot.fetched_at,
+            'activity': snapshot.stats
+        })
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def history(self, platform: str, username: str, since: datetime) -> Tuple[List[Dict[str, Any]], bool]:
+        """The newest ``SNAPSHOT_HISTORY_LIMIT`` snapshots since ``since``, oldest first.
+
+        Also returns whether older snapshots in range were left out.
+        """
+        cursor = self.collection.find(
+            {'meta.platform': platform, 'meta.username': username.lower(), 'fetched_at': {'$gte': since}},
+            {'_id': 0, 'fetched_at': 1, 'activity': 1}
+        ).sort('fetched_at', -1).limit(SNAPSHOT_HISTORY_LIMIT + 1)
+        snapshots = await cursor.to_list(length=SNAPSHOT_HISTORY_LIMIT + 1)
+        truncated = len(snapshots) > SNAPSHOT_HISTORY_LIMIT
+        snapshots = snapshots[:SNAPSHOT_HISTORY_LIMIT]
+        snapshots.reverse()
+        return [{**snapshot, 'fetched_at': _as_utc(snapshot['fetched_at'])} for snapshot in snapshots], truncated
+
+    async def flush(self) -> None:
+        snapshots, self._pending = self._pending, []
+        if not snapshots:
+            return
+        try:
+            await self.collection.insert_many(snapshots, ordered=False)
+            self.recorded += len(snapshots)
+        except Exception as e:
+            self.dropped += len(snapshots)
+            logger.warning(f"Could not record {len(snapshots)} activity snapshots: {str(e)}")
+
+    def metrics(self) -> Dict[str, Any]:
+        return {'queued': len(self._pending), 'recorded': self.recorded, 'dropped': self.dropped}
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+activity_snapshots = ActivitySnapshotStore(
+    db, 'activity_snapshots', SNAPSHOT_RETENTION_DAYS,
+    SNAPSHOT_BATCH_SIZE, SNAPSHOT_FLUSH_SECONDS, SNAPSHOT_MAX_PENDING
+)
+
+# Platform Stats Cache
+STATS_CACHE_FRESH_SECONDS = int(os.environ.get('STATS_CACHE_FRESH_SECONDS', '900'))
+STATS_CACHE_MAX_AGE_SECONDS = int(os.environ.get('STATS_CACHE_MAX_AGE_SECONDS', '86400'))
+# Entries past max age are kept this much longer, only to be served while their platform is down
+STATS_CACHE_OUTAGE_GRACE_SECONDS = int(os.environ.get('STATS_CACHE_OUTAGE_GRACE_SECONDS', str(7 * 86400)))
+STATS_MEMORY_CACHE_ENTRIES = int(os.environ.get('STATS_MEMORY_CACHE_ENTRIES', '2048'))
+STATS_MEMORY_CACHE_BYTES = int(os.environ.get('STATS_MEMORY_CACHE_BYTES', str(16 * 1024 * 1024)))
+STATS_MEMORY_CACHE_TTL_SECONDS = int(os.environ.get('STATS_MEMORY_CACHE_TTL_SECONDS', str(STATS_CACHE_MAX_AGE_SECONDS + STATS_CACHE_OUTAGE_GRACE_SECONDS)))
+
+class PlatformStatsCache:
+    """Mongo-backed cache of normalized platform stats keyed by (platform, username).
+
+    Fresh entries are served as-is. Stale entries are served immediately while
+    a background task refreshes them, and a TTL index on ``expires_at`` drops
+    entries that nobody has refreshed within the maximum age plus an outage
+    grace period. Entries past the maximum age are refetched, but are still
+    served if the platform is failing. An optional in-process LRU tier sits
+    in front of Mongo so hot usernames skip the database round trip.
+    """
+
+    def __init__(self, collection, fresh_seconds: int, max_age_seconds: int, memory: Optional[LRUCache] = None,
+                 outage_grace_seconds: int = 0, snapshots: Optional[ActivitySnapshotStore] = None):
+        self.collection = collection
+        self.memory = memory
+        self.snapshots = snapshots
+        self.fresh_seconds = fresh_seconds
+        self.max_age_seconds = max_age_seconds
+        self.outage_grace_seconds = outage_grace_seconds
+        self.served_during_outage = 0
+        self._refreshing: Dict[Tuple[str, str], asyncio.Task] = {}
+
+    async def ensure_indexes(self) -> None:
+        await self.collection.create_index([('platform', 1), ('username', 1)], unique=True)
+        await self.collection.create_index('expires_at', expireAfterSeconds=0)
+
+    async def get_or_fetch(self, platform: str, username: str, fetcher) -> Dict[str, Any]:
+        key = (platform, username.lower())
+        entry = await self._load(key)
+        if entry:
+            age = (datetime.now(timezone.utc) - _as_utc(entry['fetched_at'])).total_seconds()
+            if age < self.fresh_seconds:
+                return entry['stats']
+            if age < self.max_age_seconds:
+                self._schedule_refresh(key, username, fetcher)
+                return entry['stats']
+        try:
+            stats = await self._fetch_and_store(key, username, fetcher)
+        except Exception as e:
+            if not entry:
+                raise
+            stats = {'error': str(e)}
+        # Expired data beats no data while the platform is down or timing out
+        if 'error' in stats and entry:
+            logger.warning(f"Serving expired {platform}/{username} stats: {stats['error']}")
+            self.served_during_outage += 1
+            return entry['stats']
+        return stats
+
+    async def fresh_usernames(self, platform: str, usernames: List[str]) -> set:
+        """The lowercased usernames whose cached stats are still fresh, read in one query"""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.fresh_seconds)
+        fresh, unknown = set(), []
+        for username in {username.lower() for username in usernames}:
+            entry = self.memory.get((platform, username)) if self.memory is not None else None
+            if entry is not None and _as_utc(entry['fetched_at']) > cutoff:
+                fresh.add(username)
+            else:
+                unknown.append(username)
+        if unknown:
+            try:
+                documents = await self.collection.find(
+                    {'platform': platform, 'username': {'$in': unknown}, 'fetched_at': {'$gt': cutoff}},
+                    {'_id': 0, 'username': 1}
+                ).to_list(length=None)
+                fresh.update(document['username'] for document in documents)
+            except Exception as e:
+                logger.warning(f"Stats cache read failed for {len(unknown)} {platform} users: {str(e)}")
+        return fresh
+
+    async def close(self) -> None:
+        await _cancel_tasks(*self._refreshing.values())
+
+    async def _load(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        if self.memory is not None:
+            entry = self.memory.get(key)
+            if entry is not None:
+                return entry
+        platform, username = key
+        try:
+            entry = await self.collection.find_one(
+                {'platform': platform, 'username': username},
+                {'_id': 0, 'stats': 1, 'fetched_at': 1}
+            )
+        except Exception as e:
+            logger.warning(f"Stats cache read failed for {platform}/{username}: {str(e)}")
+            return None
+        if entry and self.memory is not None:
+            self.memory.set(key, entry)
+        return entry
+
+    async def _fetch_and_store(self, key: Tuple[str, str], username: str, fetcher) -> Dict[str, Any]:
+        stats = await fetcher(username)
+        # Fetchers that degrade gracefully return an 'error' key; never cache those
+        if 'error' not in stats:
+            await self._store(key, stats)
+            if self.snapshots is not None:
+                self.snapshots.record(key[0], key[1], stats)
+        return stats
+
+    async def _store(self, key: Tuple[str, str], stats: Dict[str, Any]) -> None:
+        platform, username = key
+        fetched_at = datetime.now(timezone.utc)
+        if self.memory is not None:
+            self.memory.set(key, {'stats': stats, 'fetched_at': fetched_at})
+        try:
+            await self.collection.update_one(
+                {'platform': platform, 'username': username},
+                {'$set': {
+                    'stats': stats,
+                    'fetched_at': fetched_at,
+                    'expires_at': fetched_at + timedelta(seconds=self.max_age_seconds + self.outage_grace_seconds)
+                }},
+                upsert=True
+            )
+        except Exception as e:
+            logger.warning(f"Stats cache write failed for {platform}/{username}: {str(e)}")
+
+    def _schedule_refresh(self, key: Tuple[str, str], username: str, fetcher) -> None:
+        if key in self._refreshing:
+            return
+        task = asyncio.create_task(self._refresh(key, username, fetcher))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    async def _refresh(self, key: Tuple[str, str], username: str, fetcher) -> None:
+        # Refreshes yield to interactive requests at the rate limiter and
+        # are not bound by the deadline of the request that triggered them
+        outbound_priority.set(PRIORITY_BACKGROUND)
+        request_deadline.set(None)
+        try:
+            await self._fetch_and_store(key, username, fetcher)
+        except Exception as e:
+            logger.warning(f"Background refresh failed for {key[0]}/{key[1]}: {str(e)}")
+
+platform_stats_cache = PlatformStatsCache(
+    db.platform_stats_cache, STATS_CACHE_FRESH_SECONDS, STATS_CACHE_MAX_AGE_SECONDS,
+    memory=LRUCache(STATS_MEMORY_CACHE_ENTRIES, STATS_MEMORY_CACHE_BYTES, STATS_MEMORY_CACHE_TTL_SECONDS),
+    outage_grace_seconds=STATS_CACHE_OUTAGE_GRACE_SECONDS,
+    snapshots=activity_snapshots
+)
+
+# AI Recommendation Engine
+LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', '16'))
+LLM_EXECUTOR_WORKERS = int(os.environ.get('LLM_EXECUTOR_WORKERS', '8'))
+LLM_USE_ASYNC = os.environ.get('LLM_USE_ASYNC', 'true').lower() == 'true'
+
+# Bounds in-flight Gemini calls independently of any thread pool
+llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+# Only used when the async client path is unavailable or disabled
+llm_executor = ThreadPoolExecutor(max_workers=LLM_EXECUTOR_WORKERS, thread_name_prefix='gemini')
+
+GEMINI_MODEL_NAME = os.environ.get('GEMINI_MODEL', 'gemini-2.0-flash')
+GEMINI_SAFETY_THRESHOLD = os.environ.get('GEMINI_SAFETY_THRESHOLD')
+GEMINI_WARMUP = os.environ.get('GEMINI_WARMUP', 'false').lower() == 'true'
+GEMINI_HARM_CATEGORIES = [
+    'HARM_CATEGORY_HARASSMENT',
+    'HARM_CATEGORY_HATE_SPEECH',
+    'HARM_CATEGORY_SEXUALLY_EXPLICIT',
+    'HARM_CATEGORY_DANGEROUS_CONTENT',
+]
+
+gemini_model: Optional[genai.GenerativeModel] = None
+
+def _gemini_generation_config() -> Dict[str, Any]:
+    """Collect generation settings that were explicitly configured"""
+    config = {}
+    if os.environ.get('GEMINI_TEMPERATURE'):
+        config['temperature'] = float(os.environ['GEMINI_TEMPERATURE'])
+    if os.environ.get('GEMINI_TOP_P'):
+        config['top_p'] = float(os.environ['GEMINI_TOP_P'])
+    if os.environ.get('GEMINI_MAX_OUTPUT_TOKENS'):
+        config['max_output_tokens'] = int(os.environ['GEMINI_MAX_OUTPUT_TOKENS'])
+    return config
+
+def get_gemini_model() -> genai.GenerativeModel:
+    """Return the shared Gemini model client, building it on first use"""
+    global gemini_model
+    if gemini_model is None:
+        safety_settings = None
+        if GEMINI_SAFETY_THRESHOLD:
+            safety_settings = {category: GEMINI_SAFETY_THRESHOLD for category in GEMINI_HARM_CATEGORIES}
+        gemini_model = genai.GenerativeModel(
+            GEMINI_MODEL_NAME,
+            generation_config=_gemini_generation_config() or None,
+            safety_settings=safety_settings
+        )
+    return gemini_model
+
+async def warm_gemini_model() -> None:
+    """Send a one-token request so the first real user skips connection setup"""
+    try:
+        await AIRecommendationEngine._call_model(
+            get_gemini_model(), 'ping', generation_config={'max_output_tokens': 1}
+        )
+        logger.info(f"Warmed Gemini model {GEMINI_MODEL_NAME}")
+    except Exception as e:
+        logger.warning(f"Gemini warm-up failed: {str(e)}")
+
+# Prompt Builder
+PROMPT_TOKEN_BUDGET = int(os.environ.get('PROMPT_TOKEN_BUDGET', '400'))
+# Rough characters-per-token ratio for English text and compact JSON
+PROMPT_CHARS_PER_TOKEN = 4
+
+class PromptMetrics:
+    """Running totals of the prompt sizes sent to Gemini"""
+
+    def __init__(self):
+        self.prompts = 0
+        self.total_chars = 0
+        self.total_tokens = 0
+        self.max_tokens = 0
+
+    def record(self, chars: int, tokens: int) -> None:
+        self.prompts += 1
+        self.total_chars += chars
+        self.total_tokens += tokens
+        self.max_tokens = max(self.max_tokens, tokens)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            'prompts': self.prompts,
+            'avg_chars': round(self.total_chars / self.prompts, 1) if self.prompts else 0.0,
+            'avg_estimated_tokens': round(self.total_tokens / self.prompts, 1) if self.prompts else 0.0,
+            'max_estimated_tokens': self.max_tokens
+        }
+
+prompt_metrics = PromptMetrics()
+
+class PromptBuilder:
+    """Build compact Gemini prompts from the normalized platform stats.
+
+    Only the fields the model needs are projected; bios, links and error
+    strings are left out. If the activity digest still exceeds the token
+    budget, lower-value fields are dropped in ``TRUNCATION_ORDER``.
+    """
+
+    PROMPT_FIELDS = {
+        'github': {
+            'profile': ['public_repos', 'followers', 'created_at'],
+            'activity': ['total_stars', 'recent_commits', 'top_languages', 'recent_repos']
+        },
+        'leetcode': {
+            'profile': ['ranking', 'reputation'],
+            'activity': ['total_solved', 'easy_solved', 'medium_solved', 'hard_solved', 'acceptance_rate']
+        },
+        'codeforces': {
+            'profile': ['rank', 'max_rank'],
+            'activity': ['current_rating', 'max_rating', 'contests_participated', 'problems_solved', 'recent_activity']
+        }
+    }
+
+    TRUNCATION_ORDER = [
+        ('github', 'activity', 'recent_repos'),
+        ('github', 'profile', 'created_at'),
+        ('leetcode', 'profile', 'reputation'),
+        ('codeforces', 'profile', 'max_rank'),
+        ('github', 'profile', 'followers'),
+        ('leetcode', 'profile', 'ranking'),
+    ]
+
+    RECOMMENDATION_KEYS = (
+        '"type" ("project"|"problem"|"skill"|"learning"), "title", "description", '
+        '"difficulty" ("beginner"|"intermediate"|"advanced"), "time_estimate", '
+        '"resources" (array of links or resources).'
+    )
+
+    INSTRUCTIONS = (
+        'Based on this data, give 5-7 specific, actionable recommendations to improve their programming skills: '
+        'concrete next steps, problems to solve, projects to build or skills to learn.\n'
+        'Respond with a JSON array of objects with keys: ' + RECOMMENDATION_KEYS
+    )
+
+    BATCH_INSTRUCTIONS = (
+        'For each user independently, give 5-7 specific, actionable recommendations to improve their '
+        'programming skills: concrete next steps, problems to solve, projects to build or skills to learn.\n'
+        'Respond with a JSON object mapping each user id to a JSON array of objects with keys: ' + RECOMMENDATION_KEYS
+    )
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        return -(-len(text) // PROMPT_CHARS_PER_TOKEN)
+
+    @staticmethod
+    def project(activity_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Keep only the prompt-relevant fields of each platform"""
+        projected = {}
+        for platform, data in activity_data.items():
+            fields = PromptBuilder.PROMPT_FIELDS.get(platform)
+            if fields is None:
+                continue
+            if not data or 'error' in data:
+                projected[platform] = 'unavailable'
+                continue
+            sections = {}
+            for section, keys in fields.items():
+                values = data.get(section) or {}
+                picked = {key: values[key] for key in keys if values.get(key) not in (None, '', [], {})}
+                if picked:
+                    sections[section] = picked
+            if platform == 'github' and 'recent_repos' in sections.get('activity', {}):
+                # Repository names carry little signal beyond their language
+                sections['activity']['recent_repos'] = [repo['name'] for repo in sections['activity']['recent_repos']]
+            projected[platform] = sections or 'unavailable'
+        return projected
+
+    @staticmethod
+    def digest(activity_data: Dict[str, Any], token_budget: int = PROMPT_TOKEN_BUDGET) -> str:
+        """Compact JSON of the projected activity, truncated to the token budget"""
+        projected = PromptBuilder.project(activity_data)
+        digest = json.dumps(projected, separators=(',', ':'), default=str)
+        for platform, section, key in PromptBuilder.TRUNCATION_ORDER:
+            if PromptBuilder.estimate_tokens(digest) <= token_budget:
+                break
+            values = projected.get(platform)
+            if isinstance(values, dict) and key in values.get(section, {}):
+                del values[section][key]
+                if not values[section]:
+                    del values[section]
+                digest = json.dumps(projected, separators=(',', ':'), default=str)
+        return digest
+
+    @staticmethod
+    def build(activity_data: Dict[str, Any], goal: str, domain: str) -> str:
+        started = time.perf_counter()
+        prompt = (
+            f"Goal: {goal}\nDomain: {domain}\n"
+            f"Programming activity: {PromptBuilder.digest(activity_data)}\n"
+            f"{PromptBuilder.INSTRUCTIONS}"
+        )
+        PromptBuilder._report(prompt, started)
+        return prompt
+
+    @staticmethod
+    def build_batch(entries: List[Tuple[Dict[str, Any], str, str]]) -> str:
+        """One prompt covering several users, identified as u0, u1, ..."""
+        started = time.perf_counter()
+        users = ''.join(
+            f"User u{index}: Goal: {goal}; Domain: {domain}; "
+            f"Programming activity: {PromptBuilder.digest(activity_data)}\n"
+            for index, (activity_data, goal, domain) in enumerate(entries)
+        )
+        prompt = f"{users}{PromptBuilder.BATCH_INSTRUCTIONS}"
+        PromptBuilder._report(prompt, started)
+        return prompt
+
+    @staticmethod
+    def _report(prompt: str, started: float) -> None:
+        prompt_metrics.record(len(prompt), PromptBuilder.estimate_tokens(prompt))
+        logger.info(
+            f"Built prompt: {len(prompt)} chars, ~{PromptBuilder.estimate_tokens(prompt)} tokens "
+            f"in {_elapsed_ms(started)}ms"
+        )
+
+# Recommendation Cache
+RECOMMENDATION_CACHE_TTL_SECONDS = int(os.environ.get('RECOMMENDATION_CACHE_TTL_SECONDS', '86400'))
+def recommendation_cache_key(activity_data: Dict[str, Any], goal: str, domain: str) -> str:
+    """Content address of a recommendation request.
+
+    Hashes the activity digest the prompt is built from rather than the raw
+    fetcher output, so changes the model never sees (bios, links, error
+    text) still hit the cache. Keys are sorted because platforms can arrive
+    in any order.
+    """
+    payload = json.dumps(
+        {'activity': json.loads(PromptBuilder.digest(activity_data)), 'goal': goal, 'domain': domain},
+        sort_keys=True, separators=(',', ':')
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class RecommendationCache:
+    """Mongo-backed store of parsed recommendations keyed by content hash"""
+
+    def __init__(self, collection, ttl_seconds: int):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+
+    async def ensure_indexes(self) -> None:
+        await self.collection.create_index('key', unique=True)
+        await self.collection.create_index('expires_at', expireAfterSeconds=0)
+
+    async def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        try:
+            entry = await self.collection.find_one(
+                {'key': key, 'expires_at': {'$gt': datetime.now(timezone.utc)}},
+                {'_id': 0, 'recommendations': 1}
+            )
+        except Exception as e:
+            logger.warning(f"Recommendation cache read failed: {str(e)}")
+            return None
+        return entry['recommendations'] if entry else None
+
+    async def set(self, key: str, goal: str, domain: str, recommendations: List[Dict[str, Any]]) -> None:
+        created_at = datetime.now(timezone.utc)
+        try:
+            await self.collection.update_one(
+                {'key': key},
+                {'$set': {
+                    'goal': goal,
+                    'domain': domain,
+                    'recommendations': recommendations,
+                    'created_at': created_at,
+                    'expires_at': created_at + timedelta(seconds=self.ttl_seconds)
+                }},
+                upsert=True
+            )
+        except Exception as e:
+            logger.warning(f"Recommendation cache write failed: {str(e)}")
+
+recommendation_cache = RecommendationCache(db.recommendation_cache, RECOMMENDATION_CACHE_TTL_SECONDS)
+
+# Similar-profile recommendation reuse
+SIMILAR_PROFILE_REUSE = os.environ.get('SIMILAR_PROFILE_REUSE', 'false').lower() == 'true'
+SIMILAR_PROFILE_THRESHOLD = float(os.environ.get('SIMILAR_PROFILE_THRESHOLD', '0.85'))
+SIMILAR_PROFILE_CANDIDATES = int(os.environ.get('SIMILAR_PROFILE_CANDIDATES', '20'))
+CODEFORCES_RATING_BAND = 200
+LEETCODE_SOLVED_BUCKETS = [0, 10, 50, 150, 300, 600]
+
+def _bucket(value: Any, edges: List[int]) -> int:
+    count = value if isinstance(value, int) else 0
+    return sum(1 for edge in edges if count > edge)
+
+def profile_features(activity_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Quantize activity data into coarse features that drift slowly"""
+    features: Dict[str, Any] = {}
+    codeforces = activity_data.get('codeforces') or {}
+    if 'error' not in codeforces and codeforces.get('activity'):
+        rating = codeforces['activity'].get('current_rating') or 0
+        features['cf_band'] = rating // CODEFORCES_RATING_BAND
+    leetcode = activity_data.get('leetcode') or {}
+    if 'error' not in leetcode and leetcode.get('activity'):
+        for difficulty in ('easy', 'medium', 'hard'):
+            features[f'lc_{difficulty}'] = _bucket(leetcode['activity'].get(f'{difficulty}_solved'), LEETCODE_SOLVED_BUCKETS)
+    github = activity_data.get('github') or {}
+    if 'error' not in github and github.get('activity'):
+        features['languages'] = sorted(list(github['activity'].get('top_languages', {}))[:3])
+    return features
+
+def profile_similarity(a: Dict[str, Any], b: Dict[str, Any]) -> float:
+    """Score two feature sets between 0 and 1; adjacent bands earn half credit"""
+    if set(a) != set(b):
+        return 0.0
+    if not a:
+        return 1.0
+    score = 0.0
+    for name, value in a.items():
+        other = b[name]
+        if name == 'languages':
+            union = set(value) | set(other)
+            score += len(set(value) & set(other)) / len(union) if union else 1.0
+        elif value == other:
+            score += 1.0
+        elif abs(value - other) == 1:
+            score += 0.5
+    return score / len(a)
+
+class SimilarProfileIndex:
+    """Reuse recommendations generated for a sufficiently similar profile.
+
+    Entries are grouped by a coarse bucket (goal, domain and the set of
+    platforms with data); candidates in the same bucket are scored with
+    ``profile_similarity`` and the best one above the threshold is reused.
+    """
+
+    def __init__(self, collection, ttl_seconds: int, threshold: float, candidates: int):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self.candidates = candidates
+        self.lookups = 0
+        self.hits = 0
+
+    async def ensure_indexes(self) -> None:
+        await self.collection.create_index([('bucket', 1), ('created_at', -1)])
+        await self.collection.create_index('expires_at', expireAfterSeconds=0)
+
+    @staticmethod
+    def bucket(features: Dict[str, Any], goal: str, domain: str) -> str:
+        payload = json.dumps([goal.strip().lower(), domain.strip().lower(), sorted(features)])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def find(self, features: Dict[str, Any], goal: str, domain: str) -> Optional[List[Dict[str, Any]]]:
+        self.lookups += 1
+        try:
+            cursor = self.collection.find(
+                {'bucket': self.bucket(features, goal, domain), 'expires_at': {'$gt': datetime.now(timezone.utc)}},
+                {'_id': 0, 'features': 1, 'recommendations': 1}
+            ).sort('created_at', -1).limit(self.candidates)
+            candidates = await cursor.to_list(length=self.candidates)
+        except Exception as e:
+            logger.warning(f"Similar profile lookup failed: {str(e)}")
+            return None
+        best, best_score = None, self.threshold
+        for candidate in candidates:
+            score = profile_similarity(features, candidate['features'])
+            if score >= best_score:
+                best, best_score = candidate, score
+        if best is None:
+            return None
+        self.hits += 1
+        return best['recommendations']
+
+    async def add(self, features: Dict[str, Any], goal: str, domain: str, recommendations: List[Dict[str, Any]]) -> None:
+        created_at = datetime.now(timezone.utc)
+        try:
+            await self.collection.insert_one({
+                'bucket': self.bucket(features, goal, domain),
+                'features': features,
+                'recommendations': recommendations,
+                'created_at': created_at,
+                'expires_at': created_at + timedelta(seconds=self.ttl_seconds)
+            })
+        except Exception as e:
+            logger.warning(f"Similar profile write failed: {str(e)}")
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            'enabled': SIMILAR_PROFILE_REUSE,
+            'lookups': self.lookups,
+            'hits': self.hits,
+            'hit_rate': round(self.hits / self.lookups, 3) if self.lookups else 0.0
+        }
+
+similar_profile_index = SimilarProfileIndex(
+    db.similar_recommendations, RECOMMENDATION_CACHE_TTL_SECONDS,
+    SIMILAR_PROFILE_THRESHOLD, SIMILAR_PROFILE_CANDIDATES
+)
+
+class JSONArrayStreamParser:
+    """Pull complete top-level objects out of a JSON array as its text streams in.
+
+    Anything before the opening ``[`` (prose, markdown fences) is skipped;
+    objects that fail to decode are dropped.
+    """
+
+    def __init__(self):
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._current: Optional[List[str]] = None
+
+    def feed(self, text: str) -> List[Any]:
+        items = []
+        for char in text:
+            if not self._started:
+                if char == '[':
+                    self._started = True
+                    self._depth = 1
+                continue
+            if self._depth == 0:
+                break
+            if self._current is not None:
+                self._current.append(char)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in '[{':
+                if self._depth == 1 and char == '{':
+                    self._current = [char]
+                self._depth += 1
+            elif char in ']}':
+                self._depth -= 1
+                if self._depth == 1 and self._current is not None:
+                    try:
+                        items.append(json.loads(''.join(self._current)))
+                    except json.JSONDecodeError:
+                        pass
+                    self._current = None
+        return items
+
+def _chunk_text(chunk) -> str:
+    """Text of a streamed Gemini chunk; chunks without text parts raise on .text"""
+    try:
+        return chunk.text
+    except ValueError:
+        return ''
+
+GEMINI_STRUCTURED_OUTPUT = os.environ.get('GEMINI_STRUCTURED_OUTPUT', 'true').lower() == 'true'
+
+# How each generation ended up: valid as returned, valid after repair, or fallback
+recommendation_outcomes = {'parsed': 0, 'repaired': 0, 'fallback': 0}
+
+class RecommendationBroadcast:
+    """Recommendations of one streaming generation, replayable by any number of subscribers"""
+
+    def __init__(self):
+        self.items: List[Dict[str, Any]] = []
+        self.done = False
+        self._changed = asyncio.Event()
+
+    def publish(self, item: Dict[str, Any]) -> None:
+        self.items.append(item)
+        self._notify()
+
+    def close(self) -> None:
+        self.done = True
+        self._notify()
+
+    async def subscribe(self):
+        index = 0
+        while True:
+            while index < len(self.items):
+                yield self.items[index]
+                index += 1
+            if self.done:
+                return
+            await self._changed.wait()
+
+    def _notify(self) -> None:
+        # Wake current waiters and give later ones a fresh event
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+# Streaming generations in flight, by recommendation cache key
+recommendation_streams: Dict[str, RecommendationBroadcast] = {}
+
+class AIRecommendationEngine:
+    
+    @staticmethod
+    async def _call_model(model, prompt: str, **kwargs):
+        """Run a Gemini generation under the concurrency limit and the request deadline"""
+        budget = remaining_budget(LLM_TIMEOUT_SECONDS)
+        if budget <= 0:
+            raise DeadlineExceeded("deadline exceeded before calling Gemini")
+        return await asyncio.wait_for(AIRecommendationEngine._call_model_unbounded(model, prompt, **kwargs), budget)
+
+    @staticmethod
+    async def _call_model_unbounded(model, prompt: str, **kwargs):
+        async with llm_semaphore:
+            if LLM_USE_ASYNC and hasattr(model, 'generate_content_async'):
+                return await model.generate_content_async(prompt, **kwargs)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(llm_executor, functools.partial(model.generate_content, prompt, **kwargs))
+    
+    @staticmethod
+    async def generate_recommendations(activity_data: Dict[str, Any], goal: str, domain: str,
+                                       batched: bool = False) -> List[Dict[str, Any]]:
+        """Generate AI-powered recommendations, reusing cached or in-flight results for identical inputs.
+
+        With ``batched`` the generation goes through the micro-batcher and may
+        share a Gemini call with other users; use it for cohort and background work.
+        """
+        key = recommendation_cache_key(activity_data, goal, domain)
+        return await recommendation_flights.do(
+            key,
+            lambda: AIRecommendationEngine._cached_generate(key, activity_data, goal, domain, batched)
+        )
+
+    @staticmethod
+    async def _cached_generate(key: str, activity_data: Dict[str, Any], goal: str, domain: str,
+                               batched: bool = False) -> List[Dict[str, Any]]:
+        cached = await AIRecommendationEngine._lookup_cached(key, activity_data, goal, domain)
+        if cached is not None:
+            return cached
+        if batched:
+            recommendations, generated = await recommendation_batcher.submit(activity_data, goal, domain)
+        else:
+            recommendations, generated = await AIRecommendationEngine._generate(activity_data, goal, domain)
+        # Fallback recommendations mean the model call failed; let the next request retry it
+        if generated:
+            await AIRecommendationEngine._remember(key, activity_data, goal, domain, recommendations)
+        return recommendations
+
+    @staticmethod
+    async def _lookup_cached(key: str, activity_data: Dict[str, Any], goal: str, domain: str) -> Optional[List[Dict[str, Any]]]:
+        """Check the exact cache, then (if enabled) similar profiles"""
+        cached = await recommendation_cache.get(key)
+        if cached is not None:
+            return cached
+        if SIMILAR_PROFILE_REUSE:
+            return await similar_profile_index.find(profile_features(activity_data), goal, domain)
+        return None
+
+    @staticmethod
+    async def _remember(key: str, activity_data: Dict[str, Any], goal: str, domain: str, recommendations: List[Dict[str, Any]]) -> None:
+        await recommendation_cache.set(key, goal, domain, recommendations)
+        if SIMILAR_PROFILE_REUSE:
+            await similar_profile_index.add(profile_features(activity_data), goal, domain, recommendations)
+
+    @staticmethod
+    async def stream_recommendations(activity_data: Dict[str, Any], goal: str, domain: str):
+        """Yield validated recommendations one by one as Gemini produces them.
+
+        Identical concurrent requests share one generation: the first starts a
+        producer under ``recommendation_flights`` and every request replays
+        its broadcast. A request that finds a non-streaming generation in
+        flight awaits that result instead.
+        """
+        key = recommendation_cache_key(activity_data, goal, domain)
+        cached = await AIRecommendationEngine._lookup_cached(key, activity_data, goal, domain)
+        if cached is not None:
+            for recommendation in cached:
+                yield recommendation
+            return
+        
+        model = get_gemini_model()
+        broadcast = recommendation_streams.get(key)
+        if broadcast is None:
+            if recommendation_flights.running(key) or not (LLM_USE_ASYNC and hasattr(model, 'generate_content_async')):
+                for recommendation in await AIRecommendationEngine.generate_recommendations(activity_data, goal, domain):
+                    yield recommendation
+                return
+            broadcast = recommendation_streams[key] = RecommendationBroadcast()
+            # The producer belongs to the flight, so a client that disconnects does not cancel it
+            recommendation_flights.start(key, lambda: AIRecommendationEngine._produce_stream(
+                key, model, activity_data, goal, domain, broadcast
+            ))
+        async for recommendation in broadcast.subscribe():
+            yield recommendation
+
+    @staticmethod
+    async def _produce_stream(key: str, model, activity_data: Dict[str, Any], goal: str, domain: str,
+                              broadcast: RecommendationBroadcast) -> List[Dict[str, Any]]:
+        """Stream one generation into ``broadcast``, returning the full list for non-streaming joiners"""
         try:
-            async with aiohttp.ClientSession() as session:
-                # Use the provided LeetCode API
-                leetcode_url = f"https://leetcode-api-pied.vercel.app/user/{username}"
-                async with session.get(leetcode_url) as response:
-                    if response.status != 200:
-                        raise HTTPException(status_code=404, detail=f"LeetCode user {username} not found")
-                    
-                    data = await response.json()
-                    
-                    # Extract relevant information from the API response
-                    profile_data = data.get('profile', {})
-                    submit_stats = data.get('submitStats', {})
-                    
-                    # Parse solved problems statistics
-                    ac_submission = submit_stats.get('acSubmissionNum', [])
-                    total_solved = 0
-                    easy_solved = 0
-                    medium_solved = 0
-                    hard_solved = 0
-                    
-                    for stat in ac_submission:
-                        difficulty = stat.get('difficulty', '').lower()
-                        count = stat.get('count', 0)
-                        if difficulty == 'all':
-                            total_solved = count
-                        elif difficulty == 'easy':
-                            easy_solved = count
-                        elif difficulty == 'medium':
-                            medium_solved = count
-                        elif difficulty == 'hard':
-                            hard_solved = count
-                    
-                    # Calculate acceptance rate
-                    total_submissions = submit_stats.get('totalSubmissionNum', [])
-                    total_accepted = next((item.get('count', 0) for item in total_submissions if item.get('difficulty') == 'All'), 0)
-                    total_submitted = next((item.get('submissions', 0) for item in total_submissions if item.get('difficulty') == 'All'), 1)
-                    acceptance_rate = round((total_accepted / max(total_submitted, 1)) * 100, 1) if total_submitted > 0 else 0
-                    
-                    return {
-                        'profile': {
-                            'username': username,
-                            'real_name': profile_data.get('realName', 'Unknown'),
-                            'ranking': profile_data.get('ranking', 'N/A'),
-                            'reputation': profile_data.get('reputation', 0),
-                            'github_link': profile_data.get('githubUrl', ''),
-                            'twitter_link': profile_data.get('twitterUrl', ''),
-                            'linkedin_link': profile_data.get('linkedinUrl', ''),
-                            'about_me': profile_data.get('aboutMe', '')
-                        },
-                        'activity': {
-                            'total_solved': total_solved,
-                            'easy_solved': easy_solved,
-                            'medium_solved': medium_solved,
-                            'hard_solved': hard_solved,
-                            'acceptance_rate': f"{acceptance_rate}%",
-                            'total_submissions': total_accepted,
-                            'contribution_points': profile_data.get('contributionPoints', 0),
-                            'reputation': profile_data.get('reputation', 0)
-                        }
-                    }
-                    
-        except Exception as e:
-            logger.error(f"Error fetching LeetCode data for {username}: {str(e)}")
-            return {
-                'profile': {'username': username},
-                'activity': {'note': 'Unable to fetch LeetCode data'},
-                'error': str(e)
-            }
+            return await AIRecommendationEngine._stream_into(key, model, activity_data, goal, domain, broadcast)
+        finally:
+            recommendation_streams.pop(key, None)
+            broadcast.close()
 
     @staticmethod
-    async def fetch_codeforces_stats(username: str) -> Dict[str, Any]:
-        """Fetch Codeforces user statistics using official API"""
+    async def _stream_into(key: str, model, activity_data: Dict[str, Any], goal: str, domain: str,
+                           broadcast: RecommendationBroadcast) -> List[Dict[str, Any]]:
+        recommendations = []
+        completed = False
         try:
-            async with aiohttp.ClientSession() as session:
-                # Get user info
-                user_url = f"https://codeforces.com/api/user.info?handles={username}"
-                async with session.get(user_url) as response:
-                    if response.status != 200:
-                        raise HTTPException(status_code=404, detail=f"Codeforces user {username} not found")
-                    user_response = await response.json()
-                    
-                    if user_response['status'] != 'OK':
-                        raise HTTPException(status_code=404, detail=f"Codeforces user {username} not found")
-                    
-                    user_data = user_response['result'][0]
-                
-                # Get user rating history
-                rating_url = f"https://codeforces.com/api/user.rating?handle={username}"
-                async with session.get(rating_url) as response:
-                    rating_data = []
-                    if response.status == 200:
-                        rating_response = await response.json()
-                        if rating_response['status'] == 'OK':
-                            rating_data = rating_response['result']
-                
-                # Get user submissions (last 100)
-                submissions_url = f"https://codeforces.com/api/user.status?handle={username}&from=1&count=100"
-                async with session.get(submissions_url) as response:
-                    submissions_data = []
-                    if response.status == 200:
-                        submissions_response = await response.json()
-                        if submissions_response['status'] == 'OK':
-                            submissions_data = submissions_response['result']
-                
-                # Process submissions
-                solved_problems = set()
-                for submission in submissions_data:
-                    if submission.get('verdict') == 'OK':
-                        problem_id = f"{submission['problem']['contestId']}-{submission['problem']['index']}"
-                        solved_problems.add(problem_id)
-                
-                current_rating = user_data.get('rating', 0)
-                max_rating = user_data.get('maxRating', 0)
-                
-                return {
-                    'profile': {
-                        'handle': user_data.get('handle'),
-                        'first_name': user_data.get('firstName', ''),
-                        'last_name': user_data.get('lastName', ''),
-                        'country': user_data.get('country', ''),
-                        'city': user_data.get('city', ''),
-                        'organization': user_data.get('organization', ''),
-                        'rank': user_data.get('rank', 'unrated'),
-                        'max_rank': user_data.get('maxRank', 'unrated')
-                    },
-                    'activity': {
-                        'current_rating': current_rating,
-                        'max_rating': max_rating,
-                        'contests_participated': len(rating_data),
-                        'problems_solved': len(solved_problems),
-                        'total_submissions': len(submissions_data),
-                        'recent_activity': 'Active' if submissions_data else 'Inactive'
-                    }
-                }
+            context = PromptBuilder.build(activity_data, goal, domain)
+            parser = JSONArrayStreamParser()
+            # The deadline covers the whole stream, not each chunk
+            stream_deadline = time.monotonic() + remaining_budget(LLM_TIMEOUT_SECONDS)
+            async with llm_semaphore:
+                response = await asyncio.wait_for(model.generate_content_async(
+                    context, generation_config=AIRecommendationEngine._generation_config(), stream=True
+                ), stream_deadline - time.monotonic())
+                chunks = response.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), stream_deadline - time.monotonic())
+                    except StopAsyncIteration:
+                        break
+                    for item in parser.feed(_chunk_text(chunk)):
+                        recommendation = AIRecommendationEngine._validate_item(item)
+                        if recommendation is not None:
+                            recommendations.append(recommendation)
+                            broadcast.publish(recommendation)
+            completed = True
         except Exception as e:
-            logger.error(f"Error fetching Codeforces data for {username}: {str(e)}")
-            raise HTTPException(status_code=400, detail=f"Error fetching Codeforces data: {str(e)}")
+            logger.error(f"Error streaming AI recommendations: {str(e)}")
+        
+        if recommendations:
+            # Only a stream that ran to the end is safe to cache
+            if completed:
+                recommendation_outcomes['parsed'] += 1
+                await AIRecommendationEngine._remember(key, activity_data, goal, domain, recommendations)
+            return recommendations
+        
+        recommendation_outcomes['fallback'] += 1
+        recommendations = AIRecommendationEngine._create_fallback_recommendations(activity_data, goal, domain)
+        for recommendation in recommendations:
+            broadcast.publish(recommendation)
+        return recommendations
 
-# AI Recommendation Engine
-class AIRecommendationEngine:
-    
     @staticmethod
-    async def generate_recommendations(activity_data: Dict[str, Any], goal: str, domain: str) -> List[Dict[str, Any]]:
-        """Generate AI-powered recommendations based on user activity"""
+    async def _generate(activity_data: Dict[str, Any], goal: str, domain: str) -> Tuple[List[Dict[str, Any]], bool]:
+        """Generate AI-powered recommendations based on user activity.
+
+        Returns the recommendations and whether they came from the model
+        rather than the rule-based fallback.
+        """
         try:
-            model = genai.GenerativeModel('gemini-2.0-flash')
+            model = get_gemini_model()
             
             # Prepare context for AI
-            context = f"""
-            User's Programming Activity Analysis:
-            
-            Goal: {goal}
-            Domain: {domain}
-            
-            Activity Data:
-            {json.dumps(activity_data, indent=2, default=str)}
+            context = PromptBuilder.build(activity_data, goal, domain)
             
-            Based on this data, provide 5-7 specific, actionable recommendations for improving their programming skills.
-            Focus on concrete next steps, specific problems to solve, projects to build, or skills to learn.
-            
-            Format your response as a JSON array with objects containing:
-            - "type": "project" | "problem" | "skill" | "learning"
-            - "title": Brief title of the recommendation
-            - "description": Detailed description
-            - "difficulty": "beginner" | "intermediate" | "advanced"
-            - "time_estimate": Estimated time to complete
-            - "resources": Array of helpful links or resources
-            """
-            
-            response = await asyncio.to_thread(model.generate_content, context)
+            response = await AIRecommendationEngine._call_model(
+                model, context, generation_config=AIRecommendationEngine._generation_config()
+            )
             
             # Parse AI response
-            try:
-                # Extract JSON from response
-                response_text = response.text
-                # Find JSON in the response (it might be wrapped in markdown)
-                start_idx = response_text.find('[')
-                end_idx = response_text.rfind(']') + 1
-                
-                if start_idx != -1 and end_idx != 0:
-                    json_str = response_text[start_idx:end_idx]
-                    recommendations = json.loads(json_str)
-                else:
-                    # Fallback to structured recommendations
-                    recommendations = AIRecommendationEngine._create_fallback_recommendations(activity_data, goal, domain)
-                
-                return recommendations
-            except json.JSONDecodeError:
-                # If JSON parsing fails, create structured recommendations
-                return AIRecommendationEngine._create_fallback_recommendations(activity_data, goal, domain)
+            recommendations = AIRecommendationEngine.parse_recommendations(response.text)
+            if recommendations is not None:
+                return recommendations, True
+            
+            # Fallback to structured recommendations
+            recommendation_outcomes['fallback'] += 1
+            return AIRecommendationEngine._create_fallback_recommendations(activity_data, goal, domain), False
                 
         except Exception as e:
             logger.error(f"Error generating AI recommendations: {str(e)}")
-            return AIRecommendationEngine._create_fallback_recommendations(activity_data, goal, domain)
+            recommendation_outcomes['fallback'] += 1
+            return AIRecommendationEngine._create_fallback_recommendations(activity_data, goal, domain), False
+    
+    @staticmethod
+    def _generation_config() -> Optional[Dict[str, Any]]:
+        if not GEMINI_STRUCTURED_OUTPUT:
+            return None
+        return {
+            'response_mime_type': 'application/json',
+            'response_schema': RECOMMENDATION_SCHEMA
+        }
+    
+    @staticmethod
+    def parse_batch(response_text: str, users: int) -> Dict[int, List[Dict[str, Any]]]:
+        """Split a multi-user response into validated recommendations per user index"""
+        try:
+            data = json.loads(response_text)
+        except json.JSONDecodeError:
+            text = re.sub(r'```(?:json)?', '', response_text)
+            start_idx = text.find('{')
+            end_idx = text.rfind('}') + 1
+            try:
+                data = json.loads(re.sub(r',\s*([\]}])', r'\1', text[start_idx:end_idx]))
+            except json.JSONDecodeError:
+                return {}
+        if not isinstance(data, dict):
+            return {}
+        parsed = {}
+        for index in range(users):
+            items = data.get(f'u{index}')
+            if not isinstance(items, list):
+                continue
+            recommendations = [AIRecommendationEngine._validate_item(item) for item in items]
+            recommendations = [item for item in recommendations if item is not None]
+            if recommendations:
+                parsed[index] = recommendations
+        return parsed
+    
+    @staticmethod
+    def parse_recommendations(response_text: str) -> Optional[List[Dict[str, Any]]]:
+        """Validate the model output, trying one local repair pass before giving up"""
+        recommendations = AIRecommendationEngine._validate(response_text)
+        if recommendations is not None:
+            recommendation_outcomes['parsed'] += 1
+            return recommendations
+        recommendations = AIRecommendationEngine._validate(AIRecommendationEngine._repair_json(response_text))
+        if recommendations is not None:
+            recommendation_outcomes['repaired'] += 1
+        return recommendations
+    
+    @staticmethod
+    def _validate(text: str) -> Optional[List[Dict[str, Any]]]:
+        """Parse a JSON array and keep the items that match RecommendationItem"""
+        try:
+            data = json.loads(text)
+        except (json.JSONDecodeError, TypeError):
+            return None
+        if isinstance(data, dict):
+            # Some generations wrap the array, e.g. {"recommendations": [...]}
+            data = next((value for value in data.values() if isinstance(value, list)), None)
+        if not isinstance(data, list):
+            return None
+        recommendations = [AIRecommendationEngine._validate_item(item) for item in data]
+        return [item for item in recommendations if item is not None] or None
+    
+    @staticmethod
+    def _validate_item(item: Any) -> Optional[Dict[str, Any]]:
+        try:
+            return RecommendationItem.model_validate(item).model_dump()
+        except ValidationError:
+            return None
+    
+    @staticmethod
+    def _repair_json(text: str) -> str:
+        """Cheap fixes for prose-wrapped or slightly malformed JSON"""
+        # Strip markdown fences and any prose around the array
+        text = re.sub(r'```(?:json)?', '', text)
+        start_idx = text.find('[')
+        end_idx = text.rfind(']') + 1
+        if start_idx != -1 and end_idx != 0:
+            text = text[start_idx:end_idx]
+        # Trailing commas before a closing bracket or brace
+        return re.sub(r',\s*([\]}])', r'\1', text)
     
     @staticmethod
     def _create_fallback_recommendations(activity_data: Dict[str, Any], goal: str, domain: str) -> List[Dict[str, Any]]:
@@ -390,96 +2151,927 @@ class AIRecommendationEngine:
         
         return recommendations
 
-# API Endpoints
-@api_router.post("/analyze-profile")
-async def analyze_user_profile(request: AnalyzeProfileRequest):
-    """Analyze user profile across platforms and generate AI recommendations"""
+# LLM micro-batching
+LLM_BATCH_WINDOW_MS = int(os.environ.get('LLM_BATCH_WINDOW_MS', '50'))
+LLM_BATCH_MAX_USERS = int(os.environ.get('LLM_BATCH_MAX_USERS', '5'))
+
+class RecommendationBatcher:
+    """Collect generation requests for a short window and send them as one prompt.
+
+    A batch is flushed when ``max_users`` requests are waiting or the window
+    elapses. The multi-user response is split back to each caller; any user
+    whose part is missing or invalid is retried with a normal per-user call.
+    The shared call runs until the latest caller deadline, each retry until
+    its own caller's.
+    """
+
+    def __init__(self, window_seconds: float, max_users: int):
+        self.window_seconds = window_seconds
+        self.max_users = max_users
+        # (activity_data, goal, domain, caller's request deadline, future)
+        self._pending: List[Tuple[Dict[str, Any], str, str, Optional[float], asyncio.Future]] = []
+        self._timer: Optional[asyncio.Task] = None
+        self._running: set = set()
+        self.batches = 0
+        self.batched_users = 0
+        self.retried_users = 0
+
+    async def submit(self, activity_data: Dict[str, Any], goal: str, domain: str) -> Tuple[List[Dict[str, Any]], bool]:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((activity_data, goal, domain, request_deadline.get(), future))
+        if len(self._pending) >= self.max_users:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+        return await future
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            'batches': self.batches,
+            'batched_users': self.batched_users,
+            'retried_users': self.retried_users,
+            'pending': len(self._pending)
+        }
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.window_seconds)
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[Tuple[Dict[str, Any], str, str, Optional[float], asyncio.Future]]) -> None:
+        # This task inherited the context of whichever caller dispatched it;
+        # the shared call serves everyone, so it may run until the latest deadline
+        deadlines = [deadline for _, _, _, deadline, _ in batch]
+        request_deadline.set(None if None in deadlines else max(deadlines))
+        parsed = {}
+        if len(batch) > 1:
+            self.batches += 1
+            self.batched_users += len(batch)
+            entries = [(activity_data, goal, domain) for activity_data, goal, domain, _, _ in batch]
+            try:
+                response = await AIRecommendationEngine._call_model(
+                    get_gemini_model(),
+                    PromptBuilder.build_batch(entries),
+                    generation_config=self._generation_config(len(batch))
+                )
+                parsed = AIRecommendationEngine.parse_batch(response.text, len(batch))
+            except Exception as e:
+                logger.error(f"Error generating batched recommendations: {str(e)}")
+
+        retries = []
+        for index, (activity_data, goal, domain, deadline, future) in enumerate(batch):
+            if index in parsed:
+                recommendation_outcomes['parsed'] += 1
+                if not future.done():
+                    future.set_result((parsed[index], True))
+            else:
+                retries.append(self._generate_single(activity_data, goal, domain, deadline, future))
+        if len(batch) > 1:
+            self.retried_users += len(retries)
+        await asyncio.gather(*retries)
+
+    @staticmethod
+    async def _generate_single(activity_data: Dict[str, Any], goal: str, domain: str, deadline: Optional[float],
+                               future: asyncio.Future) -> None:
+        # gather runs each retry in its own task, so this only affects this caller's call
+        request_deadline.set(deadline)
+        result = await AIRecommendationEngine._generate(activity_data, goal, domain)
+        if not future.done():
+            future.set_result(result)
+
+    @staticmethod
+    def _generation_config(users: int) -> Optional[Dict[str, Any]]:
+        if not GEMINI_STRUCTURED_OUTPUT:
+            return None
+        ids = [f'u{index}' for index in range(users)]
+        return {
+            'response_mime_type': 'application/json',
+            'response_schema': {
+                'type': 'object',
+                'properties': {user_id: RECOMMENDATION_SCHEMA for user_id in ids},
+                'required': ids
+            }
+        }
+
+recommendation_batcher = RecommendationBatcher(LLM_BATCH_WINDOW_MS / 1000, LLM_BATCH_MAX_USERS)
+
+# Analysis Jobs
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '4'))
+JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS', '2'))
+JOB_STALE_SECONDS = int(os.environ.get('JOB_STALE_SECONDS', '600'))
+JOB_RESULT_TTL_SECONDS = int(os.environ.get('JOB_RESULT_TTL_SECONDS', str(7 * 24 * 3600)))
+JOB_STAGES = ['queued', 'fetching', 'generating', 'storing', 'completed']
+# Comma-separated hosts callbacks may target; when unset any public host is allowed
+JOB_CALLBACK_ALLOWED_HOSTS = {
+    host.strip().lower() for host in os.environ.get('JOB_CALLBACK_ALLOWED_HOSTS', '').split(',') if host.strip()
+}
+
+def _is_public_ip(address: str) -> bool:
+    ip = ipaddress.ip_address(address)
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+def callback_host_allowed(host: Optional[str]) -> bool:
+    """Reject callback hosts on loopback, private, link-local or otherwise internal addresses"""
+    if not host:
+        return False
+    host = host.lower().strip('[]').rstrip('.')
+    if JOB_CALLBACK_ALLOWED_HOSTS:
+        return host in JOB_CALLBACK_ALLOWED_HOSTS
+    if host == 'localhost' or host.endswith('.localhost') or host.endswith('.internal'):
+        return False
     try:
-        activity_data = {}
-        
-        # Fetch data from each platform
-        if request.github_username:
+        return _is_public_ip(host)
+    except ValueError:
+        # A hostname; PublicAddressResolver checks its addresses when the callback connects
+        return True
+
+class PublicAddressResolver(aiohttp.abc.AbstractResolver):
+    """Resolver for callback connections that only returns public addresses.
+
+    Filtering the addresses the connector is about to dial, rather than
+    resolving once to check and again to connect, leaves no window for a
+    DNS-rebinding host to swap in an internal address.
+    """
+
+    def __init__(self, resolver: Optional[aiohttp.abc.AbstractResolver] = None):
+        self._resolver = resolver or aiohttp.ThreadedResolver()
+
+    async def resolve(self, host: str, port: int = 0, family: socket.AddressFamily = socket.AF_INET):
+        results = await self._resolver.resolve(host, port, family)
+        if JOB_CALLBACK_ALLOWED_HOSTS:
+            return results
+        public = [result for result in results if _is_public_ip(result['host'].split('%')[0])]
+        if not public:
+            raise OSError(f"{host} does not resolve to a public address")
+        return public
+
+    async def close(self) -> None:
+        await self._resolver.close()
+
+def callback_connector(resolver: Optional[aiohttp.abc.AbstractResolver] = None) -> aiohttp.TCPConnector:
+    # No DNS cache, so every new connection is resolved and filtered afresh
+    return aiohttp.TCPConnector(resolver=PublicAddressResolver(resolver), use_dns_cache=False,
+                                limit=JOB_WORKERS)
+
+class AnalysisJobQueue:
+    """Mongo-backed queue of profile analyses drained by a bounded worker pool.
+
+    Workers claim jobs atomically, so several server processes can share one
+    queue. A job left ``running`` longer than ``JOB_STALE_SECONDS`` (e.g. its
+    worker died) is claimed again. Finished jobs expire via a TTL index.
+    """
+
+    def __init__(self, collection, workers: int):
+        self.collection = collection
+        self.workers = workers
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        # Callbacks go out through their own connector, never the shared platform session
+        self._callback_session: Optional[aiohttp.ClientSession] = None
+
+    async def ensure_indexes(self) -> None:
+        await self.collection.create_index('id', unique=True)
+        await self.collection.create_index([('status', 1), ('created_at', 1)])
+        await self.collection.create_index('expires_at', expireAfterSeconds=0)
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker(n)) for n in range(self.workers)]
+
+    async def stop(self) -> None:
+        await _cancel_tasks(*self._tasks)
+        self._tasks = []
+        if self._callback_session is not None:
+            await self._callback_session.close()
+            self._callback_session = None
+
+    def _get_callback_session(self) -> aiohttp.ClientSession:
+        if self._callback_session is None or self._callback_session.closed:
+            timeout = aiohttp.ClientTimeout(
+                total=HTTP_TOTAL_TIMEOUT,
+                sock_connect=HTTP_CONNECT_TIMEOUT,
+                sock_read=HTTP_READ_TIMEOUT,
+            )
+            self._callback_session = aiohttp.ClientSession(connector=callback_connector(), timeout=timeout)
+        return self._callback_session
+
+    async def submit(self, request: AnalyzeJobRequest) -> str:
+        now = datetime.now(timezone.utc)
+        job_id = str(uuid.uuid4())
+        await self.collection.insert_one({
+            'id': job_id,
+            'status': 'queued',
+            'progress': {'stage': 'queued', 'percent': 0},
+            'request': request.dict(exclude={'callback_url'}),
+            'callback_url': str(request.callback_url) if request.callback_url else None,
+            'created_at': now,
+            'updated_at': now
+        })
+        self._wakeup.set()
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one(
+            {'id': job_id},
+            {'_id': 0, 'request': 0, 'expires_at': 0, 'callback_url': 0}
+        )
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        now = datetime.now(timezone.utc)
+        return await self.collection.find_one_and_update(
+            {'$or': [
+                {'status': 'queued'},
+                {'status': 'running', 'updated_at': {'$lt': now - timedelta(seconds=JOB_STALE_SECONDS)}}
+            ]},
+            {'$set': {'status': 'running', 'started_at': now, 'updated_at': now}},
+            projection={'_id': 0, 'id': 1, 'request': 1, 'callback_url': 1},
+            sort=[('created_at', 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _worker(self, number: int) -> None:
+        while True:
             try:
-                github_stats = await PlatformDataFetcher.fetch_github_stats(request.github_username)
-                activity_data['github'] = github_stats
+                job = await self._claim()
             except Exception as e:
-                activity_data['github'] = {'error': str(e)}
-        
-        if request.leetcode_username:
+                logger.warning(f"Job worker {number} could not claim a job: {str(e)}")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._process(job)
+
+    async def _process(self, job: Dict[str, Any]) -> None:
+        job_id = job['id']
+        outbound_priority.set(PRIORITY_BATCH)
+
+        async def on_progress(stage: str) -> None:
+            percent = round(JOB_STAGES.index(stage) / (len(JOB_STAGES) - 1) * 100)
+            await self._update(job_id, {'progress': {'stage': stage, 'percent': percent}})
+
+        try:
+            result = await run_analysis(AnalyzeProfileRequest(**job['request']), on_progress=on_progress, batched=True)
+            update = {
+                'status': 'completed',
+                'progress': {'stage': 'completed', 'percent': 100},
+                'result': result
+            }
+        except Exception as e:
+            logger.error(f"Analysis job {job_id} failed: {str(e)}")
+            update = {'status': 'failed', 'error': f"Error analyzing profile: {str(e)}"}
+        finished_at = datetime.now(timezone.utc)
+        update['finished_at'] = finished_at
+        update['expires_at'] = finished_at + timedelta(seconds=JOB_RESULT_TTL_SECONDS)
+        await self._update(job_id, update)
+
+        if job.get('callback_url'):
+            await self._deliver_callback(job_id, job['callback_url'], update)
+
+    async def _update(self, job_id: str, fields: Dict[str, Any]) -> None:
+        fields['updated_at'] = datetime.now(timezone.utc)
+        try:
+            await self.collection.update_one({'id': job_id}, {'$set': fields})
+        except Exception as e:
+            logger.warning(f"Could not update analysis job {job_id}: {str(e)}")
+
+    async def _deliver_callback(self, job_id: str, callback_url: str, update: Dict[str, Any]) -> None:
+        payload = {
+            'job_id': job_id,
+            'status': update['status'],
+            'result': update.get('result'),
+            'error': update.get('error')
+        }
+        try:
+            # Literal addresses never reach the resolver, so check the host here as well
+            host = URL(callback_url).host
+            if not callback_host_allowed(host):
+                raise ValueError(f"{host} is not an allowed callback host")
+            async with self._get_callback_session().post(callback_url, data=json.dumps(payload, default=str),
+                                                         headers={'Content-Type': 'application/json'},
+                                                         allow_redirects=False) as response:
+                callback_status = response.status
+        except Exception as e:
+            logger.warning(f"Callback for job {job_id} to {callback_url} failed: {str(e)}")
+            callback_status = None
+        await self._update(job_id, {'callback_status': callback_status})
+
+analysis_jobs = AnalysisJobQueue(db.analysis_jobs, JOB_WORKERS)
+
+# Collection indexes
+# 'create' builds missing indexes at startup, 'verify' only reports them, 'off' skips both
+INDEX_BOOTSTRAP = os.environ.get('INDEX_BOOTSTRAP', 'create').lower()
+
+def _username_index(field: str) -> Tuple[List[Tuple[str, int]], Dict[str, Any]]:
+    # Most profiles leave at least one platform empty; keep those out of the index
+    return [(field, 1)], {'name': field, 'partialFilterExpression': {field: {'$type': 'string'}}}
+
+# Indexes the API's reads rely on, as (keys, options) per collection
+COLLECTION_INDEXES = {
+    'user_profiles': [
+        ([('id', 1)], {'name': 'id_unique', 'unique': True}),
+        # Profiles stored before identities were tracked have no identity field
+        ([('identity', 1)], {
+            'name': 'identity_unique', 'unique': True,
+            'partialFilterExpression': {'identity': {'$type': 'string'}}
+        }),
+        _username_index('github_username'),
+        _username_index('leetcode_username'),
+        _username_index('codeforces_username'),
+    ],
+    'ai_recommendations': [
+        ([('user_id', 1), ('generated_at', -1)], {'name': 'user_id_generated_at'}),
+    ],
+}
+
+# Index names found missing by the last verification, exposed through /api/metrics
+missing_indexes: List[str] = []
+
+async def ensure_collection_indexes() -> None:
+    for collection, indexes in COLLECTION_INDEXES.items():
+        for keys, options in indexes:
+            await db[collection].create_index(keys, **options)
+
+async def verify_collection_indexes() -> List[str]:
+    """Return ``collection.index`` for every expected index that is absent or differs"""
+    missing = []
+    for collection, indexes in COLLECTION_INDEXES.items():
+        existing = await db[collection].index_information()
+        present = {
+            (tuple((field, direction if isinstance(direction, str) else int(direction))
+                   for field, direction in info['key']), bool(info.get('unique')))
+            for info in existing.values()
+        }
+        for keys, options in indexes:
+            if (tuple(keys), bool(options.get('unique'))) not in present:
+                missing.append(f"{collection}.{options['name']}")
+    return missing
+
+# Date fields that older documents stored as ISO strings
+STRING_DATE_FIELDS = {
+    'user_profiles': ['created_at', 'last_analyzed'],
+    'ai_recommendations': ['generated_at'],
+}
+# One-off: rewrite those strings as BSON dates at startup. Each field costs a
+# collection scan, so switch it off again once a migration has run
+MIGRATE_STRING_DATES = os.environ.get('MIGRATE_STRING_DATES', 'false').lower() == 'true'
+
+async def migrate_string_dates() -> None:
+    for collection, fields in STRING_DATE_FIELDS.items():
+        for field in fields:
+            result = await db[collection].update_many(
+                {field: {'$type': 'string'}},
+                [{'$set': {field: {'$toDate': f"${field}"}}}]
+            )
+            if result.modified_count:
+                logger.info(f"Converted {result.modified_count} {collection}.{field} values to dates")
+
+async def bootstrap_collection_indexes() -> None:
+    """Create and/or verify collection indexes according to INDEX_BOOTSTRAP"""
+    if INDEX_BOOTSTRAP == 'off':
+        return
+    if INDEX_BOOTSTRAP == 'create':
+        await ensure_collection_indexes()
+    missing_indexes[:] = await verify_collection_indexes()
+    if missing_indexes:
+        logger.warning(f"Missing indexes, reads on these collections will scan: {', '.join(missing_indexes)}")
+
+# Write-behind persistence
+WRITE_BEHIND_BATCH_SIZE = int(os.environ.get('WRITE_BEHIND_BATCH_SIZE', '100'))
+WRITE_BEHIND_FLUSH_MS = int(os.environ.get('WRITE_BEHIND_FLUSH_MS', '200'))
+WRITE_BEHIND_MAX_PENDING = int(os.environ.get('WRITE_BEHIND_MAX_PENDING', '2000'))
+PROFILE_ID_CACHE_ENTRIES = int(os.environ.get('PROFILE_ID_CACHE_ENTRIES', '10000'))
+PROFILE_ID_CACHE_TTL_SECONDS = int(os.environ.get('PROFILE_ID_CACHE_TTL_SECONDS', '86400'))
+
+class AnalysisWriteBehind:
+    """Buffers profile upserts and recommendation inserts and writes them in bulk.
+
+    A background task flushes every ``flush_ms`` or as soon as ``batch_size``
+    writes are queued; ``stop`` lets a flush in progress finish, then
+    flushes whatever is left. A failed flush puts
+    its writes back for the next attempt. Queued writes are visible through
+    ``pending`` until they reach Mongo, so a returned user id can be read
+    back immediately.
+
+    The buffer never holds more than ``max_pending`` writes. A caller that
+    finds it full waits for one flush; if Mongo is still failing, the oldest
+    recommendation sets are dropped first, then the oldest profile writes.
+    Drops are counted in ``metrics``.
+    """
+
+    def __init__(self, profiles, recommendations, batch_size: int, flush_ms: int, max_pending: int):
+        self.profiles = profiles
+        self.recommendations = recommendations
+        self.batch_size = batch_size
+        self.flush_seconds = flush_ms / 1000
+        self.max_pending = max_pending
+        # identity -> {'set': $set fields, 'insert': $setOnInsert fields}; writes for one identity coalesce
+        self._profile_writes: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._recommendation_writes: List[Dict[str, Any]] = []
+        # Writes of the flush in progress stay readable until Mongo has them
+        self._flushing_profiles: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._flushing_recommendations: List[Dict[str, Any]] = []
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.flushes = 0
+        self.written = 0
+        self.dropped_profiles = 0
+        self.dropped_recommendations = 0
+
+    def start(self) -> None:
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            # Cancelling mid-flush would lose the writes it has taken off the
+            # queue, so let the loop finish its current flush and exit
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def queued(self) -> int:
+        return len(self._profile_writes) + len(self._recommendation_writes)
+
+    async def enqueue(self, identity: str, profile_set: Dict[str, Any], profile_insert: Dict[str, Any],
+                      recommendation: Dict[str, Any]) -> None:
+        if self.queued() >= self.max_pending:
+            await self.flush()
+        previous = self._profile_writes.get(identity)
+        self._profile_writes[identity] = {
+            'set': profile_set,
+            # The first queued insert wins, matching $setOnInsert semantics
+            'insert': previous['insert'] if previous else profile_insert
+        }
+        self._recommendation_writes.append(recommendation)
+        self._trim()
+        if self.queued() >= self.batch_size:
+            self._wakeup.set()
+
+    def pending_user_id(self, identity: str) -> Optional[str]:
+        write = self._profile_writes.get(identity) or self._flushing_profiles.get(identity)
+        return write['insert']['id'] if write else None
+
+    def pending(self, user_id: str) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """Queued profile write ({'set', 'insert'}) and latest queued recommendation set for a user"""
+        profile = next(
+            (write for writes in (self._profile_writes, self._flushing_profiles) for write in writes.values()
+             if write['insert']['id'] == user_id),
+            None
+        )
+        recommendation = next(
+            (write for writes in (self._recommendation_writes, self._flushing_recommendations)
+             for write in reversed(writes) if write['user_id'] == user_id),
+            None
+        )
+        return profile, recommendation
+
+    async def flush(self) -> None:
+        user_ids = await self._write_pending()
+        # Pruning runs outside the lock so enqueuers waiting on a flush are not held up by it
+        if user_ids and RECOMMENDATION_HISTORY_LIMIT:
             try:
-                leetcode_stats = await PlatformDataFetcher.fetch_leetcode_stats(request.leetcode_username)
-                activity_data['leetcode'] = leetcode_stats
+                await _prune_recommendations(user_ids)
             except Exception as e:
-                activity_data['leetcode'] = {'error': str(e)}
-        
-        if request.codeforces_username:
+                logger.warning(f"Could not prune recommendations for {len(user_ids)} users: {str(e)}")
+
+    async def _write_pending(self) -> List[str]:
+        """Write out everything queued, returning the users that got new recommendation sets"""
+        async with self._lock:
+            profile_writes, self._profile_writes = self._profile_writes, {}
+            recommendation_writes, self._recommendation_writes = self._recommendation_writes, []
+            if not profile_writes and not recommendation_writes:
+                return []
+            self.flushes += 1
+            self._flushing_profiles, self._flushing_recommendations = profile_writes, recommendation_writes
             try:
-                codeforces_stats = await PlatformDataFetcher.fetch_codeforces_stats(request.codeforces_username)
-                activity_data['codeforces'] = codeforces_stats
+                if profile_writes:
+                    await self._write_profiles(profile_writes)
+                if recommendation_writes:
+                    await self._insert_recommendations(recommendation_writes)
             except Exception as e:
-                activity_data['codeforces'] = {'error': str(e)}
+                logger.error(f"Write-behind flush of {len(profile_writes)} profiles and "
+                             f"{len(recommendation_writes)} recommendation sets failed: {str(e)}")
+                self._requeue(profile_writes, recommendation_writes)
+                return []
+            finally:
+                self._flushing_profiles, self._flushing_recommendations = {}, []
+            self.written += len(profile_writes) + len(recommendation_writes)
+            return list({write['user_id'] for write in recommendation_writes})
+
+    async def _write_profiles(self, profile_writes: Dict[str, Dict[str, Dict[str, Any]]]) -> None:
+        operations = [
+            UpdateOne({'identity': identity}, {'$set': write['set'], '$setOnInsert': write['insert']}, upsert=True)
+            for identity, write in profile_writes.items()
+        ]
+        try:
+            await self.profiles.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            # Another process inserted the same identity first; retried, the upsert becomes an update
+            errors = e.details.get('writeErrors', [])
+            if any(error.get('code') != 11000 for error in errors):
+                raise
+            await self.profiles.bulk_write([operations[error['index']] for error in errors], ordered=False)
+
+    async def _insert_recommendations(self, recommendation_writes: List[Dict[str, Any]]) -> None:
+        try:
+            await self.recommendations.insert_many(recommendation_writes, ordered=False)
+        except BulkWriteError as e:
+            # insert_many assigned each document an _id on the first attempt, so
+            # after a partial failure the retry reports the stored ones as duplicates
+            if any(error.get('code') != 11000 for error in e.details.get('writeErrors', [])):
+                raise
+
+    def _requeue(self, profile_writes: Dict[str, Dict[str, Dict[str, Any]]],
+                 recommendation_writes: List[Dict[str, Any]]) -> None:
+        """Put failed writes back ahead of newer ones, then trim to ``max_pending``"""
+        merged = {}
+        for identity, write in profile_writes.items():
+            newer = self._profile_writes.get(identity)
+            merged[identity] = {'set': newer['set'] if newer else write['set'], 'insert': write['insert']}
+        for identity, write in self._profile_writes.items():
+            merged.setdefault(identity, write)
+        self._profile_writes = merged
+        self._recommendation_writes[:0] = recommendation_writes
+        self._trim()
+
+    def _trim(self) -> None:
+        """Drop the oldest writes beyond ``max_pending``, recommendation sets before profiles"""
+        overflow = self.queued() - self.max_pending
+        if overflow <= 0:
+            return
+        recommendations = min(overflow, len(self._recommendation_writes))
+        del self._recommendation_writes[:recommendations]
+        profiles = overflow - recommendations
+        for identity in list(self._profile_writes)[:profiles]:
+            del self._profile_writes[identity]
+        self.dropped_recommendations += recommendations
+        self.dropped_profiles += profiles
+        logger.error(f"Write-behind queue full; dropped {recommendations} recommendation sets and {profiles} profiles")
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            'queued': self.queued(),
+            'max_pending': self.max_pending,
+            'flushes': self.flushes,
+            'written': self.written,
+            'dropped_recommendations': self.dropped_recommendations,
+            'dropped_profiles': self.dropped_profiles
+        }
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Write-behind flush failed: {str(e)}")
+
+analysis_writes = AnalysisWriteBehind(
+    db.user_profiles, db.ai_recommendations,
+    WRITE_BEHIND_BATCH_SIZE, WRITE_BEHIND_FLUSH_MS, WRITE_BEHIND_MAX_PENDING
+)
+
+# API Endpoints
+BATCH_MAX_PROFILES = int(os.environ.get('BATCH_MAX_PROFILES', '200'))
+BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', '8'))
+# Recommendation sets kept per user; older ones are pruned after each analysis (0 keeps all)
+RECOMMENDATION_HISTORY_LIMIT = int(os.environ.get('RECOMMENDATION_HISTORY_LIMIT', '20'))
+# Only the fields UserProfile exposes; internal ones like identity stay in Mongo
+USER_PROFILE_PROJECTION = {'_id': 0, **{field: 1 for field in UserProfile.model_fields}}
+
+def _request_usernames(request: AnalyzeProfileRequest) -> Dict[str, Optional[str]]:
+    return {
+        'github': request.github_username,
+        'leetcode': request.leetcode_username,
+        'codeforces': request.codeforces_username,
+    }
+
+def _profile_key(profile: UserProfileCreate) -> Tuple[str, str, str]:
+    return tuple((username or '').strip().lower() for username in (
+        profile.github_username, profile.leetcode_username, profile.codeforces_username
+    ))
+
+def profile_identity(profile: UserProfileCreate) -> str:
+    """Case-insensitive identity of a profile; platform usernames never contain '|'"""
+    return '|'.join(_profile_key(profile))
+
+# Identities never change their id once stored, so lookups can be cached freely
+profile_ids = LRUCache(PROFILE_ID_CACHE_ENTRIES, PROFILE_ID_CACHE_ENTRIES * 256, PROFILE_ID_CACHE_TTL_SECONDS)
+
+async def _resolve_user_id(identity: str) -> str:
+    """Id of the profile for an identity, whether stored, queued or not yet seen.
+
+    New identities get a name-based uuid, so processes that see the same
+    person for the first time at once agree on the id without a write.
+    """
+    user_id = analysis_writes.pending_user_id(identity) or profile_ids.get(identity)
+    if user_id:
+        return user_id
+    profile = await db.user_profiles.find_one({'identity': identity}, {'_id': 0, 'id': 1})
+    user_id = profile['id'] if profile else str(uuid.uuid5(uuid.NAMESPACE_URL, f"profile:{identity}"))
+    profile_ids.set(identity, user_id)
+    return user_id
+
+async def _prune_recommendations(user_ids: List[str]) -> None:
+    """Delete all but the newest RECOMMENDATION_HISTORY_LIMIT sets of each user, in two round trips"""
+    stale = db.ai_recommendations.aggregate([
+        {'$match': {'user_id': {'$in': user_ids}}},
+        {'$sort': {'user_id': 1, 'generated_at': -1}},
+        {'$group': {'_id': '$user_id', 'ids': {'$push': '$_id'}}},
+        # $slice needs a positive count; the int32 maximum means "the rest"
+        {'$project': {'stale': {'$slice': ['$ids', RECOMMENDATION_HISTORY_LIMIT, 2 ** 31 - 1]}}},
+    ])
+    stale_ids = [stale_id async for group in stale for stale_id in group['stale']]
+    if stale_ids:
+        await db.ai_recommendations.delete_many({'_id': {'$in': stale_ids}})
+
+async def _store_analysis(request: AnalyzeProfileRequest, recommendations: List[Dict[str, Any]]) -> str:
+    """Queue the analyzed profile and its recommendations for writing, returning the user id"""
+    identity = profile_identity(request)
+    user_profile = UserProfile(
+        id=await _resolve_user_id(identity),
+        github_username=request.github_username,
+        leetcode_username=request.leetcode_username, 
+        codeforces_username=request.codeforces_username,
+        last_analyzed=datetime.now(timezone.utc)
+    )
+    
+    # Dates are stored as native BSON dates so they sort and range-query correctly
+    profile_dict = user_profile.dict()
+    
+    # Store recommendations
+    ai_recommendation = AIRecommendation(
+        user_id=user_profile.id,
+        recommendations=recommendations
+    )
+    
+    rec_dict = ai_recommendation.dict()
+    
+    await analysis_writes.enqueue(
+        identity,
+        {field: profile_dict[field] for field in (
+            'github_username', 'leetcode_username', 'codeforces_username', 'last_analyzed'
+        )},
+        {'id': profile_dict['id'], 'created_at': profile_dict['created_at']},
+        rec_dict
+    )
+    return user_profile.id
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def run_analysis(request: AnalyzeProfileRequest, on_progress=None,
+                       fetch_kwargs: Optional[Dict[str, Dict[str, Any]]] = None,
+                       batched: bool = False) -> Dict[str, Any]:
+    """Run the fetch, generate and store pipeline for one profile.
+
+    ``on_progress`` is awaited with a stage name before each stage starts;
+    ``fetch_kwargs`` passes extra per-platform fetcher arguments and
+    ``batched`` routes the Gemini call through the micro-batcher.
+    """
+    async def report(stage: str) -> None:
+        if on_progress is not None:
+            await on_progress(stage)
+    
+    # Every fetch and the Gemini call share one budget for the whole analysis
+    token = request_deadline.set(_deadline_after(REQUEST_DEADLINE_SECONDS))
+    try:
+        started = time.perf_counter()
+        timings = {}
+        
+        # Fetch data from every platform concurrently
+        await report('fetching')
+        stage_started = time.perf_counter()
+        activity_data, timings['platforms'] = await PlatformDataFetcher.fetch_all(_request_usernames(request), fetch_kwargs)
+        timings['fetch_ms'] = _elapsed_ms(stage_started)
         
         # Generate AI recommendations
+        await report('generating')
+        stage_started = time.perf_counter()
         recommendations = await AIRecommendationEngine.generate_recommendations(
-            activity_data, request.goal, request.domain
+            activity_data, request.goal, request.domain, batched=batched
         )
+        timings['recommendations_ms'] = _elapsed_ms(stage_started)
         
         # Store in database
-        user_profile = UserProfile(
-            github_username=request.github_username,
-            leetcode_username=request.leetcode_username, 
-            codeforces_username=request.codeforces_username,
-            last_analyzed=datetime.now(timezone.utc)
-        )
-        
-        # Prepare for MongoDB storage
-        profile_dict = user_profile.dict()
-        profile_dict['created_at'] = profile_dict['created_at'].isoformat()
-        profile_dict['last_analyzed'] = profile_dict['last_analyzed'].isoformat()
-        
-        await db.user_profiles.insert_one(profile_dict)
-        
-        # Store recommendations
-        ai_recommendation = AIRecommendation(
-            user_id=user_profile.id,
-            recommendations=recommendations
-        )
-        
-        rec_dict = ai_recommendation.dict()
-        rec_dict['generated_at'] = rec_dict['generated_at'].isoformat()
-        
-        await db.ai_recommendations.insert_one(rec_dict)
+        await report('storing')
+        stage_started = time.perf_counter()
+        user_id = await _store_analysis(request, recommendations)
+        timings['storage_ms'] = _elapsed_ms(stage_started)
+        timings['total_ms'] = _elapsed_ms(started)
         
         return {
-            'user_id': user_profile.id,
+            'user_id': user_id,
             'activity_data': activity_data,
             'recommendations': recommendations,
-            'analysis_timestamp': datetime.now(timezone.utc).isoformat()
+            'analysis_timestamp': datetime.now(timezone.utc).isoformat(),
+            'timings': timings
         }
-        
+    finally:
+        request_deadline.reset(token)
+
+@api_router.post("/analyze-profile")
+async def analyze_user_profile(request: AnalyzeProfileRequest):
+    """Analyze user profile across platforms and generate AI recommendations"""
+    try:
+        return await run_analysis(request)
     except Exception as e:
         logger.error(f"Error analyzing profile: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error analyzing profile: {str(e)}")
 
-@api_router.get("/user/{user_id}")
+@api_router.post("/analyze-profiles/batch")
+async def analyze_profiles_batch(request: BatchAnalyzeRequest):
+    """Analyze a cohort of profiles, streaming one NDJSON line per profile as it finishes.
+
+    Identical username triples are analyzed once, Codeforces handles are
+    looked up in bulk, and at most ``BATCH_CONCURRENCY`` profiles run at a
+    time. A final ``summary`` line closes the stream.
+    """
+    if len(request.profiles) > BATCH_MAX_PROFILES:
+        raise HTTPException(status_code=400, detail=f"A batch may contain at most {BATCH_MAX_PROFILES} profiles")
+    return StreamingResponse(_batch_results(request), media_type='application/x-ndjson')
+
+async def _batch_results(request: BatchAnalyzeRequest):
+    started = time.perf_counter()
+    outbound_priority.set(PRIORITY_BATCH)
+    
+    # Dedupe identical triples, remembering every input position they came from
+    unique: Dict[Tuple[str, str, str], List[int]] = {}
+    for index, profile in enumerate(request.profiles):
+        unique.setdefault(_profile_key(profile), []).append(index)
+    
+    # Handles with fresh cached stats will not be fetched; don't spend rate-limit tokens on them
+    handles = sorted({key[2] for key in unique if key[2]})
+    if handles:
+        fresh = await platform_stats_cache.fresh_usernames('codeforces', handles)
+        handles = [handle for handle in handles if handle not in fresh]
+    codeforces_infos = await PlatformDataFetcher.fetch_codeforces_user_infos(handles) if handles else {}
+    
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    
+    async def analyze(key: Tuple[str, str, str]) -> Tuple[Tuple[str, str, str], Dict[str, Any]]:
+        profile = request.profiles[unique[key][0]]
+        async with semaphore:
+            try:
+                # The bulk user.info record rides along so Codeforces is fetched with the other platforms
+                fetch_kwargs = {}
+                if key[2] in codeforces_infos:
+                    fetch_kwargs['codeforces'] = {'user_info': codeforces_infos[key[2]]}
+                result = await run_analysis(AnalyzeProfileRequest(
+                    **profile.dict(), goal=request.goal, domain=request.domain
+                ), fetch_kwargs=fetch_kwargs, batched=True)
+                return key, {'result': result}
+            except Exception as e:
+                logger.error(f"Error analyzing batch profile {key}: {str(e)}")
+                return key, {'error': f"Error analyzing profile: {str(e)}"}
+    
+    tasks = [asyncio.create_task(analyze(key)) for key in unique]
+    failed = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            key, outcome = await next_done
+            failed += len(unique[key]) if 'error' in outcome else 0
+            for index in unique[key]:
+                line = {'index': index, **request.profiles[index].dict(), **outcome}
+                yield json.dumps(line, default=str) + '\n'
+    finally:
+        await _cancel_tasks(*tasks)
+    
+    yield json.dumps({'summary': {
+        'profiles': len(request.profiles),
+        'unique_profiles': len(unique),
+        'failed': failed,
+        'total_ms': _elapsed_ms(started)
+    }}) + '\n'
+
+@api_router.post("/jobs/analyze-profile", status_code=202)
+async def submit_analysis_job(request: AnalyzeJobRequest):
+    """Queue a profile analysis and return its job id immediately"""
+    try:
+        job_id = await analysis_jobs.submit(request)
+    except Exception as e:
+        logger.error(f"Error queueing analysis job: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error queueing analysis: {str(e)}")
+    return {'job_id': job_id, 'status': 'queued', 'status_url': f"/api/jobs/{job_id}"}
+
+@api_router.get("/jobs/{job_id}")
+async def get_analysis_job(job_id: str):
+    """Get the status, progress and (once finished) result of an analysis job"""
+    job = await analysis_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@api_router.post("/analyze-profile/stream")
+async def analyze_user_profile_stream(request: AnalyzeProfileRequest):
+    """Stream platform stats and recommendations as Server-Sent Events.
+
+    Emits a ``platform`` event as each platform's stats arrive, a
+    ``recommendation`` event per recommendation as Gemini produces it, and a
+    final ``complete`` event (or ``error``) carrying the user id and timings.
+    """
+    return StreamingResponse(
+        _analysis_events(request),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+async def _analysis_events(request: AnalyzeProfileRequest):
+    started = time.perf_counter()
+    # Runs in its own response task, so the deadline needs no reset
+    request_deadline.set(_deadline_after(REQUEST_DEADLINE_SECONDS))
+    timings = {'platforms': {}}
+    try:
+        # Emit each platform as soon as its fetch completes
+        stage_started = time.perf_counter()
+        tasks = {
+            asyncio.create_task(PlatformDataFetcher.fetch_platform(platform, username)): platform
+            for platform, username in _request_usernames(request).items() if username
+        }
+        activity_data = {}
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    platform = tasks[task]
+                    activity_data[platform] = task.result()
+                    timings['platforms'][platform] = _elapsed_ms(stage_started)
+                    yield _sse('platform', {'platform': platform, 'data': activity_data[platform]})
+        finally:
+            await _cancel_tasks(*tasks)
+        timings['fetch_ms'] = _elapsed_ms(stage_started)
+        
+        stage_started = time.perf_counter()
+        recommendations = []
+        async for recommendation in AIRecommendationEngine.stream_recommendations(
+            activity_data, request.goal, request.domain
+        ):
+            yield _sse('recommendation', {'index': len(recommendations), 'recommendation': recommendation})
+            recommendations.append(recommendation)
+        timings['recommendations_ms'] = _elapsed_ms(stage_started)
+        
+        stage_started = time.perf_counter()
+        user_id = await _store_analysis(request, recommendations)
+        timings['storage_ms'] = _elapsed_ms(stage_started)
+        timings['total_ms'] = _elapsed_ms(started)
+        
+        yield _sse('complete', {
+            'user_id': user_id,
+            'analysis_timestamp': datetime.now(timezone.utc).isoformat(),
+            'timings': timings
+        })
+    except Exception as e:
+        logger.error(f"Error streaming profile analysis: {str(e)}")
+        yield _sse('error', {'detail': f"Error analyzing profile: {str(e)}"})
+
+@api_router.get("/user/{user_id}", response_model=UserAnalysisResponse)
 async def get_user_analysis(user_id: str):
     """Get stored user analysis and recommendations"""
     try:
+        # Writes still queued for this user are newer than anything stored
+        pending_profile, pending_recommendations = analysis_writes.pending(user_id)
+        
         # Get user profile
-        profile = await db.user_profiles.find_one({'id': user_id})
+        profile = await db.user_profiles.find_one({'id': user_id}, USER_PROFILE_PROJECTION)
+        if pending_profile:
+            profile = {**pending_profile['insert'], **(profile or {}), **pending_profile['set']}
         if not profile:
             raise HTTPException(status_code=404, detail="User not found")
         
         # Get latest recommendations
-        recommendations = await db.ai_recommendations.find_one(
+        recommendations = pending_recommendations or await db.ai_recommendations.find_one(
             {'user_id': user_id}, 
+            {'_id': 0, 'recommendations': 1},
             sort=[('generated_at', -1)]
         )
         
-        return {
-            'profile': profile,
-            'recommendations': recommendations['recommendations'] if recommendations else []
-        }
+        return UserAnalysisResponse(
+            profile=UserProfile.model_validate(profile),
+            recommendations=recommendations['recommendations'] if recommendations else []
+        )
         
     except HTTPException:
         raise
@@ -487,6 +3079,47 @@ async def get_user_analysis(user_id: str):
         logger.error(f"Error getting user analysis: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error retrieving user data: {str(e)}")
 
+@api_router.get("/activity/{platform}/{username}")
+async def get_activity_history(platform: str, username: str, days: int = 90):
+    """Get the activity snapshots recorded for one platform account over the last ``days``"""
+    if platform not in PLATFORM_FETCHERS:
+        raise HTTPException(status_code=404, detail=f"Unknown platform {platform}")
+    since = datetime.now(timezone.utc) - timedelta(days=max(1, min(days, SNAPSHOT_RETENTION_DAYS)))
+    try:
+        snapshots, truncated = await activity_snapshots.history(platform, username, since)
+    except Exception as e:
+        logger.error(f"Error getting activity history: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error retrieving activity history: {str(e)}")
+    return {
+        'platform': platform,
+        'username': username,
+        'snapshots': snapshots,
+        # Only the newest SNAPSHOT_HISTORY_LIMIT snapshots in range are returned
+        'truncated': truncated
+    }
+
+@api_router.get("/metrics")
+async def get_metrics():
+    """Expose in-process cache and pipeline counters"""
+    return {
+        'stats_memory_cache': platform_stats_cache.memory.metrics(),
+        'prompts': prompt_metrics.metrics(),
+        'recommendation_outcomes': recommendation_outcomes,
+        'similar_profile_reuse': similar_profile_index.metrics(),
+        'llm_batching': recommendation_batcher.metrics(),
+        'write_behind': analysis_writes.metrics(),
+        'activity_snapshots': activity_snapshots.metrics(),
+        'outbound_rate_limits': outbound_scheduler.metrics(),
+        'missing_indexes': missing_indexes,
+        'circuit_breakers': {host: breaker.metrics() for host, breaker in circuit_breakers.items()},
+        'stats_served_during_outage': platform_stats_cache.served_during_outage,
+        'github_etags': etag_cache.metrics(),
+        'single_flight': {
+            'platforms': platform_flights.metrics(),
+            'recommendations': recommendation_flights.metrics()
+        }
+    }
+
 @api_router.get("/")
 async def root():
     return {"message": "AI Student Activity Recommender API"}
@@ -509,6 +3142,45 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def startup_http_client():
+    get_http_session()
+    get_gemini_model()
+    if GEMINI_WARMUP:
+        app.state.gemini_warmup = asyncio.create_task(warm_gemini_model())
+    try:
+        await platform_stats_cache.ensure_indexes()
+        await recommendation_cache.ensure_indexes()
+        if SIMILAR_PROFILE_REUSE:
+            await similar_profile_index.ensure_indexes()
+        await analysis_jobs.ensure_indexes()
+        await etag_cache.ensure_indexes()
+    except Exception as e:
+        logger.warning(f"Could not create indexes: {str(e)}")
+    try:
+        await bootstrap_collection_indexes()
+    except Exception as e:
+        logger.warning(f"Could not bootstrap collection indexes: {str(e)}")
+    try:
+        await activity_snapshots.ensure_collection()
+    except Exception as e:
+        logger.warning(f"Could not set up the activity snapshot collection: {str(e)}")
+    if MIGRATE_STRING_DATES:
+        try:
+            await migrate_string_dates()
+        except Exception as e:
+            logger.warning(f"Could not migrate string dates: {str(e)}")
+    analysis_jobs.start()
+    analysis_writes.start()
+    activity_snapshots.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    await analysis_jobs.stop()
+    await platform_stats_cache.close()
+    # Jobs may have queued writes right up to their cancellation; flush after them
+    await analysis_writes.stop()
+    await activity_snapshots.stop()
+    client.close()
+    await close_http_session()
+    llm_executor.shutdown(wait=False)
\ No newline at end of file
@@ -1,6 +1,7 @@
 import requests
 import sys
 import json
+import time
 from datetime import datetime
 
 class AIStudentJourneyAPITester:
@@ -263,6 +264,136 @@ class AIStudentJourneyAPITester:
             timeout=30
         )
 
+    def test_analyze_profile_stream(self):
+        """Test the Server-Sent Events variant of profile analysis"""
+        data = {
+            "github_username": "octocat",
+            "codeforces_username": "tourist",
+            "goal": "Improve programming skills",
+            "domain": "General Software Development"
+        }
+        success, response = self.run_test(
+            "Analyze Profile - Streaming (SSE)",
+            "POST",
+            "analyze-profile/stream",
+            200,
+            data=data,
+            timeout=90
+        )
+        
+        # Validate the event sequence
+        if success and isinstance(response, str):
+            events = [line[len('event:'):].strip() for line in response.splitlines() if line.startswith('event:')]
+            print(f"   📡 Events: {events}")
+            if events.count('platform') == 2:
+                print(f"      ✅ platform events: 2")
+            else:
+                print(f"      ❌ platform events: expected 2, got {events.count('platform')}")
+            if events.count('recommendation') > 0:
+                print(f"      ✅ recommendation events: {events.count('recommendation')}")
+            else:
+                print(f"      ❌ recommendation events: none")
+            if events and events[-1] == 'complete':
+                print(f"      ✅ complete event: Present")
+            else:
+                print(f"      ❌ complete event: Missing")
+        
+        return success, response
+
+    def test_activity_history(self, flush_wait=6):
+        """Test that analyzed Codeforces activity shows up in the snapshot history"""
+        # Snapshots are written in batches a few seconds after the fetch
+        time.sleep(flush_wait)
+        success, response = self.run_test(
+            "Activity History - Codeforces",
+            "GET",
+            "activity/codeforces/tourist?days=30",
+            200
+        )
+        if success and isinstance(response, dict):
+            snapshots = response.get('snapshots', [])
+            print(f"   📈 Snapshots: {len(snapshots)}")
+            if snapshots:
+                print(f"   Latest: {snapshots[-1].get('fetched_at')} - {snapshots[-1].get('activity')}")
+        return success, response
+
+    def test_analysis_job(self, poll_timeout=90):
+        """Test the asynchronous job API: submit, then poll until finished"""
+        data = {
+            "github_username": "octocat",
+            "goal": "Improve programming skills",
+            "domain": "General Software Development"
+        }
+        success, response = self.run_test(
+            "Analysis Job - Submit",
+            "POST",
+            "jobs/analyze-profile",
+            202,
+            data=data
+        )
+        if not success or not isinstance(response, dict) or 'job_id' not in response:
+            return False, response
+        
+        job_id = response['job_id']
+        deadline = time.time() + poll_timeout
+        while time.time() < deadline:
+            success, job = self.run_test(
+                "Analysis Job - Poll",
+                "GET",
+                f"jobs/{job_id}",
+                200
+            )
+            if not success:
+                return False, job
+            print(f"   ⏳ Status: {job.get('status')} - {job.get('progress')}")
+            if job.get('status') in ('completed', 'failed'):
+                if job['status'] == 'completed':
+                    self.validate_analysis_response(job.get('result', {}))
+                else:
+                    print(f"   ❌ Job failed: {job.get('error')}")
+                return job['status'] == 'completed', job
+            time.sleep(2)
+        
+        print(f"   ❌ Job did not finish within {poll_timeout} seconds")
+        return False, {}
+
+    def test_analyze_profiles_batch(self):
+        """Test cohort analysis streamed back as NDJSON"""
+        data = {
+            "profiles": [
+                {"codeforces_username": "tourist"},
+                {"codeforces_username": "Tourist"},
+                {"github_username": "octocat"}
+            ],
+            "goal": "Improve programming skills",
+            "domain": "General Software Development"
+        }
+        success, response = self.run_test(
+            "Analyze Profiles - Batch (NDJSON)",
+            "POST",
+            "analyze-profiles/batch",
+            200,
+            data=data,
+            timeout=120
+        )
+        
+        # Validate one line per profile plus the summary
+        if success and isinstance(response, str):
+            lines = [json.loads(line) for line in response.splitlines() if line.strip()]
+            results = [line for line in lines if 'index' in line]
+            summary = next((line['summary'] for line in lines if 'summary' in line), None)
+            print(f"   📦 Batch Validation:")
+            if sorted(line['index'] for line in results) == [0, 1, 2]:
+                print(f"      ✅ Results: one line per profile")
+            else:
+                print(f"      ❌ Results: got indices {[line['index'] for line in results]}")
+            if summary and summary.get('unique_profiles') == 2:
+                print(f"      ✅ Summary: {summary}")
+            else:
+                print(f"      ❌ Summary: {summary}")
+        
+        return success, response
+
     def validate_analysis_response(self, response_data):
         """Validate the structure of analysis response"""
         required_fields = ['user_id', 'activity_data', 'recommendations', 'analysis_timestamp']
@@ -275,6 +406,10 @@ class AIStudentJourneyAPITester:
                 print(f"   ❌ {field}: Missing")
                 return False
         
+        timings = response_data.get('timings', {})
+        if timings:
+            print(f"   ⏱️  Timings: fetch {timings.get('fetch_ms')}ms, recommendations {timings.get('recommendations_ms')}ms, total {timings.get('total_ms')}ms")
+        
         # Validate recommendations structure
         recommendations = response_data.get('recommendations', [])
         if isinstance(recommendations, list) and len(recommendations) > 0:
@@ -319,6 +454,7 @@ def main():
         tester.validate_analysis_response(cf_response)
     
     leetcode_success, leetcode_response = tester.test_analyze_profile_leetcode_only()
+    tester.test_activity_history()
     
     # Test multiple platforms
     print("\n" + "="*60)
@@ -329,6 +465,21 @@ def main():
     if multi_success and isinstance(multi_response, dict):
         tester.validate_analysis_response(multi_response)
     
+    # Test streaming
+    print("\n" + "="*60)
+    print("TESTING STREAMING")
+    print("="*60)
+    
+    tester.test_analyze_profile_stream()
+    tester.test_analyze_profiles_batch()
+    
+    # Test asynchronous jobs
+    print("\n" + "="*60)
+    print("TESTING ASYNC JOBS")
+    print("="*60)
+    
+    tester.test_analysis_job()
+    
     # Test error handling
     print("\n" + "="*60)
     print("TESTING ERROR HANDLING")
@@ -28,11 +28,50 @@ import {
   Activity,
   Award
 } from 'lucide-react';
-import axios from 'axios';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// POST the analysis request and hand each Server-Sent Event to onEvent as it arrives
+const readAnalysisStream = async (payload, onEvent) => {
+  const response = await fetch(`${API}/analyze-profile/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+    body: JSON.stringify(payload)
+  });
+  if (!response.ok || !response.body) {
+    throw new Error(`Analysis stream failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const rawEvent = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      let event = 'message';
+      const dataLines = [];
+      rawEvent.split('\n').forEach(line => {
+        if (line.startsWith('event:')) {
+          event = line.slice(6).trim();
+        } else if (line.startsWith('data:')) {
+          dataLines.push(line.slice(5).trim());
+        }
+      });
+      if (dataLines.length) {
+        onEvent(event, JSON.parse(dataLines.join('\n')));
+      }
+    }
+  }
+};
+
 function App() {
   const [formData, setFormData] = useState({
     github_username: '',
@@ -60,15 +99,38 @@ function App() {
 
     setLoading(true);
     try {
-      const response = await axios.post(`${API}/analyze-profile`, {
+      let completed = false;
+      // Render platforms and recommendations progressively as they stream in
+      await readAnalysisStream({
         github_username: formData.github_username || null,
         leetcode_username: formData.leetcode_username || null,
         codeforces_username: formData.codeforces_username || null,
         goal: formData.goal,
         domain: formData.domain
+      }, (event, data) => {
+        if (event === 'platform') {
+          setAnalysisResult(prev => ({
+            recommendations: [],
+            ...prev,
+            activity_data: { ...(prev?.activity_data || {}), [data.platform]: data.data }
+          }));
+        } else if (event === 'recommendation') {
+          setAnalysisResult(prev => ({
+            activity_data: {},
+            ...prev,
+            recommendations: [...(prev?.recommendations || []), data.recommendation]
+          }));
+        } else if (event === 'complete') {
+          completed = true;
+          setAnalysisResult(prev => ({ activity_data: {}, recommendations: [], ...prev, ...data }));
+        } else if (event === 'error') {
+          throw new Error(data.detail);
+        }
       });
 
-      setAnalysisResult(response.data);
+      if (!completed) {
+        throw new Error('Analysis stream ended before completion');
+      }
       toast.success('Analysis complete! Check your personalized recommendations below.');
     } catch (error) {
       console.error('Analysis error:', error);
@@ -494,6 +556,12 @@ function App() {
                       index={index}
                     />
                   ))}
+                  {loading && (
+                    <div className="flex items-center justify-center gap-2 text-gray-600">
+                      <div className="animate-spin rounded-full h-4 w-4 border-b-2 border-blue-600" />
+                      Generating recommendations...
+                    </div>
+                  )}
                 </div>
               </TabsContent>
             </Tabs>
@@ -0,0 +1,29 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# server.py reads these at import time; nothing here connects to Mongo or Gemini
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'test_database')
+os.environ.setdefault('GOOGLE_API_KEY', 'test-key')
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replace server's time module with a clock the test advances by hand"""
+    import server
+    clock = FakeClock()
+    monkeypatch.setattr(server, 'time', clock)
+    return clock
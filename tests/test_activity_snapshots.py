@@ -0,0 +1,118 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import server
+from server import ActivitySnapshotStore
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, key, direction):
+        self.documents = sorted(self.documents, key=lambda document: document[key], reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self.documents = self.documents[:count]
+        return self
+
+    async def to_list(self, length):
+        return self.documents[:length]
+
+
+class FakeSnapshots:
+    def __init__(self):
+        self.documents = []
+        self.inserting = asyncio.Event()
+        self.release = None
+
+    async def insert_many(self, documents, ordered=True):
+        self.inserting.set()
+        if self.release is not None:
+            await self.release.wait()
+        self.documents.extend(documents)
+
+    def find(self, query, projection):
+        return FakeCursor([
+            {'fetched_at': document['fetched_at'], 'activity': document['activity']}
+            for document in self.documents
+            if document['meta'] == {'platform': query['meta.platform'], 'username': query['meta.username']}
+            and document['fetched_at'] >= query['fetched_at']['$gte']
+        ])
+
+
+def make_store(collection, batch_size=100):
+    return ActivitySnapshotStore({'activity_snapshots': collection}, 'activity_snapshots', retention_days=30,
+                                 batch_size=batch_size, flush_seconds=60, max_pending=3)
+
+
+def test_record_buffers_until_flush():
+    async def scenario():
+        collection = FakeSnapshots()
+        store = make_store(collection)
+        store.record('github', 'Alice', {'activity': {'recent_commits': 3}, 'profile': {'bio': 'x'}})
+        assert collection.documents == []
+        await store.flush()
+        return store, collection
+
+    store, collection = asyncio.run(scenario())
+    document = collection.documents[0]
+    assert document['meta'] == {'platform': 'github', 'username': 'alice'}
+    assert document['activity'] == {'recent_commits': 3}
+    assert store.metrics() == {'queued': 0, 'recorded': 1, 'dropped': 0}
+
+
+def test_full_buffer_drops_new_snapshots():
+    store = make_store(FakeSnapshots())
+    for _ in range(4):
+        store.record('github', 'alice', {'activity': {}})
+    assert store.metrics() == {'queued': 3, 'recorded': 0, 'dropped': 1}
+
+
+def test_stop_during_insert_keeps_its_batch():
+    async def scenario():
+        collection = FakeSnapshots()
+        collection.release = asyncio.Event()
+        store = make_store(collection, batch_size=1)
+        store.start()
+        await asyncio.sleep(0)
+        store.record('github', 'alice', {'activity': {'recent_commits': 1}})
+        await asyncio.wait_for(collection.inserting.wait(), timeout=1)
+        stopping = asyncio.create_task(store.stop())
+        await asyncio.sleep(0.01)
+        collection.release.set()
+        await asyncio.wait_for(stopping, timeout=1)
+        return store, collection
+
+    store, collection = asyncio.run(scenario())
+    assert len(collection.documents) == 1
+    assert store.metrics() == {'queued': 0, 'recorded': 1, 'dropped': 0}
+
+
+def test_history_keeps_the_newest_snapshots(monkeypatch):
+    monkeypatch.setattr(server, 'SNAPSHOT_HISTORY_LIMIT', 2)
+    collection = FakeSnapshots()
+    start = datetime(2026, 1, 1)
+    collection.documents = [
+        {'meta': {'platform': 'github', 'username': 'alice'}, 'fetched_at': start + timedelta(days=day),
+         'activity': {'day': day}}
+        for day in range(4)
+    ]
+    snapshots, truncated = asyncio.run(make_store(collection).history('github', 'Alice', start))
+    assert truncated
+    assert [snapshot['activity']['day'] for snapshot in snapshots] == [2, 3]
+    assert snapshots[0]['fetched_at'].tzinfo == timezone.utc
+
+
+def test_history_within_limit_is_not_truncated(monkeypatch):
+    monkeypatch.setattr(server, 'SNAPSHOT_HISTORY_LIMIT', 5)
+    collection = FakeSnapshots()
+    collection.documents = [
+        {'meta': {'platform': 'github', 'username': 'alice'}, 'fetched_at': datetime(2026, 1, day),
+         'activity': {'day': day}}
+        for day in (1, 2)
+    ]
+    snapshots, truncated = asyncio.run(make_store(collection).history('github', 'alice', datetime(2026, 1, 1)))
+    assert not truncated
+    assert [snapshot['activity']['day'] for snapshot in snapshots] == [1, 2]
@@ -0,0 +1,56 @@
+from server import CircuitBreaker
+
+
+class TestCircuitBreaker:
+    def test_opens_after_threshold_consecutive_failures(self, clock):
+        breaker = CircuitBreaker(threshold=3, reset_seconds=30)
+        for _ in range(2):
+            breaker.record_failure()
+        assert breaker.state == 'closed' and breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == 'open'
+        assert not breaker.allow()
+        assert breaker.metrics()['rejected'] == 1
+
+    def test_success_resets_the_failure_count(self, clock):
+        breaker = CircuitBreaker(threshold=2, reset_seconds=30)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        assert breaker.state == 'closed'
+
+    def test_half_open_lets_one_trial_through(self, clock):
+        breaker = CircuitBreaker(threshold=1, reset_seconds=30)
+        breaker.record_failure()
+        clock.now += 30
+        assert breaker.allow()
+        assert breaker.state == 'half_open'
+        assert not breaker.allow()
+
+    def test_successful_trial_closes(self, clock):
+        breaker = CircuitBreaker(threshold=1, reset_seconds=30)
+        breaker.record_failure()
+        clock.now += 30
+        assert breaker.allow()
+        breaker.record_success()
+        assert breaker.state == 'closed'
+        assert breaker.allow()
+
+    def test_failed_trial_reopens(self, clock):
+        breaker = CircuitBreaker(threshold=5, reset_seconds=30)
+        for _ in range(5):
+            breaker.record_failure()
+        clock.now += 30
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == 'open'
+        clock.now += 29
+        assert not breaker.allow()
+
+    def test_trial_that_never_reports_stops_blocking(self, clock):
+        breaker = CircuitBreaker(threshold=1, reset_seconds=30)
+        breaker.record_failure()
+        clock.now += 30
+        assert breaker.allow()
+        clock.now += 30
+        assert breaker.allow()
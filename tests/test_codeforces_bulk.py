@@ -0,0 +1,123 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from urllib.parse import unquote
+
+import pytest
+
+import server
+from server import LRUCache, PlatformDataFetcher, PlatformStatsCache
+
+KNOWN = {'tourist', 'petr', 'benq', 'um_nik'}
+
+
+@pytest.fixture
+def user_info(monkeypatch):
+    """Fake user.info that fails on the first unknown handle the way Codeforces does"""
+    calls = []
+
+    async def get_json(session, url, error_body=False):
+        handles = unquote(url.split('handles=', 1)[1]).split(';')
+        calls.append(handles)
+        unknown = [handle for handle in handles if handle.lower() not in KNOWN]
+        if unknown:
+            comment = f'handles: User with handle {unknown[0]} not found'
+            return 400, {'status': 'FAILED', 'comment': comment} if error_body else None
+        return 200, {'status': 'OK', 'result': [{'handle': handle.capitalize()} for handle in handles]}
+
+    monkeypatch.setattr(server, 'get_http_session', lambda: None)
+    monkeypatch.setattr(server, '_get_json', get_json)
+    return calls
+
+
+def lookup(handles):
+    return asyncio.run(PlatformDataFetcher.fetch_codeforces_user_infos(handles))
+
+
+def test_all_known_handles_take_one_call(user_info):
+    infos = lookup(['tourist', 'petr'])
+    assert infos == {'tourist': {'handle': 'Tourist'}, 'petr': {'handle': 'Petr'}}
+    assert len(user_info) == 1
+
+
+def test_unknown_handles_are_dropped_and_the_chunk_retried(user_info):
+    infos = lookup(['tourist', 'nobody', 'petr', 'Ghost'])
+    assert set(infos) == {'tourist', 'petr'}
+    assert user_info == [['tourist', 'nobody', 'petr', 'Ghost'], ['tourist', 'petr', 'Ghost'], ['tourist', 'petr']]
+
+
+def test_chunk_of_only_unknown_handles_stops(user_info):
+    assert lookup(['nobody', 'ghost']) == {}
+    assert len(user_info) == 2
+
+
+def test_each_chunk_is_retried_independently(user_info, monkeypatch):
+    monkeypatch.setattr(server, 'CODEFORCES_INFO_BATCH_SIZE', 2)
+    infos = lookup(['tourist', 'nobody', 'petr', 'benq'])
+    assert set(infos) == {'tourist', 'petr', 'benq'}
+    assert user_info == [['tourist', 'nobody'], ['tourist'], ['petr', 'benq']]
+
+
+@pytest.mark.parametrize('status, body', [
+    (503, None),
+    (400, {'status': 'FAILED', 'comment': 'Call limit exceeded'}),
+    (400, {'status': 'FAILED', 'comment': 'handles: User with handle someone_else not found'}),
+])
+def test_other_failures_skip_the_chunk(monkeypatch, status, body):
+    calls = []
+
+    async def get_json(session, url, error_body=False):
+        calls.append(url)
+        return status, body
+
+    monkeypatch.setattr(server, 'get_http_session', lambda: None)
+    monkeypatch.setattr(server, '_get_json', get_json)
+    assert lookup(['tourist', 'petr']) == {}
+    assert len(calls) == 1
+
+
+class FakeStatsCollection:
+    def __init__(self, documents, fail=False):
+        self.documents = documents
+        self.fail = fail
+        self.queries = []
+
+    def find(self, query, projection):
+        self.queries.append(query)
+        if self.fail:
+            raise RuntimeError('mongo unavailable')
+        matches = [document for document in self.documents
+                   if document['platform'] == query['platform'] and document['username'] in query['username']['$in']
+                   and document['fetched_at'] > query['fetched_at']['$gt']]
+        return FakeCursor(matches)
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    async def to_list(self, length):
+        return self.documents
+
+
+def make_cache(collection, memory=None):
+    return PlatformStatsCache(collection, fresh_seconds=900, max_age_seconds=86400, memory=memory)
+
+
+def test_fresh_usernames_reads_memory_then_mongo_once():
+    now = datetime.now(timezone.utc)
+    memory = LRUCache(max_entries=10, max_bytes=10000, ttl_seconds=86400)
+    memory.set(('codeforces', 'tourist'), {'stats': {}, 'fetched_at': now})
+    memory.set(('codeforces', 'petr'), {'stats': {}, 'fetched_at': now - timedelta(hours=1)})
+    collection = FakeStatsCollection([
+        {'platform': 'codeforces', 'username': 'petr', 'fetched_at': now - timedelta(minutes=1)},
+        {'platform': 'codeforces', 'username': 'benq', 'fetched_at': now - timedelta(hours=1)},
+    ])
+    fresh = asyncio.run(make_cache(collection, memory).fresh_usernames('codeforces', ['Tourist', 'petr', 'benq']))
+    assert fresh == {'tourist', 'petr'}
+    assert len(collection.queries) == 1
+    assert sorted(collection.queries[0]['username']['$in']) == ['benq', 'petr']
+
+
+def test_fresh_usernames_treats_read_failures_as_not_fresh():
+    fresh = asyncio.run(make_cache(FakeStatsCollection([], fail=True)).fresh_usernames('codeforces', ['tourist']))
+    assert fresh == set()
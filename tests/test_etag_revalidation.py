@@ -0,0 +1,77 @@
+import asyncio
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+import server
+from server import ETagCache, LRUCache, _get_json
+
+
+class FakeETagCollection:
+    def __init__(self):
+        self.documents = {}
+
+    async def find_one(self, query, projection):
+        document = self.documents.get(query['url'])
+        return {'etag': document['etag'], 'body': document['body']} if document else None
+
+    async def update_one(self, query, update, upsert=False):
+        self.documents[query['url']] = update['$set']
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ETagCache(FakeETagCollection(), ttl_seconds=3600, memory=LRUCache(10, 100000, 3600))
+    monkeypatch.setattr(server, 'etag_cache', cache)
+    monkeypatch.setattr(server, 'circuit_breakers', {})
+    return cache
+
+
+def fetch_repeatedly(times, body, conditional=True):
+    """GET a local resource ``times`` times; it answers 304 to a matching If-None-Match"""
+    seen = []
+
+    async def handle(request):
+        seen.append(request.headers.get('If-None-Match'))
+        if request.headers.get('If-None-Match') == '"v1"':
+            return web.Response(status=304, headers={'ETag': '"v1"'})
+        return web.json_response(body, headers={'ETag': '"v1"'})
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_get('/user', handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        url = f'http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/user'
+        try:
+            async with aiohttp.ClientSession() as session:
+                return [await _get_json(session, url, conditional=conditional) for _ in range(times)], url
+        finally:
+            await runner.cleanup()
+
+    results, url = asyncio.run(scenario())
+    return results, seen, url
+
+
+def test_second_request_is_revalidated_and_served_from_the_stored_body(cache):
+    results, seen, url = fetch_repeatedly(2, {'login': 'octocat'})
+    assert results == [(200, {'login': 'octocat'})] * 2
+    assert seen == [None, '"v1"']
+    assert cache.revalidated == 1
+    assert cache.collection.documents[url]['etag'] == '"v1"'
+
+
+def test_stored_etag_survives_a_cold_memory_tier(cache):
+    _, _, url = fetch_repeatedly(1, {'login': 'octocat'})
+    cache.memory = LRUCache(10, 100000, 3600)
+    assert asyncio.run(cache.get(url)) == {'etag': '"v1"', 'body': {'login': 'octocat'}}
+
+
+def test_unconditional_requests_neither_send_nor_store_etags(cache):
+    results, seen, _ = fetch_repeatedly(2, {'login': 'octocat'}, conditional=False)
+    assert results == [(200, {'login': 'octocat'})] * 2
+    assert seen == [None, None]
+    assert cache.collection.documents == {}
@@ -0,0 +1,132 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import server
+from server import AIRecommendationEngine, DeadlineExceeded, request_deadline
+
+
+class AsyncModel:
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+
+    async def generate_content_async(self, prompt, **kwargs):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            return f'async: {prompt}'
+        finally:
+            self.active -= 1
+
+
+class SyncModel:
+    def generate_content(self, prompt, **kwargs):
+        return f'sync on {threading.current_thread().name}: {prompt}'
+
+
+def test_concurrent_calls_are_bounded_by_the_semaphore(monkeypatch):
+    model = AsyncModel()
+
+    async def scenario():
+        monkeypatch.setattr(server, 'llm_semaphore', asyncio.Semaphore(2))
+        return await asyncio.gather(*(AIRecommendationEngine._call_model(model, str(n)) for n in range(5)))
+
+    assert asyncio.run(scenario()) == [f'async: {n}' for n in range(5)]
+    assert model.peak == 2
+
+
+def test_models_without_an_async_api_run_on_the_executor():
+    result = asyncio.run(AIRecommendationEngine._call_model(SyncModel(), 'hi'))
+    assert result.startswith('sync on gemini') and result.endswith(': hi')
+
+
+def test_async_api_can_be_disabled(monkeypatch):
+    class BothModel(SyncModel, AsyncModel):
+        pass
+
+    monkeypatch.setattr(server, 'LLM_USE_ASYNC', False)
+    assert asyncio.run(AIRecommendationEngine._call_model(BothModel(), 'hi')).startswith('sync on gemini')
+
+
+def test_call_is_cut_off_at_the_request_deadline():
+    async def scenario():
+        request_deadline.set(time.monotonic() + 0.02)
+        await AIRecommendationEngine._call_model(AsyncModel(delay=1), 'slow')
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(scenario())
+
+
+def test_spent_deadline_fails_before_calling():
+    model = AsyncModel()
+
+    async def scenario():
+        request_deadline.set(time.monotonic() - 1)
+        await AIRecommendationEngine._call_model(model, 'late')
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(scenario())
+    assert model.peak == 0
+
+
+class RecordingModel:
+    instances = []
+
+    def __init__(self, name, generation_config=None, safety_settings=None):
+        self.name = name
+        self.generation_config = generation_config
+        self.safety_settings = safety_settings
+        RecordingModel.instances.append(self)
+
+
+@pytest.fixture
+def fresh_model(monkeypatch):
+    RecordingModel.instances = []
+    monkeypatch.setattr(server, 'gemini_model', None)
+    monkeypatch.setattr(server.genai, 'GenerativeModel', RecordingModel)
+    for name in ('GEMINI_TEMPERATURE', 'GEMINI_TOP_P', 'GEMINI_MAX_OUTPUT_TOKENS'):
+        monkeypatch.delenv(name, raising=False)
+    return RecordingModel.instances
+
+
+def test_model_is_built_once(fresh_model):
+    assert server.get_gemini_model() is server.get_gemini_model()
+    assert len(fresh_model) == 1
+    assert fresh_model[0].name == server.GEMINI_MODEL_NAME
+    assert fresh_model[0].generation_config is None
+
+
+def test_model_picks_up_configured_settings(fresh_model, monkeypatch):
+    monkeypatch.setenv('GEMINI_TEMPERATURE', '0.2')
+    monkeypatch.setenv('GEMINI_MAX_OUTPUT_TOKENS', '800')
+    monkeypatch.setattr(server, 'GEMINI_SAFETY_THRESHOLD', 'BLOCK_ONLY_HIGH')
+    model = server.get_gemini_model()
+    assert model.generation_config == {'temperature': 0.2, 'max_output_tokens': 800}
+    assert set(model.safety_settings) == set(server.GEMINI_HARM_CATEGORIES)
+    assert set(model.safety_settings.values()) == {'BLOCK_ONLY_HIGH'}
+
+
+def test_warm_up_sends_a_one_token_request(monkeypatch):
+    calls = []
+
+    async def call_model(model, prompt, **kwargs):
+        calls.append((model, prompt, kwargs))
+
+    monkeypatch.setattr(server, 'get_gemini_model', lambda: 'model')
+    monkeypatch.setattr(AIRecommendationEngine, '_call_model', staticmethod(call_model))
+    asyncio.run(server.warm_gemini_model())
+    assert calls == [('model', 'ping', {'generation_config': {'max_output_tokens': 1}})]
+
+
+def test_warm_up_failure_is_not_raised(monkeypatch):
+    async def call_model(model, prompt, **kwargs):
+        raise RuntimeError('quota exceeded')
+
+    monkeypatch.setattr(server, 'get_gemini_model', lambda: 'model')
+    monkeypatch.setattr(AIRecommendationEngine, '_call_model', staticmethod(call_model))
+    asyncio.run(server.warm_gemini_model())
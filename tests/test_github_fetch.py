@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import server
+from server import PlatformDataFetcher
+
+GRAPHQL_USER = {
+    'name': 'The Octocat',
+    'bio': None,
+    'createdAt': '2011-01-25T18:44:36Z',
+    'followers': {'totalCount': 42},
+    'following': {'totalCount': 7},
+    'repositories': {'totalCount': 8},
+    'recentRepos': {'nodes': [
+        {'name': 'hello-world', 'stargazerCount': 3, 'primaryLanguage': {'name': 'Python'}},
+        {'name': 'notes', 'stargazerCount': 0, 'primaryLanguage': None},
+    ]},
+    'contributionsCollection': {'totalCommitContributions': 17},
+}
+
+
+@pytest.fixture
+def graphql(monkeypatch):
+    """Answer the GraphQL query with the (status, body) the test sets"""
+    answer = {}
+
+    async def post_json(session, url, payload, headers=None):
+        answer['variables'] = payload['variables']
+        return answer['status'], answer['body']
+
+    monkeypatch.setattr(server, 'get_http_session', lambda: None)
+    monkeypatch.setattr(server, '_post_json', post_json)
+    return answer
+
+
+def fetch_graphql(username='octocat'):
+    return asyncio.run(PlatformDataFetcher._fetch_github_graphql(username))
+
+
+def test_graphql_result_is_mapped_onto_rest_fields(graphql):
+    graphql.update(status=200, body={'data': {'user': GRAPHQL_USER}})
+    user_data, repos_data, commits = fetch_graphql()
+    assert graphql['variables']['login'] == 'octocat'
+    assert user_data == {'name': 'The Octocat', 'public_repos': 8, 'followers': 42, 'following': 7,
+                         'created_at': '2011-01-25T18:44:36Z', 'bio': None}
+    assert repos_data == [{'name': 'hello-world', 'language': 'Python', 'stargazers_count': 3},
+                          {'name': 'notes', 'language': None, 'stargazers_count': 0}]
+    assert commits == 17
+
+
+def test_graphql_mode_normalizes_like_rest(graphql, monkeypatch):
+    monkeypatch.setattr(server, 'GITHUB_FETCH_MODE', 'graphql')
+    graphql.update(status=200, body={'data': {'user': GRAPHQL_USER}})
+    stats = asyncio.run(PlatformDataFetcher.fetch_github_stats('octocat'))
+    assert stats['profile']['public_repos'] == 8
+    assert stats['activity'] == {
+        'total_stars': 3,
+        'recent_commits': 17,
+        'top_languages': {'Python': 1},
+        'recent_repos': [{'name': 'hello-world', 'language': 'Python'}, {'name': 'notes', 'language': None}]
+    }
+
+
+@pytest.mark.parametrize('body', [
+    {'data': {'user': None}, 'errors': [{'type': 'NOT_FOUND', 'message': 'Could not resolve to a User'}]},
+    {'data': {'user': None}},
+])
+def test_missing_user_is_not_found(graphql, body):
+    graphql.update(status=200, body=body)
+    with pytest.raises(HTTPException) as raised:
+        fetch_graphql()
+    assert raised.value.status_code == 404
+
+
+@pytest.mark.parametrize('body', [
+    {'data': None, 'errors': [{'type': 'RATE_LIMITED', 'message': 'API rate limit exceeded'}]},
+    {'data': None, 'errors': [{'message': 'Your token has not been granted the required scopes'}]},
+    {'data': {'user': None}, 'errors': [{'type': 'NOT_FOUND', 'message': 'x'}, {'type': 'FORBIDDEN', 'message': 'y'}]},
+])
+def test_graphql_errors_are_upstream_failures(graphql, body):
+    graphql.update(status=200, body=body)
+    with pytest.raises(HTTPException) as raised:
+        fetch_graphql()
+    assert raised.value.status_code == 502
+    assert body['errors'][-1]['message'] in raised.value.detail
+
+
+@pytest.mark.parametrize('status', [401, 403, 503])
+def test_graphql_http_failures_are_upstream_failures(graphql, status):
+    graphql.update(status=status, body=None)
+    with pytest.raises(HTTPException) as raised:
+        fetch_graphql()
+    assert raised.value.status_code == 502
+
+
+@pytest.fixture
+def rest(monkeypatch):
+    """Answer REST calls by URL suffix"""
+    answers = {}
+
+    async def get_json(session, url, conditional=False, headers=None):
+        path = url.split('api.github.com/users/octocat', 1)[1].split('?')[0]
+        return answers.get(path, (200, []))
+
+    monkeypatch.setattr(server, 'get_http_session', lambda: None)
+    monkeypatch.setattr(server, '_get_json', get_json)
+    return answers
+
+
+def test_rest_counts_commits_from_push_events(rest):
+    rest[''] = (200, {'login': 'octocat', 'public_repos': 8})
+    rest['/repos'] = (200, [{'name': 'hello-world', 'language': 'Python', 'stargazers_count': 3}])
+    rest['/events'] = (200, [{'type': 'PushEvent', 'payload': {'commits': [{}, {}]}}, {'type': 'WatchEvent'}])
+    user_data, repos_data, commits = asyncio.run(PlatformDataFetcher._fetch_github_rest('octocat'))
+    assert user_data['public_repos'] == 8
+    assert repos_data[0]['name'] == 'hello-world'
+    assert commits == 2
+
+
+@pytest.mark.parametrize('status, expected', [(404, 404), (403, 502), (500, 502)])
+def test_rest_user_lookup_failures(rest, status, expected):
+    rest[''] = (status, None)
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(PlatformDataFetcher._fetch_github_rest('octocat'))
+    assert raised.value.status_code == expected
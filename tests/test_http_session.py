@@ -0,0 +1,20 @@
+import asyncio
+
+import server
+
+
+def test_one_pooled_session_is_shared_until_closed():
+    async def scenario():
+        first = server.get_http_session()
+        assert server.get_http_session() is first
+        assert first.connector.limit == server.HTTP_POOL_LIMIT
+        assert first.connector.limit_per_host == server.HTTP_POOL_LIMIT_PER_HOST
+        assert first.timeout.total == server.HTTP_TOTAL_TIMEOUT
+        await server.close_http_session()
+        assert first.closed
+        second = server.get_http_session()
+        assert second is not first
+        await server.close_http_session()
+        return server.http_session
+
+    assert asyncio.run(scenario()) is None
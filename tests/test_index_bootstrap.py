@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+import server
+
+
+class FakeIndexCollection:
+    def __init__(self):
+        self.indexes = {'_id_': {'key': [('_id', 1)]}}
+
+    async def create_index(self, keys, name, unique=False, **options):
+        self.indexes[name] = {'key': list(keys), 'unique': unique}
+
+    async def index_information(self):
+        return self.indexes
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    database = {name: FakeIndexCollection() for name in server.COLLECTION_INDEXES}
+    monkeypatch.setattr(server, 'db', database)
+    monkeypatch.setattr(server, 'missing_indexes', [])
+    return database
+
+
+def bootstrap(monkeypatch, mode):
+    monkeypatch.setattr(server, 'INDEX_BOOTSTRAP', mode)
+    asyncio.run(server.bootstrap_collection_indexes())
+    return server.missing_indexes
+
+
+def test_create_builds_every_index(fake_db, monkeypatch):
+    assert bootstrap(monkeypatch, 'create') == []
+    profiles = fake_db['user_profiles'].indexes
+    assert profiles['id_unique'] == {'key': [('id', 1)], 'unique': True}
+    assert {'github_username', 'leetcode_username', 'codeforces_username', 'identity_unique'} <= set(profiles)
+    assert fake_db['ai_recommendations'].indexes['user_id_generated_at']['key'] == [('user_id', 1), ('generated_at', -1)]
+
+
+def test_verify_reports_missing_indexes_without_creating_them(fake_db, monkeypatch):
+    missing = bootstrap(monkeypatch, 'verify')
+    assert 'user_profiles.id_unique' in missing
+    assert 'ai_recommendations.user_id_generated_at' in missing
+    assert list(fake_db['user_profiles'].indexes) == ['_id_']
+
+
+def test_verify_flags_an_index_that_lost_its_uniqueness(fake_db, monkeypatch):
+    bootstrap(monkeypatch, 'create')
+    fake_db['user_profiles'].indexes['id_unique']['unique'] = False
+    assert bootstrap(monkeypatch, 'verify') == ['user_profiles.id_unique']
+
+
+def test_verify_matches_indexes_by_keys_not_name(fake_db, monkeypatch):
+    bootstrap(monkeypatch, 'create')
+    recommendations = fake_db['ai_recommendations'].indexes
+    recommendations['renamed'] = recommendations.pop('user_id_generated_at')
+    assert bootstrap(monkeypatch, 'verify') == []
+
+
+def test_off_skips_everything(fake_db, monkeypatch):
+    assert bootstrap(monkeypatch, 'off') == []
+    assert list(fake_db['user_profiles'].indexes) == ['_id_']
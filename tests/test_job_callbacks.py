@@ -0,0 +1,127 @@
+import asyncio
+import socket
+
+import aiohttp
+import pytest
+from aiohttp import web
+from pydantic import ValidationError
+
+import server
+from server import AnalysisJobQueue, AnalyzeJobRequest, PublicAddressResolver, callback_host_allowed
+
+
+@pytest.mark.parametrize('host', [
+    None, '', 'localhost', 'LOCALHOST', 'localhost.', 'api.localhost', 'metadata.google.internal',
+    'metadata.google.internal.', '127.0.0.1', '10.1.2.3', '172.16.0.1', '192.168.1.1', '169.254.169.254',
+    '0.0.0.0', '100.64.0.1', '::1', '[::1]', 'fe80::1', 'fc00::1', '::ffff:127.0.0.1', '[::ffff:10.0.0.1]',
+    '224.0.0.1',
+])
+def test_internal_hosts_are_rejected(host):
+    assert not callback_host_allowed(host)
+
+
+@pytest.mark.parametrize('host', ['8.8.8.8', '::ffff:8.8.8.8', '2001:4860:4860::8888', 'hooks.example.com'])
+def test_public_hosts_are_allowed(host):
+    assert callback_host_allowed(host)
+
+
+def test_allowlist_replaces_the_public_address_check(monkeypatch):
+    monkeypatch.setattr(server, 'JOB_CALLBACK_ALLOWED_HOSTS', {'hooks.example.com', '10.0.0.5'})
+    assert callback_host_allowed('hooks.example.com')
+    assert callback_host_allowed('HOOKS.example.com.')
+    assert callback_host_allowed('10.0.0.5')
+    assert not callback_host_allowed('other.example.com')
+    assert not callback_host_allowed('8.8.8.8')
+
+
+def test_job_request_rejects_internal_callback_urls():
+    with pytest.raises(ValidationError):
+        AnalyzeJobRequest(github_username='octocat', callback_url='http://169.254.169.254/latest/meta-data')
+    with pytest.raises(ValidationError):
+        AnalyzeJobRequest(github_username='octocat', callback_url='ftp://hooks.example.com/done')
+    request = AnalyzeJobRequest(github_username='octocat', callback_url='https://hooks.example.com/done')
+    assert request.callback_url.host == 'hooks.example.com'
+
+
+class StaticResolver(aiohttp.abc.AbstractResolver):
+    """Resolves every host to fixed addresses"""
+
+    def __init__(self, *addresses):
+        self.addresses = addresses
+
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        return [{'hostname': host, 'host': address, 'port': port, 'family': family, 'proto': 0, 'flags': 0}
+                for address in self.addresses]
+
+    async def close(self):
+        pass
+
+
+class TestPublicAddressResolver:
+    def test_internal_addresses_are_dropped(self):
+        resolver = PublicAddressResolver(StaticResolver('127.0.0.1', '93.184.216.34', 'fe80::1%eth0'))
+        results = asyncio.run(resolver.resolve('example.com', 443))
+        assert [result['host'] for result in results] == ['93.184.216.34']
+
+    def test_host_with_only_internal_addresses_fails(self):
+        resolver = PublicAddressResolver(StaticResolver('127.0.0.1', '169.254.169.254'))
+        with pytest.raises(OSError):
+            asyncio.run(resolver.resolve('rebind.example', 80))
+
+    def test_allowlisted_hosts_resolve_unfiltered(self, monkeypatch):
+        monkeypatch.setattr(server, 'JOB_CALLBACK_ALLOWED_HOSTS', {'hooks.internal'})
+        resolver = PublicAddressResolver(StaticResolver('10.0.0.5'))
+        results = asyncio.run(resolver.resolve('hooks.internal', 80))
+        assert [result['host'] for result in results] == ['10.0.0.5']
+
+
+class FakeJobs:
+    def __init__(self):
+        self.updates = []
+
+    async def update_one(self, query, update):
+        self.updates.append(update['$set'])
+
+
+async def deliver_to_local_server(callback_host):
+    """Deliver a callback to ``callback_host``, which resolves to a server on loopback"""
+    received = []
+
+    async def handle(request):
+        received.append(await request.json())
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post('/done', handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    jobs = AnalysisJobQueue(FakeJobs(), workers=1)
+    try:
+        await jobs._deliver_callback('job-1', f'http://{callback_host}:{port}/done', {'status': 'completed'})
+    finally:
+        await jobs.stop()
+        await runner.cleanup()
+    return received, jobs.collection.updates
+
+
+@pytest.fixture
+def loopback_dns(monkeypatch):
+    """Every callback host resolves to 127.0.0.1, as a rebinding host would at connect time"""
+    connector = server.callback_connector
+    monkeypatch.setattr(server, 'callback_connector', lambda: connector(StaticResolver('127.0.0.1')))
+
+
+def test_callback_is_not_sent_to_a_host_resolving_to_loopback(loopback_dns):
+    received, updates = asyncio.run(deliver_to_local_server('rebind.example'))
+    assert received == []
+    assert updates[-1]['callback_status'] is None
+
+
+def test_allowlisted_callback_host_is_delivered(loopback_dns, monkeypatch):
+    monkeypatch.setattr(server, 'JOB_CALLBACK_ALLOWED_HOSTS', {'hooks.internal'})
+    received, updates = asyncio.run(deliver_to_local_server('hooks.internal'))
+    assert received == [{'job_id': 'job-1', 'status': 'completed', 'result': None, 'error': None}]
+    assert updates[-1]['callback_status'] == 200
@@ -0,0 +1,46 @@
+from server import LRUCache
+
+
+class TestLRUCache:
+    def test_hit_and_miss(self, clock):
+        cache = LRUCache(max_entries=10, max_bytes=1000, ttl_seconds=60)
+        cache.set('a', {'value': 1})
+        assert cache.get('a') == {'value': 1}
+        assert cache.get('b') is None
+        metrics = cache.metrics()
+        assert (metrics['hits'], metrics['misses'], metrics['hit_rate']) == (1, 1, 0.5)
+
+    def test_entries_expire(self, clock):
+        cache = LRUCache(max_entries=10, max_bytes=1000, ttl_seconds=60)
+        cache.set('a', 1)
+        clock.now += 60
+        assert cache.get('a') is None
+        assert cache.metrics()['expirations'] == 1
+        assert cache.metrics()['entries'] == 0
+
+    def test_least_recently_used_is_evicted(self, clock):
+        cache = LRUCache(max_entries=2, max_bytes=1000, ttl_seconds=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        assert cache.get('b') is None
+        assert cache.get('a') == 1 and cache.get('c') == 3
+        assert cache.metrics()['evictions'] == 1
+
+    def test_byte_budget(self, clock):
+        cache = LRUCache(max_entries=10, max_bytes=10, ttl_seconds=60)
+        cache.set('a', 'xxxx')  # 6 bytes encoded
+        cache.set('b', 'yyyy')
+        assert cache.get('a') is None
+        assert cache.metrics()['bytes'] == 6
+        cache.set('big', 'z' * 20)
+        assert cache.get('big') is None
+        assert cache.get('b') == 'yyyy'
+
+    def test_oversized_replacement_removes_old_value(self, clock):
+        cache = LRUCache(max_entries=10, max_bytes=10, ttl_seconds=60)
+        cache.set('a', 'x')
+        cache.set('a', 'x' * 20)
+        assert cache.get('a') is None
+        assert cache.metrics()['bytes'] == 0
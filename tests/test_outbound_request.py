@@ -0,0 +1,101 @@
+import asyncio
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+import server
+from server import UpstreamResponseError, _request
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(server, 'circuit_breakers', {})
+    monkeypatch.setattr(server, 'HTTP_MAX_RETRIES', 2)
+    monkeypatch.setattr(server, '_retry_delay', lambda attempt, retry_after: 0.001)
+
+
+def call(responses, path='/resource', **kwargs):
+    """Send one _request to a local server answering with ``responses`` in turn"""
+    hits = []
+
+    async def handle(request):
+        status, content_type, text = responses[min(len(hits), len(responses) - 1)]
+        hits.append(request.path)
+        return web.Response(status=status, text=text, content_type=content_type)
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_route('*', path, handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            async with aiohttp.ClientSession() as session:
+                try:
+                    status, body, _ = await _request(session, 'GET', f'http://127.0.0.1:{port}{path}', **kwargs)
+                    outcome = (status, body)
+                except Exception as e:
+                    outcome = e
+        finally:
+            await runner.cleanup()
+        return outcome, hits, server.get_circuit_breaker('127.0.0.1').failures
+
+    return asyncio.run(scenario())
+
+
+JSON = 'application/json'
+HTML = 'text/html'
+
+
+def test_json_body_is_returned():
+    outcome, hits, failures = call([(200, JSON, '{"ok": true}')])
+    assert outcome == (200, {'ok': True})
+    assert (len(hits), failures) == (1, 0)
+
+
+def test_server_errors_are_retried_and_count_once():
+    outcome, hits, failures = call([(503, HTML, 'busy')])
+    assert outcome == (503, None)
+    assert (len(hits), failures) == (3, 1)
+
+
+def test_retry_that_succeeds_counts_as_success():
+    outcome, hits, failures = call([(503, HTML, 'busy'), (200, JSON, '[1]')])
+    assert outcome == (200, [1])
+    assert (len(hits), failures) == (2, 0)
+
+
+def test_429_does_not_count_against_the_breaker():
+    outcome, hits, failures = call([(429, HTML, 'slow down')])
+    assert outcome == (429, None)
+    assert (len(hits), failures) == (3, 0)
+
+
+@pytest.mark.parametrize('content_type, text', [(HTML, '<html>challenge</html>'), (JSON, '{"truncated": ')])
+def test_undecodable_200_is_not_retried_and_counts_once(content_type, text):
+    outcome, hits, failures = call([(200, content_type, text)])
+    assert isinstance(outcome, UpstreamResponseError)
+    assert (len(hits), failures) == (1, 1)
+
+
+def test_undecodable_200_after_a_retry_still_counts_once():
+    outcome, hits, failures = call([(503, HTML, 'busy'), (200, HTML, 'oops')])
+    assert isinstance(outcome, UpstreamResponseError)
+    assert (len(hits), failures) == (2, 1)
+
+
+def test_client_errors_are_final_and_hide_the_body_by_default():
+    outcome, hits, failures = call([(404, JSON, '{"message": "Not Found"}')])
+    assert outcome == (404, None)
+    assert (len(hits), failures) == (1, 0)
+
+
+def test_error_body_returns_json_error_bodies():
+    outcome, _, _ = call([(400, JSON, '{"status": "FAILED"}')], error_body=True)
+    assert outcome == (400, {'status': 'FAILED'})
+    outcome, _, failures = call([(400, HTML, 'bad request')], error_body=True)
+    assert outcome == (400, None)
+    assert failures == 0
@@ -0,0 +1,122 @@
+import asyncio
+import time
+
+import pytest
+
+import server
+from server import PlatformDataFetcher
+
+
+@pytest.fixture
+def fetchers(monkeypatch):
+    """Platform fetchers that sleep briefly and record their arguments; the stats cache is bypassed"""
+    calls = []
+
+    def fetcher(platform, delay=0.1):
+        async def fetch(username, **kwargs):
+            calls.append((platform, username, kwargs))
+            await asyncio.sleep(delay)
+            if username == 'missing':
+                raise ValueError(f'{platform} user not found')
+            return {'profile': {'name': username}}
+        return fetch
+
+    async def get_or_fetch(platform, username, fetch):
+        return await fetch(username)
+
+    monkeypatch.setattr(server, 'PLATFORM_FETCHERS', {platform: fetcher(platform) for platform in
+                                                      ('github', 'leetcode', 'codeforces')})
+    monkeypatch.setattr(server.platform_stats_cache, 'get_or_fetch', get_or_fetch)
+    monkeypatch.setattr(server, 'platform_flights', server.SingleFlight())
+    return calls
+
+
+def test_platforms_are_fetched_concurrently(fetchers):
+    started = time.perf_counter()
+    activity, timings = asyncio.run(PlatformDataFetcher.fetch_all(
+        {'github': 'octocat', 'leetcode': 'lc_user', 'codeforces': 'tourist'}
+    ))
+    assert time.perf_counter() - started < 0.25
+    assert activity == {platform: {'profile': {'name': username}} for platform, username in
+                        (('github', 'octocat'), ('leetcode', 'lc_user'), ('codeforces', 'tourist'))}
+    assert set(timings) == {'github', 'leetcode', 'codeforces'}
+    assert all(timing >= 90 for timing in timings.values())
+
+
+def test_missing_usernames_are_skipped(fetchers):
+    activity, timings = asyncio.run(PlatformDataFetcher.fetch_all(
+        {'github': 'octocat', 'leetcode': None, 'codeforces': ''}
+    ))
+    assert list(activity) == ['github']
+    assert [platform for platform, _, _ in fetchers] == ['github']
+
+
+def test_one_failure_does_not_fail_the_others(fetchers):
+    activity, _ = asyncio.run(PlatformDataFetcher.fetch_all({'github': 'missing', 'leetcode': 'lc_user'}))
+    assert activity['github'] == {'error': 'github user not found'}
+    assert activity['leetcode'] == {'profile': {'name': 'lc_user'}}
+
+
+def test_fetch_kwargs_reach_only_their_platform(fetchers):
+    asyncio.run(PlatformDataFetcher.fetch_all(
+        {'github': 'octocat', 'codeforces': 'tourist'},
+        fetch_kwargs={'codeforces': {'user_info': {'handle': 'tourist'}}}
+    ))
+    assert sorted(fetchers) == [('codeforces', 'tourist', {'user_info': {'handle': 'tourist'}}),
+                                ('github', 'octocat', {})]
+
+
+@pytest.fixture
+def codeforces_api(monkeypatch):
+    """Fake Codeforces API; each call takes 0.1s and is recorded by method name"""
+    calls = []
+    state = {'cancelled': []}
+    answers = {
+        'user.info': (200, {'status': 'OK', 'result': [{'handle': 'tourist', 'rating': 3800, 'maxRating': 3979}]}),
+        'user.rating': (200, {'status': 'OK', 'result': [{}, {}]}),
+        'user.status': (200, {'status': 'OK', 'result': [
+            {'verdict': 'OK', 'problem': {'contestId': 1, 'index': 'A'}},
+            {'verdict': 'OK', 'problem': {'contestId': 1, 'index': 'A'}},
+            {'verdict': 'WRONG_ANSWER', 'problem': {'contestId': 1, 'index': 'B'}},
+        ]}),
+    }
+
+    async def get_json(session, url, **kwargs):
+        method = url.split('/api/', 1)[1].split('?')[0]
+        calls.append(method)
+        try:
+            await asyncio.sleep(0.05 if method == 'user.info' else 0.1)
+        except asyncio.CancelledError:
+            state['cancelled'].append(method)
+            raise
+        return answers[method]
+
+    monkeypatch.setattr(server, 'get_http_session', lambda: None)
+    monkeypatch.setattr(server, '_get_json', get_json)
+    state.update(calls=calls, answers=answers)
+    return state
+
+
+def test_codeforces_sub_requests_run_concurrently(codeforces_api):
+    started = time.perf_counter()
+    stats = asyncio.run(PlatformDataFetcher.fetch_codeforces_stats('tourist'))
+    assert time.perf_counter() - started < 0.18
+    assert sorted(codeforces_api['calls']) == ['user.info', 'user.rating', 'user.status']
+    assert stats['activity'] == {'current_rating': 3800, 'max_rating': 3979, 'contests_participated': 2,
+                                 'problems_solved': 1, 'total_submissions': 3, 'recent_activity': 'Active'}
+
+
+def test_unknown_codeforces_user_cancels_the_other_calls(codeforces_api):
+    codeforces_api['answers']['user.info'] = (400, None)
+    with pytest.raises(server.HTTPException):
+        asyncio.run(PlatformDataFetcher.fetch_codeforces_stats('nobody'))
+    assert sorted(codeforces_api['cancelled']) == ['user.rating', 'user.status']
+
+
+
+def test_bulk_user_info_skips_the_user_lookup(codeforces_api):
+    stats = asyncio.run(PlatformDataFetcher.fetch_codeforces_stats(
+        'tourist', user_info={'handle': 'tourist', 'rating': 1500, 'maxRating': 1600}
+    ))
+    assert sorted(codeforces_api['calls']) == ['user.rating', 'user.status']
+    assert stats['activity']['current_rating'] == 1500
@@ -0,0 +1,141 @@
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+import server
+from server import AnalysisWriteBehind, AnalyzeProfileRequest, LRUCache, UserProfileCreate, profile_identity
+
+
+class FakeProfiles:
+    def __init__(self, documents=()):
+        self.documents = list(documents)
+        self.reads = 0
+
+    async def find_one(self, query, projection=None):
+        self.reads += 1
+        for document in self.documents:
+            if all(document.get(field) == value for field, value in query.items()):
+                fields = [field for field, include in (projection or {}).items() if include]
+                return {field: document[field] for field in fields if field in document} if fields else dict(document)
+        return None
+
+
+class NullCollection:
+    async def bulk_write(self, operations, ordered=True):
+        pass
+
+    async def insert_many(self, documents, ordered=True):
+        pass
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    profiles = FakeProfiles()
+    writes = AnalysisWriteBehind(NullCollection(), NullCollection(), batch_size=100, flush_ms=1000, max_pending=100)
+    monkeypatch.setattr(server, 'db', SimpleNamespace(user_profiles=profiles, ai_recommendations=None))
+    monkeypatch.setattr(server, 'analysis_writes', writes)
+    monkeypatch.setattr(server, 'profile_ids', LRUCache(100, 100000, 3600))
+    return SimpleNamespace(profiles=profiles, writes=writes)
+
+
+def request(github='Octocat', leetcode=None, codeforces=' Tourist '):
+    return AnalyzeProfileRequest(github_username=github, leetcode_username=leetcode, codeforces_username=codeforces)
+
+
+def test_identity_ignores_case_and_whitespace():
+    assert profile_identity(request()) == 'octocat||tourist'
+    assert profile_identity(UserProfileCreate(github_username='OCTOCAT', codeforces_username='tourist')) == \
+        profile_identity(request())
+
+
+def test_new_identity_gets_a_deterministic_id(storage):
+    user_id = asyncio.run(server._resolve_user_id('octocat||tourist'))
+    assert user_id == str(uuid.uuid5(uuid.NAMESPACE_URL, 'profile:octocat||tourist'))
+
+
+def test_stored_identity_keeps_its_id_and_is_cached(storage):
+    storage.profiles.documents.append({'identity': 'octocat||tourist', 'id': 'stored-id'})
+
+    async def scenario():
+        return [await server._resolve_user_id('octocat||tourist') for _ in range(2)]
+
+    assert asyncio.run(scenario()) == ['stored-id', 'stored-id']
+    assert storage.profiles.reads == 1
+
+
+def test_repeat_analyses_upsert_one_profile(storage):
+    async def scenario():
+        first = await server._store_analysis(request(), [{'title': 'first'}])
+        second = await server._store_analysis(request(github='OCTOCAT'), [{'title': 'second'}])
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == second
+    assert storage.writes.metrics()['queued'] == 3
+    profile, recommendation = storage.writes.pending(first)
+    assert profile['set']['github_username'] == 'OCTOCAT'
+    assert profile['insert']['id'] == first
+    assert recommendation['recommendations'] == [{'title': 'second'}]
+
+
+def test_dates_are_queued_as_native_datetimes(storage):
+    user_id = asyncio.run(server._store_analysis(request(), [{'title': 'first'}]))
+    profile, recommendation = storage.writes.pending(user_id)
+    assert isinstance(profile['set']['last_analyzed'], datetime)
+    assert isinstance(profile['insert']['created_at'], datetime)
+    assert isinstance(recommendation['generated_at'], datetime)
+
+
+class FakeRecommendations:
+    def __init__(self, documents):
+        self.documents = documents
+
+    async def find_one(self, query, projection=None, sort=None):
+        matches = [document for document in self.documents if document['user_id'] == query['user_id']]
+        matches.sort(key=lambda document: document['generated_at'], reverse=True)
+        return {'recommendations': matches[0]['recommendations']} if matches else None
+
+
+def test_stored_analysis_is_read_with_projection_and_utc_dates(storage):
+    storage.profiles.documents.append({
+        '_id': 'object-id', 'id': 'u1', 'identity': 'octocat||', 'github_username': 'octocat',
+        'created_at': datetime(2026, 1, 1), 'last_analyzed': datetime(2026, 2, 1)
+    })
+    server.db.ai_recommendations = FakeRecommendations([
+        {'user_id': 'u1', 'generated_at': datetime(2026, 1, 1), 'recommendations': [{'title': 'old'}]},
+        {'user_id': 'u1', 'generated_at': datetime(2026, 2, 1), 'recommendations': [{'title': 'new'}]},
+    ])
+    response = asyncio.run(server.get_user_analysis('u1'))
+    assert response.profile.github_username == 'octocat'
+    assert response.profile.last_analyzed == datetime(2026, 2, 1, tzinfo=timezone.utc)
+    assert response.recommendations == [{'title': 'new'}]
+    assert 'identity' not in server.USER_PROFILE_PROJECTION
+
+
+def test_unknown_user_is_not_found(storage):
+    server.db.ai_recommendations = FakeRecommendations([])
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(server.get_user_analysis('nobody'))
+    assert raised.value.status_code == 404
+
+
+def test_string_dates_are_migrated_in_place(monkeypatch):
+    updates = []
+
+    class Collection:
+        def __init__(self, name):
+            self.name = name
+
+        async def update_many(self, query, pipeline):
+            updates.append((self.name, query, pipeline))
+            return SimpleNamespace(modified_count=1)
+
+    monkeypatch.setattr(server, 'db', {name: Collection(name) for name in server.STRING_DATE_FIELDS})
+    asyncio.run(server.migrate_string_dates())
+    assert ('user_profiles', {'last_analyzed': {'$type': 'string'}},
+            [{'$set': {'last_analyzed': {'$toDate': '$last_analyzed'}}}]) in updates
+    assert len(updates) == sum(len(fields) for fields in server.STRING_DATE_FIELDS.values())
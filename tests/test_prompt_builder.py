@@ -0,0 +1,40 @@
+import json
+
+from server import PromptBuilder
+
+ACTIVITY = {
+    'github': {
+        'profile': {'public_repos': 12, 'followers': 40, 'created_at': '2019-01-01T00:00:00Z', 'bio': 'hello'},
+        'activity': {'total_stars': 5, 'recent_commits': 30, 'top_languages': {'Python': 8},
+                     'recent_repos': [{'name': f'repo-{i}', 'language': 'Python'} for i in range(10)]}
+    },
+    'leetcode': {
+        'profile': {'ranking': 12345, 'reputation': 10},
+        'activity': {'total_solved': 100, 'easy_solved': 60, 'medium_solved': 35, 'hard_solved': 5}
+    },
+    'codeforces': {'error': 'Codeforces user not found'}
+}
+
+
+class TestPromptDigest:
+    def test_projection_drops_unused_fields_and_errors(self):
+        digest = json.loads(PromptBuilder.digest(ACTIVITY))
+        assert 'bio' not in digest['github']['profile']
+        assert digest['github']['activity']['recent_repos'][0] == 'repo-0'
+        assert digest['codeforces'] == 'unavailable'
+
+    def test_fits_budget_without_truncation(self):
+        full = PromptBuilder.digest(ACTIVITY)
+        assert PromptBuilder.digest(ACTIVITY, token_budget=PromptBuilder.estimate_tokens(full)) == full
+
+    def test_truncates_lowest_value_fields_first(self):
+        full = PromptBuilder.digest(ACTIVITY)
+        digest = json.loads(PromptBuilder.digest(ACTIVITY, token_budget=PromptBuilder.estimate_tokens(full) - 1))
+        assert 'recent_repos' not in digest['github']['activity']
+        assert 'created_at' in digest['github']['profile']
+
+    def test_truncation_stops_at_the_end_of_the_order(self):
+        digest = json.loads(PromptBuilder.digest(ACTIVITY, token_budget=1))
+        assert digest['github']['profile'] == {'public_repos': 12}
+        assert 'profile' not in digest['leetcode']
+        assert digest['leetcode']['activity']['total_solved'] == 100
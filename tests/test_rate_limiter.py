@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+import pytest
+
+import server
+from server import HostRateLimiter, RateLimitExceeded
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class TestHostRateLimiter:
+    def test_waiters_are_served_in_priority_order(self):
+        async def scenario():
+            limiter = HostRateLimiter(rate=20, burst=1)
+            await limiter.acquire(server.PRIORITY_INTERACTIVE)  # drains the bucket
+            served = []
+
+            async def acquire(priority):
+                await limiter.acquire(priority)
+                served.append(priority)
+
+            tasks = [asyncio.create_task(acquire(priority)) for priority in (
+                server.PRIORITY_BACKGROUND, server.PRIORITY_BATCH, server.PRIORITY_INTERACTIVE
+            )]
+            await asyncio.gather(*tasks)
+            return served
+
+        assert run(scenario()) == [server.PRIORITY_INTERACTIVE, server.PRIORITY_BATCH, server.PRIORITY_BACKGROUND]
+
+    def test_cancelled_waiter_does_not_block_the_queue(self):
+        async def scenario():
+            limiter = HostRateLimiter(rate=20, burst=1)
+            await limiter.acquire(server.PRIORITY_INTERACTIVE)
+            cancelled = asyncio.create_task(limiter.acquire(server.PRIORITY_INTERACTIVE))
+            waiting = asyncio.create_task(limiter.acquire(server.PRIORITY_BACKGROUND))
+            await asyncio.sleep(0)
+            cancelled.cancel()
+            await asyncio.wait_for(waiting, timeout=1)
+            return limiter.metrics()
+
+        metrics = run(scenario())
+        assert metrics['queue_depth'] == 0
+        assert metrics['requests'] == 3
+
+    def test_exhausted_remaining_blocks_until_reset(self):
+        limiter = HostRateLimiter(rate=2, burst=10)
+        limiter.observe(200, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': str(int(time.time()) + 120)})
+        metrics = limiter.metrics()
+        assert metrics['tokens'] == 0
+        assert 110 < metrics['blocked_for_seconds'] <= 120
+        with pytest.raises(RateLimitExceeded):
+            run(limiter.acquire(server.PRIORITY_INTERACTIVE))
+
+    def test_remaining_header_caps_tokens(self):
+        limiter = HostRateLimiter(rate=2, burst=10)
+        limiter.observe(200, {'X-RateLimit-Remaining': '3'})
+        assert limiter.metrics()['tokens'] == 3
+        assert limiter.metrics()['blocked_for_seconds'] == 0
+
+    def test_429_honours_retry_after(self):
+        limiter = HostRateLimiter(rate=2, burst=10)
+        limiter.observe(429, {'Retry-After': '5'})
+        metrics = limiter.metrics()
+        assert metrics['throttled'] == 1
+        assert 4 < metrics['blocked_for_seconds'] <= 5
+
+
+def test_codeforces_defaults_space_calls_two_seconds_apart():
+    limiter = HostRateLimiter(*server.HOST_RATE_LIMITS['codeforces.com'])
+    run(limiter.acquire(server.PRIORITY_INTERACTIVE))
+    assert limiter._wait_estimate() == pytest.approx(2, abs=0.05)
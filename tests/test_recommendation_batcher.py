@@ -0,0 +1,112 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+import server
+from server import AIRecommendationEngine, RecommendationBatcher, request_deadline
+
+
+def item(title):
+    return {'type': 'skill', 'title': title, 'description': 'd', 'difficulty': 'beginner',
+            'time_estimate': '1 day', 'resources': []}
+
+
+class TestParseBatch:
+    def test_splits_by_user_index(self):
+        text = json.dumps({'u0': [item('a')], 'u1': [item('b'), item('c')]})
+        assert AIRecommendationEngine.parse_batch(text, 2) == {0: [item('a')], 1: [item('b'), item('c')]}
+
+    def test_repairs_fenced_output_with_trailing_commas(self):
+        text = '```json\n{"u0": [' + json.dumps(item('a')) + ',],}\n```'
+        assert AIRecommendationEngine.parse_batch(text, 1) == {0: [item('a')]}
+
+    def test_missing_and_invalid_users_are_left_out(self):
+        text = json.dumps({'u0': [{'type': 'unknown'}], 'u2': [item('extra')], 'u1': 'none'})
+        assert AIRecommendationEngine.parse_batch(text, 2) == {}
+
+    def test_invalid_items_are_filtered(self):
+        text = json.dumps({'u0': [item('a'), {'title': 'missing fields'}]})
+        assert AIRecommendationEngine.parse_batch(text, 1) == {0: [item('a')]}
+
+    @pytest.mark.parametrize('text', ['not json', '[1, 2]'])
+    def test_unusable_output(self, text):
+        assert AIRecommendationEngine.parse_batch(text, 1) == {}
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+@pytest.fixture
+def model(monkeypatch):
+    """Stub the batched model call and per-user generation, recording the deadline each one ran under"""
+    calls = {'batch': [], 'single': [], 'response': {}}
+
+    async def call_model(model, prompt, **kwargs):
+        calls['batch'].append(request_deadline.get())
+        return FakeResponse(json.dumps(calls['response']))
+
+    async def generate(activity_data, goal, domain):
+        calls['single'].append((goal, request_deadline.get()))
+        return [item(f'single {goal}')], True
+
+    monkeypatch.setattr(server, 'get_gemini_model', lambda: None)
+    monkeypatch.setattr(AIRecommendationEngine, '_call_model', staticmethod(call_model))
+    monkeypatch.setattr(AIRecommendationEngine, '_generate', staticmethod(generate))
+    return calls
+
+
+def submit_all(batcher, goals, deadlines=None):
+    deadlines = deadlines or [None] * len(goals)
+
+    async def submit(goal, deadline):
+        request_deadline.set(deadline)
+        return await batcher.submit({}, goal, 'web')
+
+    async def scenario():
+        return await asyncio.gather(*(submit(goal, deadline) for goal, deadline in zip(goals, deadlines)))
+
+    return asyncio.run(scenario())
+
+
+def test_results_are_split_back_to_callers(model):
+    model['response'] = {'u0': [item('for a')], 'u1': [item('for b')]}
+    batcher = RecommendationBatcher(window_seconds=1, max_users=2)
+    results = submit_all(batcher, ['a', 'b'])
+    assert results == [([item('for a')], True), ([item('for b')], True)]
+    assert model['single'] == []
+    assert batcher.metrics() == {'batches': 1, 'batched_users': 2, 'retried_users': 0, 'pending': 0}
+
+
+def test_missing_users_fall_back_to_single_generation(model):
+    model['response'] = {'u0': [item('for a')]}
+    batcher = RecommendationBatcher(window_seconds=1, max_users=2)
+    results = submit_all(batcher, ['a', 'b'])
+    assert results == [([item('for a')], True), ([item('single b')], True)]
+    assert [goal for goal, _ in model['single']] == ['b']
+    assert batcher.metrics()['retried_users'] == 1
+
+
+def test_lone_request_after_window_is_generated_singly(model):
+    batcher = RecommendationBatcher(window_seconds=0.01, max_users=5)
+    assert submit_all(batcher, ['a']) == [([item('single a')], True)]
+    assert model['batch'] == []
+    assert batcher.metrics()['batches'] == 0
+
+
+def test_shared_call_uses_latest_deadline_and_retries_their_own(model):
+    now = time.monotonic()
+    deadlines = [now, now + 40]
+    batcher = RecommendationBatcher(window_seconds=1, max_users=2)
+    submit_all(batcher, ['short', 'long'], deadlines)
+    assert model['batch'] == [now + 40]
+    assert sorted(model['single']) == sorted([('short', now), ('long', now + 40)])
+
+
+def test_caller_without_deadline_lifts_the_shared_deadline(model):
+    batcher = RecommendationBatcher(window_seconds=1, max_users=2)
+    submit_all(batcher, ['a', 'b'], [time.monotonic(), None])
+    assert model['batch'] == [None]
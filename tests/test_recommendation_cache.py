@@ -0,0 +1,107 @@
+import asyncio
+import copy
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+from server import AIRecommendationEngine, RecommendationCache, recommendation_cache_key
+
+ACTIVITY = {
+    'github': {'profile': {'public_repos': 12, 'followers': 40, 'bio': 'hello'},
+               'activity': {'total_stars': 5, 'top_languages': {'Python': 8}}},
+    'leetcode': {'profile': {'ranking': 12345}, 'activity': {'total_solved': 100}},
+}
+
+
+class TestCacheKey:
+    def key(self, activity=ACTIVITY, goal='Get a job', domain='Web'):
+        return recommendation_cache_key(activity, goal, domain)
+
+    def test_platform_order_does_not_matter(self):
+        assert self.key(dict(reversed(list(ACTIVITY.items())))) == self.key()
+
+    def test_fields_left_out_of_the_prompt_do_not_matter(self):
+        activity = copy.deepcopy(ACTIVITY)
+        activity['github']['profile']['bio'] = 'changed'
+        activity['codeforces'] = {'error': 'Codeforces user x not found (request id 123)'}
+        other = copy.deepcopy(activity)
+        other['codeforces'] = {'error': 'timed out'}
+        assert self.key(activity) == self.key(other)
+
+    def test_prompt_inputs_change_the_key(self):
+        activity = copy.deepcopy(ACTIVITY)
+        activity['leetcode']['activity']['total_solved'] = 101
+        assert self.key(activity) != self.key()
+        assert self.key(goal='Learn Rust') != self.key()
+        assert self.key(domain='Systems') != self.key()
+
+
+class FakeCacheCollection:
+    def __init__(self):
+        self.documents = {}
+
+    async def find_one(self, query, projection):
+        document = self.documents.get(query['key'])
+        if document and document['expires_at'] > query['expires_at']['$gt']:
+            return {'recommendations': document['recommendations']}
+        return None
+
+    async def update_one(self, query, update, upsert=False):
+        self.documents[query['key']] = update['$set']
+
+
+def item(title):
+    return {'type': 'skill', 'title': title, 'description': 'd', 'difficulty': 'beginner',
+            'time_estimate': '1 day', 'resources': []}
+
+
+def test_cache_entries_expire():
+    collection = FakeCacheCollection()
+    cache = RecommendationCache(collection, ttl_seconds=60)
+
+    async def scenario():
+        await cache.set('k', 'goal', 'domain', [item('a')])
+        assert await cache.get('k') == [item('a')]
+        collection.documents['k']['expires_at'] = datetime.now(timezone.utc) - timedelta(seconds=1)
+        return await cache.get('k')
+
+    assert asyncio.run(scenario()) is None
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """In-memory recommendation cache and a stubbed model generation"""
+    state = {'calls': 0, 'result': ([item('generated')], True)}
+
+    async def generate(activity_data, goal, domain):
+        state['calls'] += 1
+        await asyncio.sleep(0.01)
+        return state['result']
+
+    monkeypatch.setattr(server, 'recommendation_cache', RecommendationCache(FakeCacheCollection(), 60))
+    monkeypatch.setattr(server, 'recommendation_flights', server.SingleFlight())
+    monkeypatch.setattr(server, 'SIMILAR_PROFILE_REUSE', False)
+    monkeypatch.setattr(AIRecommendationEngine, '_generate', staticmethod(generate))
+    return state
+
+
+def generate_twice(activity=ACTIVITY):
+    async def scenario():
+        first = await AIRecommendationEngine.generate_recommendations(activity, 'goal', 'domain')
+        second = await AIRecommendationEngine.generate_recommendations(activity, 'goal', 'domain')
+        return first, second
+
+    return asyncio.run(scenario())
+
+
+def test_generated_recommendations_are_reused(engine):
+    first, second = generate_twice()
+    assert first == second == [item('generated')]
+    assert engine['calls'] == 1
+
+
+def test_fallback_recommendations_are_not_cached(engine):
+    engine['result'] = ([item('fallback')], False)
+    generate_twice()
+    assert engine['calls'] == 2
@@ -0,0 +1,35 @@
+import json
+
+from server import AIRecommendationEngine
+
+ITEMS = [
+    {'type': 'project', 'title': 'Build a CLI', 'description': 'Parse "args" with [brackets] and {braces}',
+     'difficulty': 'beginner', 'time_estimate': '1 week', 'resources': ['https://docs.python.org']},
+    {'type': 'problem', 'title': 'Two Sum', 'description': 'Path C:\\temp\\ and a quote \\" inside',
+     'difficulty': 'intermediate', 'time_estimate': '1 hour', 'resources': []},
+]
+ARRAY = json.dumps(ITEMS, indent=2)
+
+
+class TestParseRecommendations:
+    def test_valid_array(self):
+        assert AIRecommendationEngine.parse_recommendations(ARRAY) == ITEMS
+
+    def test_fenced_array_with_trailing_commas_is_repaired(self):
+        text = 'Sure!\n```json\n[{"type": "skill", "title": "t", "description": "d", "difficulty": "Advanced", ' \
+               '"time_estimate": "1 day", "resources": ["r",],},]\n```'
+        assert AIRecommendationEngine.parse_recommendations(text) == [
+            {'type': 'skill', 'title': 't', 'description': 'd', 'difficulty': 'advanced',
+             'time_estimate': '1 day', 'resources': ['r']}
+        ]
+
+    def test_wrapped_array(self):
+        assert AIRecommendationEngine.parse_recommendations(json.dumps({'recommendations': ITEMS})) == ITEMS
+
+    def test_invalid_items_are_filtered(self):
+        text = json.dumps(ITEMS + [{'type': 'unknown', 'title': 't'}])
+        assert AIRecommendationEngine.parse_recommendations(text) == ITEMS
+
+    def test_unusable_output(self):
+        assert AIRecommendationEngine.parse_recommendations('no recommendations today') is None
+        assert AIRecommendationEngine.parse_recommendations('[{"type": "unknown"}]') is None
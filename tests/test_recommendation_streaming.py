@@ -0,0 +1,118 @@
+import asyncio
+import json
+
+import pytest
+
+import server
+from server import AIRecommendationEngine, RecommendationBroadcast, RecommendationCache
+
+
+def item(title):
+    return {'type': 'skill', 'title': title, 'description': 'd', 'difficulty': 'beginner',
+            'time_estimate': '1 day', 'resources': []}
+
+
+ITEMS = [item('first'), item('second'), item('third')]
+
+
+class Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class StreamingModel:
+    """Streams ITEMS as a JSON array in small chunks"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def generate_content_async(self, prompt, stream=False, **kwargs):
+        self.calls += 1
+        text = json.dumps(ITEMS)
+
+        async def chunks():
+            for start in range(0, len(text), 40):
+                await asyncio.sleep(0.005)
+                yield Chunk(text[start:start + 40])
+
+        return chunks()
+
+
+class FakeCacheCollection:
+    def __init__(self):
+        self.documents = {}
+
+    async def find_one(self, query, projection):
+        document = self.documents.get(query['key'])
+        return {'recommendations': document['recommendations']} if document else None
+
+    async def update_one(self, query, update, upsert=False):
+        self.documents[query['key']] = update['$set']
+
+
+@pytest.fixture
+def model(monkeypatch):
+    model = StreamingModel()
+    monkeypatch.setattr(server, 'get_gemini_model', lambda: model)
+    monkeypatch.setattr(server, 'recommendation_cache', RecommendationCache(FakeCacheCollection(), 60))
+    monkeypatch.setattr(server, 'recommendation_flights', server.SingleFlight())
+    monkeypatch.setattr(server, 'recommendation_streams', {})
+    monkeypatch.setattr(server, 'SIMILAR_PROFILE_REUSE', False)
+    monkeypatch.setattr(server, 'LLM_USE_ASYNC', True)
+    return model
+
+
+async def consume(limit=None):
+    received = []
+    stream = AIRecommendationEngine.stream_recommendations({}, 'goal', 'domain')
+    async for recommendation in stream:
+        received.append(recommendation)
+        if limit is not None and len(received) == limit:
+            await stream.aclose()
+            break
+    return received
+
+
+def test_broadcast_replays_to_late_subscribers():
+    async def scenario():
+        broadcast = RecommendationBroadcast()
+        broadcast.publish('a')
+        early = asyncio.create_task(_collect(broadcast))
+        await asyncio.sleep(0)
+        broadcast.publish('b')
+        late = asyncio.create_task(_collect(broadcast))
+        broadcast.close()
+        return await early, await late
+
+    assert asyncio.run(scenario()) == (['a', 'b'], ['a', 'b'])
+
+
+async def _collect(broadcast):
+    return [value async for value in broadcast.subscribe()]
+
+
+def test_concurrent_streams_share_one_generation(model):
+    async def scenario():
+        return await asyncio.gather(consume(), consume(), consume())
+
+    results = asyncio.run(scenario())
+    assert results == [ITEMS] * 3
+    assert model.calls == 1
+
+
+def test_disconnected_consumer_does_not_stop_the_others(model):
+    async def scenario():
+        leaver = asyncio.create_task(consume(limit=1))
+        stayer = asyncio.create_task(consume())
+        return await leaver, await stayer
+
+    assert asyncio.run(scenario()) == (ITEMS[:1], ITEMS)
+    assert model.calls == 1
+
+
+def test_completed_stream_is_cached(model):
+    async def scenario():
+        return await consume(), await consume()
+
+    assert asyncio.run(scenario()) == (ITEMS, ITEMS)
+    assert model.calls == 1
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from server import SimilarProfileIndex, profile_features, profile_similarity
+
+ACTIVITY = {
+    'github': {'activity': {'top_languages': {'Python': 5, 'Go': 3, 'Rust': 1, 'C': 1}}},
+    'leetcode': {'activity': {'easy_solved': 60, 'medium_solved': 20, 'hard_solved': 0}},
+    'codeforces': {'activity': {'current_rating': 1450}},
+}
+
+
+def test_features_are_quantized():
+    assert profile_features(ACTIVITY) == {
+        'cf_band': 7,
+        'lc_easy': 3,
+        'lc_medium': 2,
+        'lc_hard': 0,
+        'languages': ['Go', 'Python', 'Rust'],
+    }
+
+
+def test_errored_or_empty_platforms_add_no_features():
+    activity = {'github': {'error': 'not found'}, 'leetcode': {}, 'codeforces': {'activity': {'current_rating': 0}}}
+    assert profile_features(activity) == {'cf_band': 0}
+
+
+def test_similarity():
+    features = profile_features(ACTIVITY)
+    assert profile_similarity(features, features) == 1.0
+    assert profile_similarity({}, {}) == 1.0
+    assert profile_similarity({'cf_band': 7}, {'lc_easy': 3}) == 0.0
+    assert profile_similarity({'cf_band': 7}, {'cf_band': 8}) == 0.5
+    assert profile_similarity({'cf_band': 7}, {'cf_band': 9}) == 0.0
+    assert profile_similarity({'languages': ['Go', 'Python']}, {'languages': ['Python', 'Rust']}) == pytest.approx(1 / 3)
+
+
+def test_bucket_ignores_case_and_feature_values():
+    bucket = SimilarProfileIndex.bucket({'cf_band': 7, 'lc_easy': 1}, 'Get a Job ', 'web')
+    assert bucket == SimilarProfileIndex.bucket({'lc_easy': 3, 'cf_band': 2}, 'get a job', 'Web')
+    assert bucket != SimilarProfileIndex.bucket({'cf_band': 7}, 'get a job', 'web')
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, key, direction):
+        self.documents = sorted(self.documents, key=lambda document: document[key], reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self.documents = self.documents[:count]
+        return self
+
+    async def to_list(self, length):
+        return self.documents[:length]
+
+
+class FakeSimilarCollection:
+    def __init__(self):
+        self.documents = []
+
+    async def insert_one(self, document):
+        self.documents.append(document)
+
+    def find(self, query, projection):
+        return FakeCursor([document for document in self.documents if document['bucket'] == query['bucket']
+                           and document['expires_at'] > query['expires_at']['$gt']])
+
+
+def test_best_candidate_above_threshold_is_reused():
+    index = SimilarProfileIndex(FakeSimilarCollection(), ttl_seconds=3600, threshold=0.7, candidates=10)
+
+    async def scenario():
+        await index.add({'cf_band': 7, 'lc_easy': 1}, 'goal', 'web', ['exact'])
+        await index.add({'cf_band': 8, 'lc_easy': 1}, 'goal', 'web', ['close'])
+        await index.add({'cf_band': 7, 'lc_easy': 1}, 'other goal', 'web', ['other bucket'])
+        return (await index.find({'cf_band': 7, 'lc_easy': 1}, 'goal', 'web'),
+                await index.find({'cf_band': 8, 'lc_easy': 2}, 'goal', 'web'),
+                await index.find({'cf_band': 3, 'lc_easy': 5}, 'goal', 'web'))
+
+    assert asyncio.run(scenario()) == (['exact'], ['close'], None)
+    assert index.metrics()['lookups'] == 3
+    assert index.metrics()['hits'] == 2
@@ -0,0 +1,59 @@
+import asyncio
+
+from server import SingleFlight
+
+
+class TestSingleFlight:
+    def test_concurrent_calls_share_one_task(self):
+        async def scenario():
+            flights = SingleFlight()
+            calls = 0
+
+            async def work():
+                nonlocal calls
+                calls += 1
+                await asyncio.sleep(0.01)
+                return 'result'
+
+            results = await asyncio.gather(*(flights.do('key', work) for _ in range(5)))
+            return results, calls, flights.metrics()
+
+        results, calls, metrics = asyncio.run(scenario())
+        assert results == ['result'] * 5
+        assert calls == 1
+        assert metrics == {'in_flight': 0, 'started': 1, 'coalesced': 4}
+
+    def test_cancelled_waiter_does_not_cancel_shared_work(self):
+        async def scenario():
+            flights = SingleFlight()
+            release = asyncio.Event()
+
+            async def work():
+                await release.wait()
+                return 'result'
+
+            first = asyncio.create_task(flights.do('key', work))
+            second = asyncio.create_task(flights.do('key', work))
+            await asyncio.sleep(0)
+            first.cancel()
+            await asyncio.sleep(0)
+            assert flights.running('key')
+            release.set()
+            return await second, first.cancelled()
+
+        assert asyncio.run(scenario()) == ('result', True)
+
+    def test_errors_reach_every_waiter_and_clear_the_key(self):
+        async def scenario():
+            flights = SingleFlight()
+
+            async def work():
+                await asyncio.sleep(0)
+                raise ValueError('boom')
+
+            results = await asyncio.gather(flights.do('key', work), flights.do('key', work), return_exceptions=True)
+            return results, flights.running('key')
+
+        results, running = asyncio.run(scenario())
+        assert all(isinstance(result, ValueError) for result in results)
+        assert not running
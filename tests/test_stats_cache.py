@@ -0,0 +1,145 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from server import LRUCache, PlatformStatsCache
+
+
+class FakeStatsCollection:
+    """Stats documents keyed by (platform, username)"""
+
+    def __init__(self):
+        self.documents = {}
+        self.reads = 0
+
+    def put(self, username, stats, age_seconds):
+        self.documents[('github', username)] = {
+            'stats': stats, 'fetched_at': datetime.now(timezone.utc) - timedelta(seconds=age_seconds)
+        }
+
+    async def find_one(self, query, projection):
+        self.reads += 1
+        document = self.documents.get((query['platform'], query['username']))
+        return dict(document) if document else None
+
+    async def update_one(self, query, update, upsert=False):
+        self.documents[(query['platform'], query['username'])] = update['$set']
+
+
+class Fetcher:
+    def __init__(self, result=None, error=None):
+        self.result = result if result is not None else {'profile': {'name': 'new'}}
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self, username):
+        self.calls += 1
+        await asyncio.sleep(0)
+        if self.error:
+            raise self.error
+        return self.result
+
+
+def make_cache(collection):
+    return PlatformStatsCache(collection, fresh_seconds=60, max_age_seconds=3600, outage_grace_seconds=86400)
+
+
+def get(cache, fetcher, username='octocat'):
+    async def scenario():
+        stats = await cache.get_or_fetch('github', username, fetcher)
+        await asyncio.gather(*cache._refreshing.values())
+        return stats
+
+    return asyncio.run(scenario())
+
+
+OLD = {'profile': {'name': 'old'}}
+NEW = {'profile': {'name': 'new'}}
+
+
+def test_miss_fetches_and_stores():
+    collection = FakeStatsCollection()
+    fetcher = Fetcher()
+    assert get(make_cache(collection), fetcher, 'Octocat') == NEW
+    stored = collection.documents[('github', 'octocat')]
+    assert stored['stats'] == NEW
+    assert stored['expires_at'] - stored['fetched_at'] == timedelta(seconds=3600 + 86400)
+
+
+def test_fresh_entry_is_served_without_fetching():
+    collection = FakeStatsCollection()
+    collection.put('octocat', OLD, age_seconds=30)
+    fetcher = Fetcher()
+    assert get(make_cache(collection), fetcher) == OLD
+    assert fetcher.calls == 0
+
+
+def test_stale_entry_is_served_and_refreshed_in_the_background():
+    collection = FakeStatsCollection()
+    collection.put('octocat', OLD, age_seconds=600)
+    fetcher = Fetcher()
+    assert get(make_cache(collection), fetcher) == OLD
+    assert fetcher.calls == 1
+    assert collection.documents[('github', 'octocat')]['stats'] == NEW
+
+
+def test_concurrent_stale_reads_share_one_refresh():
+    collection = FakeStatsCollection()
+    collection.put('octocat', OLD, age_seconds=600)
+    fetcher = Fetcher()
+    cache = make_cache(collection)
+
+    async def scenario():
+        await asyncio.gather(*(cache.get_or_fetch('github', 'octocat', fetcher) for _ in range(3)))
+        await asyncio.gather(*cache._refreshing.values())
+
+    asyncio.run(scenario())
+    assert fetcher.calls == 1
+
+
+def test_expired_entry_is_refetched():
+    collection = FakeStatsCollection()
+    collection.put('octocat', OLD, age_seconds=7200)
+    assert get(make_cache(collection), Fetcher()) == NEW
+
+
+@pytest.mark.parametrize('fetcher', [Fetcher(result={'error': 'GitHub is down'}), Fetcher(error=RuntimeError('down'))])
+def test_expired_entry_is_served_while_the_platform_fails(fetcher):
+    collection = FakeStatsCollection()
+    collection.put('octocat', OLD, age_seconds=7200)
+    cache = make_cache(collection)
+    assert get(cache, fetcher) == OLD
+    assert cache.served_during_outage == 1
+
+
+def test_errors_are_returned_but_never_cached():
+    collection = FakeStatsCollection()
+    assert get(make_cache(collection), Fetcher(result={'error': 'not found'})) == {'error': 'not found'}
+    assert collection.documents == {}
+
+
+def test_fetch_exception_without_an_entry_propagates():
+    with pytest.raises(RuntimeError):
+        get(make_cache(FakeStatsCollection()), Fetcher(error=RuntimeError('down')))
+
+
+def test_memory_tier_skips_mongo_reads():
+    collection = FakeStatsCollection()
+    collection.put('octocat', OLD, age_seconds=30)
+    cache = PlatformStatsCache(collection, fresh_seconds=60, max_age_seconds=3600,
+                               memory=LRUCache(max_entries=10, max_bytes=10000, ttl_seconds=3600))
+    fetcher = Fetcher()
+    assert get(cache, fetcher) == OLD
+    assert get(cache, fetcher) == OLD
+    assert collection.reads == 1
+    assert cache.memory.metrics()['hits'] == 1
+
+
+def test_memory_tier_is_updated_on_store():
+    collection = FakeStatsCollection()
+    cache = PlatformStatsCache(collection, fresh_seconds=60, max_age_seconds=3600,
+                               memory=LRUCache(max_entries=10, max_bytes=10000, ttl_seconds=3600))
+    get(cache, Fetcher())
+    assert get(cache, Fetcher(error=RuntimeError('not called'))) == NEW
+    assert collection.reads == 1
@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from server import JSONArrayStreamParser
+
+ITEMS = [
+    {'type': 'project', 'title': 'Build a CLI', 'description': 'Parse "args" with [brackets] and {braces}',
+     'difficulty': 'beginner', 'time_estimate': '1 week', 'resources': ['https://docs.python.org']},
+    {'type': 'problem', 'title': 'Two Sum', 'description': 'Path C:\\temp\\ and a quote \\" inside',
+     'difficulty': 'intermediate', 'time_estimate': '1 hour', 'resources': []},
+]
+ARRAY = json.dumps(ITEMS, indent=2)
+
+
+def feed_chunks(chunks):
+    parser = JSONArrayStreamParser()
+    items = []
+    for chunk in chunks:
+        items.extend(parser.feed(chunk))
+    return items
+
+
+class TestJSONArrayStreamParser:
+    def test_whole_array_in_one_chunk(self):
+        assert feed_chunks([ARRAY]) == ITEMS
+
+    def test_one_character_per_chunk(self):
+        assert feed_chunks(list(ARRAY)) == ITEMS
+
+    @pytest.mark.parametrize('size', [2, 3, 7, 16])
+    def test_fixed_size_chunks(self, size):
+        assert feed_chunks([ARRAY[i:i + size] for i in range(0, len(ARRAY), size)]) == ITEMS
+
+    def test_chunk_split_after_escape_backslash(self):
+        text = '[{"title": "say \\"hi\\" ]"}, {"title": "next"}]'
+        split = text.index('\\') + 1
+        assert feed_chunks([text[:split], text[split:]]) == [{'title': 'say "hi" ]'}, {'title': 'next'}]
+
+    def test_escaped_backslash_before_closing_quote(self):
+        assert feed_chunks(['[{"path": "C:\\\\"}, {"n": 1}]']) == [{'path': 'C:\\'}, {'n': 1}]
+
+    def test_brackets_and_braces_inside_strings(self):
+        text = '[{"t": "a ] } [ {"}, {"t": "}]"}]'
+        assert feed_chunks([text]) == [{'t': 'a ] } [ {'}, {'t': '}]'}]
+
+    def test_nested_values_stay_inside_their_object(self):
+        text = '[{"a": [1, {"b": [2]}], "c": {"d": []}}]'
+        assert feed_chunks([text]) == [{'a': [1, {'b': [2]}], 'c': {'d': []}}]
+
+    def test_prose_and_fence_before_array_are_skipped(self):
+        text = 'Here you go:\n```json\n' + ARRAY + '\n```'
+        assert feed_chunks([text[:20], text[20:]]) == ITEMS
+
+    def test_malformed_object_is_dropped(self):
+        assert feed_chunks(['[{"a": 1,}, {"b": 2}]']) == [{'b': 2}]
+
+    def test_text_after_array_is_ignored(self):
+        assert feed_chunks(['[{"a": 1}] trailing {"b": 2}']) == [{'a': 1}]
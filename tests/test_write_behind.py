@@ -0,0 +1,177 @@
+import asyncio
+
+import pytest
+
+import server
+from server import AnalysisWriteBehind
+
+
+class FakeCollection:
+    """Records bulk writes; fails the next ``failures`` calls"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.batches = []
+        self.before_write = None
+
+    async def _write(self, batch):
+        if self.before_write is not None:
+            await self.before_write()
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError('mongo unavailable')
+        self.batches.append(batch)
+
+    async def bulk_write(self, operations, ordered=True):
+        await self._write(operations)
+
+    async def insert_many(self, documents, ordered=True):
+        await self._write(documents)
+
+
+@pytest.fixture(autouse=True)
+def no_pruning(monkeypatch):
+    monkeypatch.setattr(server, 'RECOMMENDATION_HISTORY_LIMIT', 0)
+
+
+def make_buffer(profiles=None, recommendations=None, max_pending=100):
+    return AnalysisWriteBehind(profiles or FakeCollection(), recommendations or FakeCollection(),
+                               batch_size=50, flush_ms=1000, max_pending=max_pending)
+
+
+def enqueue(buffer, identity, user_id, **fields):
+    return buffer.enqueue(identity, fields, {'id': user_id, 'identity': identity},
+                          {'user_id': user_id, **fields})
+
+
+def test_queued_writes_are_readable_until_flushed():
+    async def scenario():
+        profiles, recommendations = FakeCollection(), FakeCollection()
+        buffer = make_buffer(profiles, recommendations)
+        await enqueue(buffer, 'github:alice', 'u1', goal='first')
+        await enqueue(buffer, 'github:alice', 'u1', goal='second')
+        profile, recommendation = buffer.pending('u1')
+        assert profile['set'] == {'goal': 'second'}
+        assert recommendation['goal'] == 'second'
+        assert buffer.pending_user_id('github:alice') == 'u1'
+
+        await buffer.flush()
+        assert buffer.pending('u1') == (None, None)
+        assert len(profiles.batches[0]) == 1
+        assert len(recommendations.batches[0]) == 2
+        return buffer.metrics()
+
+    metrics = asyncio.run(scenario())
+    assert metrics['queued'] == 0
+    assert metrics['written'] == 3
+
+
+def test_failed_flush_requeues_writes():
+    async def scenario():
+        profiles = FakeCollection(failures=1)
+        buffer = make_buffer(profiles)
+        await enqueue(buffer, 'github:alice', 'u1', goal='first')
+        await buffer.flush()
+        assert buffer.metrics()['queued'] == 2
+        assert buffer.pending('u1')[0] is not None
+
+        await buffer.flush()
+        return buffer.metrics(), profiles
+
+    metrics, profiles = asyncio.run(scenario())
+    assert metrics['queued'] == 0
+    assert metrics['flushes'] == 2
+    assert metrics['written'] == 2
+    assert len(profiles.batches) == 1
+
+
+def test_requeue_keeps_newer_fields_and_first_insert():
+    async def scenario():
+        profiles = FakeCollection(failures=1)
+        buffer = make_buffer(profiles)
+        await enqueue(buffer, 'github:alice', 'u1', goal='first')
+
+        async def enqueue_during_flush():
+            profiles.before_write = None
+            await buffer.enqueue('github:alice', {'goal': 'second'}, {'id': 'u2', 'identity': 'github:alice'},
+                                 {'user_id': 'u1', 'goal': 'second'})
+
+        profiles.before_write = enqueue_during_flush
+        await buffer.flush()
+        return buffer
+
+    buffer = asyncio.run(scenario())
+    profile, recommendation = buffer.pending('u1')
+    assert profile == {'set': {'goal': 'second'}, 'insert': {'id': 'u1', 'identity': 'github:alice'}}
+    assert recommendation['goal'] == 'second'
+    assert [write['goal'] for write in buffer._recommendation_writes] == ['first', 'second']
+
+
+def test_full_queue_drops_oldest_recommendations_first():
+    async def scenario():
+        buffer = make_buffer(FakeCollection(failures=10), max_pending=3)
+        for goal in ('first', 'second', 'third'):
+            await enqueue(buffer, 'github:alice', 'u1', goal=goal)
+        return buffer
+
+    buffer = asyncio.run(scenario())
+    metrics = buffer.metrics()
+    assert metrics['queued'] == 3
+    assert metrics['dropped_recommendations'] == 1
+    assert metrics['dropped_profiles'] == 0
+    assert [write['goal'] for write in buffer._recommendation_writes] == ['second', 'third']
+    assert buffer.pending('u1')[0]['set'] == {'goal': 'third'}
+
+
+def test_full_queue_drops_oldest_profiles_once_recommendations_are_gone():
+    async def scenario():
+        buffer = make_buffer(FakeCollection(failures=10), max_pending=1)
+        await enqueue(buffer, 'github:alice', 'u1', goal='first')
+        await enqueue(buffer, 'github:bob', 'u2', goal='second')
+        return buffer
+
+    buffer = asyncio.run(scenario())
+    metrics = buffer.metrics()
+    assert metrics['queued'] == 1
+    assert metrics['dropped_recommendations'] == 2
+    assert metrics['dropped_profiles'] == 1
+    assert buffer.pending_user_id('github:alice') is None
+    assert buffer.pending_user_id('github:bob') == 'u2'
+
+
+class SlowCollection(FakeCollection):
+    """Signals when a write starts and holds it until released"""
+
+    def __init__(self, failures=0):
+        super().__init__(failures)
+        self.writing = asyncio.Event()
+        self.release = asyncio.Event()
+
+        async def hold():
+            self.writing.set()
+            await self.release.wait()
+
+        self.before_write = hold
+
+
+@pytest.mark.parametrize('failures', [0, 1])
+def test_stop_during_flush_keeps_its_writes(failures):
+    async def scenario():
+        profiles = SlowCollection(failures)
+        buffer = AnalysisWriteBehind(profiles, FakeCollection(), batch_size=1, flush_ms=1000, max_pending=100)
+        buffer.start()
+        await asyncio.sleep(0)
+        await enqueue(buffer, 'github:alice', 'u1', goal='first')
+        await asyncio.wait_for(profiles.writing.wait(), timeout=1)
+        stopping = asyncio.create_task(buffer.stop())
+        await asyncio.sleep(0.01)
+        profiles.release.set()
+        await asyncio.wait_for(stopping, timeout=1)
+        return buffer, profiles
+
+    buffer, profiles = asyncio.run(scenario())
+    metrics = buffer.metrics()
+    assert metrics['queued'] == 0
+    assert metrics['written'] == 2
+    assert len(profiles.batches) == 1
+    assert buffer.pending('u1') == (None, None)